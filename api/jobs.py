@@ -0,0 +1,503 @@
+"""
+Persistent render job queue for long clips
+
+Jobs are rows in a SQLite database, so they survive API restarts and can be
+shared by several API processes. Render workers are separate processes that
+claim the next queued job (lowest priority class first, then oldest), render
+it with the demo/app.py video pipeline and write progress back to the
+database; clients poll the job and download the video once it is done. Every
+job records when it was submitted, started and finished, and how much audio it
+covered, for capacity planning.
+
+A running job carries its worker's token and a heartbeat the worker refreshes
+every few seconds. A WorkerPool supervises the worker processes: it restarts
+workers that died and requeues their jobs, requeues jobs whose heartbeat went
+stale (a worker of another pool, or a lost pool), and expires finished jobs
+after jobs.retention_hours, deleting their files.
+
+Workers are started once per server by its entry point (``python
+api/server.py`` or the api/model_server.py parent; jobs.workers in
+configs/inference.yaml, or AVATAR_JOB_WORKERS), never by the app itself, so
+API worker processes don't each load another set of models. When the app is
+served some other way (``uvicorn api.server:app --workers N``), run them
+standalone with ``python api/jobs.py --workers N``.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import yaml
+
+CONFIG_PATH = Path(__file__).parent.parent / "configs" / "inference.yaml"
+DEFAULT_SETTINGS = {'db': 'cache/jobs.sqlite3', 'dir': 'cache/jobs', 'workers': 2,
+                    'retention_hours': 24, 'heartbeat_timeout': 60}
+
+# Priority classes, served in this order
+PRIORITIES = {'interactive': 0, 'normal': 1, 'batch': 2}
+# Clips up to this long default to 'interactive', longer ones to 'batch'
+INTERACTIVE_MAX_SECONDS = 30.0
+
+POLL_INTERVAL = 0.5  # Seconds an idle worker waits before looking again
+HEARTBEAT_INTERVAL = 5.0  # Seconds between heartbeats of a worker's running job
+SUPERVISE_INTERVAL = 10.0  # Seconds between WorkerPool checks
+
+# Overrides jobs.workers
+WORKERS_ENV = 'AVATAR_JOB_WORKERS'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    options TEXT NOT NULL,
+    audio_path TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    audio_seconds REAL,
+    worker_pid INTEGER,
+    worker_token TEXT,
+    heartbeat_at REAL,
+    error TEXT,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, submitted_at);
+"""
+# Columns added after the first schema, for databases created before them
+ADDED_COLUMNS = {'worker_token': 'TEXT', 'heartbeat_at': 'REAL'}
+
+
+def load_job_settings(config_path: Path = CONFIG_PATH) -> dict:
+    """Job queue settings from the jobs section of configs/inference.yaml (and AVATAR_JOB_WORKERS)"""
+    settings = dict(DEFAULT_SETTINGS)
+    if Path(config_path).exists():
+        with open(config_path) as f:
+            settings.update((yaml.safe_load(f) or {}).get('jobs', {}))
+    if os.environ.get(WORKERS_ENV):
+        settings['workers'] = int(os.environ[WORKERS_ENV])
+    return settings
+
+
+class JobQueue:
+    """SQLite-backed queue of render jobs"""
+
+    def __init__(self, db_path: str, jobs_dir: str):
+        """
+        Open (and create if needed) the job database
+
+        Args:
+            db_path: SQLite database file
+            jobs_dir: Directory for uploaded audio and rendered videos
+        """
+        self.db_path = str(db_path)
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+            columns = {row['name'] for row in db.execute('PRAGMA table_info(jobs)')}
+            for name, kind in ADDED_COLUMNS.items():
+                if name not in columns:
+                    db.execute(f'ALTER TABLE jobs ADD COLUMN {name} {kind}')
+
+    @contextmanager
+    def _connect(self):
+        """Autocommit connection, closed on exit (sqlite3's own context manager never closes)"""
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def submit(self, audio_bytes: bytes, suffix: str, options: dict, priority: str = None) -> dict:
+        """
+        Store an uploaded clip and queue it
+
+        Args:
+            audio_bytes: Uploaded audio file contents
+            suffix: Audio file extension (e.g. '.wav')
+            options: generate_video keyword options (fps, mouth, silence, with_audio)
+            priority: Name from PRIORITIES (None = by clip length)
+
+        Returns:
+            job: Job status dict (see get)
+        """
+        if priority is not None and priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', choose from {list(PRIORITIES)}")
+
+        job_id = uuid.uuid4().hex
+        audio_path = self.jobs_dir / f"{job_id}{suffix}"
+        with open(audio_path, 'wb') as f:
+            f.write(audio_bytes)
+
+        import soundfile as sf
+        try:
+            audio_seconds = sf.info(str(audio_path)).duration
+        except RuntimeError:
+            audio_seconds = None
+        if priority is None:
+            short = audio_seconds is not None and audio_seconds <= INTERACTIVE_MAX_SECONDS
+            priority = 'interactive' if short else 'batch'
+
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, priority, status, options, audio_path, output_path, "
+                "audio_seconds, submitted_at) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, PRIORITIES[priority], json.dumps(options), str(audio_path),
+                 str(self.jobs_dir / f"{job_id}.mp4"), audio_seconds, time.time()))
+        return self.get(job_id)
+
+    def _row(self, job_id: str):
+        with self._connect() as db:
+            return db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def get(self, job_id: str):
+        """
+        Status of one job
+
+        Returns:
+            job: Dict with job_id, status ('queued', 'running', 'done',
+                 'failed' or 'expired' once its files are deleted), priority, progress (0-1), queue position while
+                 queued, error, and timing: audio_seconds, queue_seconds,
+                 render_seconds and realtime_factor (audio / render time);
+                 None if there is no such job
+        """
+        row = self._row(job_id)
+        if row is None:
+            return None
+
+        now = time.time()
+        started = row['started_at']
+        finished = row['finished_at']
+        render_seconds = (finished or now) - started if started else None
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'priority': next(name for name, value in PRIORITIES.items() if value == row['priority']),
+            'progress': round(row['progress'], 4),
+            'error': row['error'],
+            'audio_seconds': row['audio_seconds'],
+            'queue_seconds': round((started or now) - row['submitted_at'], 3),
+            'render_seconds': round(render_seconds, 3) if render_seconds is not None else None,
+            'realtime_factor': None,
+        }
+        if finished and row['audio_seconds'] and render_seconds > 0:
+            job['realtime_factor'] = round(row['audio_seconds'] / render_seconds, 2)
+        if row['status'] == 'queued':
+            with self._connect() as db:
+                job['queue_position'] = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                    "(priority < ? OR (priority = ? AND submitted_at < ?))",
+                    (row['priority'], row['priority'], row['submitted_at'])).fetchone()[0]
+        return job
+
+    def result_path(self, job_id: str):
+        """Path of a finished job's video, or None if it is not done"""
+        row = self._row(job_id)
+        if row is None or row['status'] != 'done':
+            return None
+        return row['output_path']
+
+    def claim(self, token: str):
+        """
+        Take the next queued job for a worker
+
+        Args:
+            token: The worker's unique token, recorded on the job
+
+        Returns:
+            row: The claimed job row, or None when the queue is empty
+        """
+        with self._connect() as db:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                row = db.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                                 "ORDER BY priority, submitted_at LIMIT 1").fetchone()
+                if row is not None:
+                    now = time.time()
+                    db.execute("UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ?, "
+                               "worker_token = ?, heartbeat_at = ? WHERE id = ?",
+                               (now, os.getpid(), token, now, row['id']))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        return row
+
+    def set_progress(self, job_id: str, token: str, progress: float):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET progress = ?, heartbeat_at = ? "
+                       "WHERE id = ? AND worker_token = ?", (progress, time.time(), job_id, token))
+
+    def heartbeat(self, job_id: str, token: str) -> bool:
+        """Refresh a running job's heartbeat; False if the job no longer belongs to token"""
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND "
+                                "worker_token = ? AND status = 'running'",
+                                (time.time(), job_id, token))
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: str, token: str, error: str = None) -> bool:
+        """
+        Mark a claimed job done (or failed with error)
+
+        Ignored (returns False) if the job was requeued and is no longer the
+        worker's, so a late worker cannot overwrite the job's new run.
+        """
+        status = 'failed' if error is not None else 'done'
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, "
+                "progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END "
+                "WHERE id = ? AND worker_token = ? AND status = 'running'",
+                (status, error, time.time(), status, job_id, token))
+            return cursor.rowcount > 0
+
+    def requeue_orphans(self, heartbeat_timeout: float, tokens=()) -> int:
+        """
+        Put running jobs whose worker is gone back in the queue
+
+        Args:
+            heartbeat_timeout: Requeue jobs whose heartbeat is older than this (s)
+            tokens: Tokens of workers known to be dead; their jobs are
+                    requeued right away
+
+        Returns:
+            count: Number of requeued jobs
+        """
+        tokens = list(tokens)
+        marks = ', '.join('?' * len(tokens))
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'queued', progress = 0, started_at = NULL, "
+                "worker_pid = NULL, worker_token = NULL, heartbeat_at = NULL "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ? "
+                f"OR worker_token IN ({marks}))",
+                [time.time() - heartbeat_timeout] + tokens)
+            return cursor.rowcount
+
+    def expire(self, retention_seconds: float) -> int:
+        """
+        Delete the files of jobs finished longer ago than retention_seconds
+
+        The jobs stay in the database with status 'expired'.
+
+        Returns:
+            count: Number of expired jobs
+        """
+        with self._connect() as db:
+            rows = db.execute("SELECT id, audio_path, output_path FROM jobs WHERE "
+                              "status IN ('done', 'failed') AND finished_at < ?",
+                              (time.time() - retention_seconds,)).fetchall()
+            for row in rows:
+                for path in (row['audio_path'], row['output_path']):
+                    if os.path.exists(path):
+                        os.remove(path)
+                db.execute("UPDATE jobs SET status = 'expired' WHERE id = ?", (row['id'],))
+        return len(rows)
+
+    def stats(self) -> dict:
+        """
+        Queue summary per priority class for capacity planning
+
+        Returns:
+            stats: Dict per priority name with job counts by status and, over
+                   finished jobs, mean queue_seconds, mean render_seconds and
+                   total audio_seconds / render_seconds
+        """
+        stats = {}
+        with self._connect() as db:
+            for name, value in PRIORITIES.items():
+                counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs WHERE priority = ? "
+                                         "GROUP BY status", (value,)).fetchall())
+                queue, render, audio, busy = db.execute(
+                    "SELECT AVG(started_at - submitted_at), AVG(finished_at - started_at), "
+                    "SUM(audio_seconds), SUM(finished_at - started_at) FROM jobs "
+                    "WHERE priority = ? AND status = 'done'", (value,)).fetchone()
+                stats[name] = {
+                    'counts': counts,
+                    'mean_queue_seconds': round(queue, 3) if queue is not None else None,
+                    'mean_render_seconds': round(render, 3) if render is not None else None,
+                    'realtime_factor': round(audio / busy, 2) if audio and busy else None,
+                }
+        return stats
+
+
+def _render_job(queue: JobQueue, row, token: str):
+    """Render one claimed job, reporting progress to the database"""
+    from demo.app import generate_video
+
+    last = [0.0, 0.0]  # last written progress, time written
+
+    def progress(done, total):
+        value = done / total
+        now = time.perf_counter()
+        # At most every 1% / 0.5 s, so the database isn't written per frame
+        if value - last[0] >= 0.01 and now - last[1] >= 0.5:
+            queue.set_progress(row['id'], token, value)
+            last[:] = [value, now]
+
+    options = json.loads(row['options'])
+    generate_video(row['audio_path'], row['output_path'], progress=progress, **options)
+
+
+def _heartbeat_loop(queue: JobQueue, token: str, current: dict):
+    """Refresh the heartbeat of the worker's current job (runs in a daemon thread)"""
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        job_id = current.get('id')
+        if job_id is not None:
+            queue.heartbeat(job_id, token)
+
+
+def run_worker(db_path: str, jobs_dir: str, token: str = None,
+               poll_interval: float = POLL_INTERVAL):
+    """
+    Render worker loop: claim, render, record, repeat
+
+    Args:
+        db_path: SQLite database file
+        jobs_dir: Directory for uploaded audio and rendered videos
+        token: Unique worker token recorded on claimed jobs (None = random)
+        poll_interval: Seconds to wait when the queue is empty
+    """
+    import torch
+    torch.set_num_threads(1)
+
+    token = token or uuid.uuid4().hex
+    queue = JobQueue(db_path, jobs_dir)
+    current = {'id': None}
+    threading.Thread(target=_heartbeat_loop, args=(queue, token, current), daemon=True).start()
+    while True:
+        row = queue.claim(token)
+        if row is None:
+            time.sleep(poll_interval)
+            continue
+
+        current['id'] = row['id']
+        try:
+            _render_job(queue, row, token)
+            owned = queue.finish(row['id'], token)
+        except Exception as e:
+            # Exceptions without a message (e.g. a bare AssertionError) still fail the job
+            owned = queue.finish(row['id'], token, error=str(e) or type(e).__name__)
+        finally:
+            current['id'] = None
+        # A job requeued after a missed heartbeat belongs to another worker
+        # now, which still needs its audio
+        if owned and os.path.exists(row['audio_path']):
+            os.remove(row['audio_path'])
+
+
+class WorkerPool:
+    """Render worker processes, restarted when they die, plus queue housekeeping"""
+
+    def __init__(self, settings: dict, count: int = None):
+        """
+        Args:
+            settings: Job settings (see load_job_settings)
+            count: Number of workers (None = settings['workers'])
+        """
+        self.settings = settings
+        self.count = settings['workers'] if count is None else count
+        self.queue = JobQueue(settings['db'], settings['dir'])
+        # Worker token -> multiprocessing.Process
+        self.processes = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _spawn(self):
+        token = uuid.uuid4().hex
+        # spawn: the workers must not inherit the server's event loop and threads
+        process = mp.get_context('spawn').Process(
+            target=run_worker, args=(self.settings['db'], self.settings['dir'], token), daemon=True)
+        process.start()
+        self.processes[token] = process
+
+    def check(self):
+        """Restart dead workers, requeue their and stale jobs, expire old results"""
+        dead = [token for token, process in self.processes.items() if not process.is_alive()]
+        for token in dead:
+            print(f"⚠️  Render worker {self.processes.pop(token).pid} died; restarting it")
+            self._spawn()
+        requeued = self.queue.requeue_orphans(self.settings['heartbeat_timeout'], dead)
+        if requeued:
+            print(f"Requeued {requeued} interrupted jobs")
+        expired = self.queue.expire(self.settings['retention_hours'] * 3600)
+        if expired:
+            print(f"Expired {expired} finished jobs")
+
+    def _supervise(self):
+        while not self._stop.wait(SUPERVISE_INTERVAL):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️  Job worker supervision failed: {e}")
+
+    def start(self):
+        """Start the workers and the supervising thread"""
+        self.check()
+        for _ in range(self.count):
+            self._spawn()
+        self._thread = threading.Thread(target=self._supervise, daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self):
+        """Block until stop() is called"""
+        while self._thread is not None and self._thread.is_alive():
+            self._thread.join(1.0)
+
+    def stop(self):
+        """Stop supervising and terminate the workers"""
+        self._stop.set()
+        for process in self.processes.values():
+            process.terminate()
+        self.processes.clear()
+
+
+def start_workers(settings: dict, count: int = None) -> WorkerPool:
+    """
+    Start a supervised pool of render worker processes
+
+    Args:
+        settings: Job settings (see load_job_settings)
+        count: Number of workers (None = settings['workers'])
+
+    Returns:
+        pool: The started WorkerPool (call stop() to shut it down)
+    """
+    return WorkerPool(settings, count).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run render workers for the API job queue')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Number of worker processes (default: jobs.workers in configs/inference.yaml)')
+
+    args = parser.parse_args()
+    settings = load_job_settings()
+    pool = start_workers(settings, args.workers)
+    print(f"✓ {pool.count} render workers on {settings['db']}")
+    try:
+        pool.wait()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
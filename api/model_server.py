@@ -0,0 +1,233 @@
+"""
+Pre-forking model server for the Avatar System API
+
+The parent process loads the models once, moves their weights into shared
+memory and binds the listening socket; worker processes are then forked and
+serve the FastAPI app on that socket. Workers inherit the weights, the
+imported torch runtime and the warmed-up caches copy-on-write instead of each
+loading its own. The parent reports each worker's memory and how much of it
+is the shared weight mappings: that is the part a standalone worker would
+hold a private copy of. The other shared pages (libtorch, Python and other
+shared libraries) are shared between standalone processes too, so they are
+not counted as saved.
+
+Forking is POSIX-only; elsewhere (or with --workers 1) a single uvicorn
+process is started.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import torch
+import uvicorn
+
+from api.jobs import load_job_settings, start_workers
+from inference.realtime_pipeline import share_models
+
+# Path prefix of the shared memory segments torch.Tensor.share_memory_()
+# creates (with either sharing strategy)
+SHARED_WEIGHTS_PREFIX = '/dev/shm/torch_'
+
+
+def memory_usage(pid: int = None) -> dict:
+    """
+    Memory breakdown of a process from /proc/<pid>/smaps_rollup (Linux)
+
+    Args:
+        pid: Process id (None = this process)
+
+    Returns:
+        usage: Dict with rss, pss, shared and private sizes in MB
+               (empty where smaps_rollup is unavailable)
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        with open(path) as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'shared': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+        'private': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+    }
+
+
+def shared_weights_usage(pid: int = None) -> float:
+    """
+    Resident size of a process's shared model weight mappings (Linux)
+
+    Sums the Rss of the /dev/shm/torch_* segments in /proc/<pid>/smaps, i.e.
+    the weights moved into shared memory by share_models.
+
+    Args:
+        pid: Process id (None = this process)
+
+    Returns:
+        size: Size in MB (None where smaps is unavailable)
+    """
+    path = f"/proc/{pid or 'self'}/smaps"
+    total = 0
+    weights = False
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if not parts[0].endswith(':'):
+                    # Mapping header: address perms offset dev inode [path]
+                    weights = len(parts) > 5 and parts[5].startswith(SHARED_WEIGHTS_PREFIX)
+                elif weights and parts[0] == 'Rss:':
+                    total += int(parts[1])
+    except OSError:
+        return None
+    return total / 1024
+
+
+def _run_worker(sock: socket.socket, ready_fd: int, threads: int, log_level: str):
+    """Entry point of a forked worker: serve the app on the inherited socket"""
+    # Import here so the app module (and its routes) load after the fork
+    from api.server import app
+
+    torch.set_num_threads(threads)
+    os.write(ready_fd, b'1')
+    os.close(ready_fd)
+
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _report_memory(parent_usage: dict, workers: list, weights_mb: float):
+    """Print per-worker RSS and how much of it is the shared model weights"""
+    if not parent_usage:
+        print("⚠️  Per-worker memory report needs /proc/<pid>/smaps_rollup (Linux)")
+        return
+
+    print(f"Model weights in shared memory: {weights_mb:.1f} MB")
+    print(f"Parent: RSS {parent_usage['rss']:.0f} MB")
+    saved_total = 0.0
+    reported = 0
+    for pid in workers:
+        usage = memory_usage(pid)
+        weights = shared_weights_usage(pid)
+        if not usage or weights is None:
+            continue
+        saved_total += weights
+        reported += 1
+        print(f"  Worker {pid}: RSS {usage['rss']:.0f} MB, private {usage['private']:.0f} MB, "
+              f"shared {usage['shared']:.0f} MB of which weights {weights:.0f} MB "
+              f"(PSS {usage['pss']:.0f} MB)")
+    if reported:
+        # Only the weights: shared library pages are shared by standalone workers too
+        print(f"✓ ~{saved_total / reported:.0f} MB of weights shared instead of copied per worker "
+              f"({saved_total:.0f} MB across {reported} workers)")
+
+
+def serve(host: str = '0.0.0.0', port: int = 8000, workers: int = 2,
+          threads: int = None, log_level: str = 'info'):
+    """
+    Run the API with models shared across forked worker processes
+
+    Args:
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes
+        threads: Torch intra-op threads per worker (None = CPU count / workers)
+        log_level: uvicorn log level
+    """
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if workers > 1:
+            print("⚠️  os.fork is unavailable on this platform; starting a single worker")
+        from api.server import app
+        job_workers = start_workers(load_job_settings())
+        try:
+            uvicorn.run(app, host=host, port=port, log_level=log_level)
+        finally:
+            job_workers.stop()
+        return
+
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+
+    # Single-threaded in the parent: an OpenMP pool created before fork()
+    # cannot be used by the children
+    torch.set_num_threads(1)
+    print("Loading models into shared memory...")
+    weights_mb = share_models() / (1024 * 1024)
+    parent_usage = memory_usage()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    ready_read, ready_write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            try:
+                _run_worker(sock, ready_write, threads, log_level)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    os.close(ready_write)
+
+    for _ in pids:
+        os.read(ready_read, 1)
+    os.close(ready_read)
+    print(f"Started {workers} workers on http://{host}:{port} ({threads} torch threads each)")
+    _report_memory(parent_usage, pids, weights_mb)
+
+    # One render job pool for the whole server, in the parent only and after
+    # the forks: its supervisor thread, locks and SQLite connections must not
+    # be copied into the API workers (which never start one)
+    job_workers = start_workers(load_job_settings())
+
+    def _stop(signum, frame):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    job_workers.stop()
+    sock.close()
+    print("Shutting down Avatar System API...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the Avatar System API with shared model weights')
+    parser.add_argument('--host', type=str, default='0.0.0.0',
+                       help='Interface to bind (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8000,
+                       help='Port to bind (default: 8000)')
+    parser.add_argument('--workers', type=int, default=2,
+                       help='Number of forked worker processes (default: 2)')
+    parser.add_argument('--threads', type=int, default=None,
+                       help='Torch threads per worker (default: CPU count / workers)')
+    parser.add_argument('--log-level', type=str, default='info',
+                       help='uvicorn log level (default: info)')
+
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
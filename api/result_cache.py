@@ -0,0 +1,247 @@
+"""
+On-disk cache of /generate results
+
+Rendered videos are stored as ``<key>.mp4`` under the cache directory, where
+the key hashes the uploaded audio bytes, the pipeline version (model weights
+and model config) and the render options, so a repeated request is answered
+from disk without running any model. The cache is bounded by total size and
+evicts least recently used entries; recency is the files' modification times
+(touched on every hit). The directory itself is the index: lookups and
+eviction read it, so several processes sharing the cache (api/model_server.py
+workers) see each other's entries and stay within one max_bytes in total.
+Concurrent requests for the same key share one computation: within a process
+through a shared future, across processes through an exclusive ``<key>.lock``
+file whose holder computes while the others wait for its result. Every
+computation writes to its own temporary file.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import yaml
+
+CONFIG_PATH = Path(__file__).parent.parent / "configs" / "inference.yaml"
+DEFAULT_CACHE_DIR = 'cache/results'
+DEFAULT_MAX_SIZE_MB = 1024
+# Partial results and locks older than this are left over from a crash
+STALE_TMP_SECONDS = 3600
+# How often a process waiting for another one's computation checks on it
+LOCK_POLL_SECONDS = 0.1
+
+
+def cache_key(audio_bytes: bytes, version: str, options: dict) -> str:
+    """
+    Cache key for one request
+
+    Args:
+        audio_bytes: Uploaded audio file contents
+        version: Pipeline version (see realtime_pipeline.get_pipeline_version)
+        options: Render options that affect the output
+
+    Returns:
+        key: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256(audio_bytes)
+    digest.update(version.encode())
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of result files with in-flight request collapsing"""
+
+    def __init__(self, root: str, max_bytes: int, suffix: str = '.mp4'):
+        """
+        Open a cache directory, removing stale partial results and locks
+
+        Args:
+            root: Cache directory
+            max_bytes: Total size the cached files may occupy
+            suffix: File extension of cached results
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+        stale = list(self.root.glob('*.tmp' + suffix)) + list(self.root.glob('*.lock'))
+        for path in stale:
+            # Left by an interrupted computation (recent ones may still be
+            # in use by another process)
+            try:
+                if time.time() - path.stat().st_mtime > STALE_TMP_SECONDS:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+        self._evict()
+
+    def path(self, key: str) -> Path:
+        return self.root / (key + self.suffix)
+
+    def get(self, key: str):
+        """Path of a cached result (marked most recently used), or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, source: str) -> Path:
+        """Move a finished result file into the cache and evict as needed"""
+        path = self.path(key)
+        os.replace(source, path)
+        self._evict(keep=key)
+        return path
+
+    def _acquire(self, key: str):
+        """Take the cross-process lock of a key: its path, or None if another process holds it"""
+        lock = self.root / f"{key}.lock"
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        return lock
+
+    async def _wait_for_peer(self, key: str):
+        """Wait while another process computes key: its result, or None if it gave up"""
+        lock = self.root / f"{key}.lock"
+        while True:
+            path = self.get(key)
+            if path is not None:
+                return path
+            try:
+                age = time.time() - lock.stat().st_mtime
+            except FileNotFoundError:
+                # Released: finished (then the result exists) or failed
+                return self.get(key)
+            if age > STALE_TMP_SECONDS:
+                # Holder crashed without releasing it
+                try:
+                    lock.unlink()
+                except FileNotFoundError:
+                    pass
+                return None
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+
+    async def _compute_once(self, key: str, compute):
+        """Compute key unless another process does; returns (path, computed by a peer)"""
+        while True:
+            lock = self._acquire(key)
+            if lock is None:
+                path = await self._wait_for_peer(key)
+                if path is not None:
+                    return path, True
+                continue
+
+            tmp_path = self.root / f"{key}.{os.getpid()}.{uuid.uuid4().hex}.tmp{self.suffix}"
+            try:
+                # A peer may have published it between the lookup and the lock
+                path = self.get(key)
+                if path is not None:
+                    return path, True
+                await asyncio.get_running_loop().run_in_executor(None, compute, str(tmp_path))
+                return self.put(key, tmp_path), False
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+                lock.unlink()
+
+    def _entries(self) -> list:
+        """(mtime, size, key) of the cached results on disk, least recently used first"""
+        entries = []
+        for path in self.root.glob('*' + self.suffix):
+            if path.name.endswith('.tmp' + self.suffix):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path.name[:-len(self.suffix)]))
+        return sorted(entries)
+
+    def size(self) -> int:
+        """Total size of the cached results on disk, in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, keep: str = None):
+        """Delete least recently used results until the directory fits max_bytes"""
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                try:
+                    os.remove(self.path(key))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    async def get_or_compute(self, key: str, compute):
+        """
+        Return the cached result for key, computing it at most once
+
+        Args:
+            key: Cache key
+            compute: Blocking callable writing the result to the path it is
+                     given; run in a worker thread on a cache miss
+
+        Returns:
+            path: Path of the cached result
+            hit: True if no computation was needed (cached or joined an
+                 identical request already in flight in this or another
+                 process)
+        """
+        path = self.get(key)
+        if path is not None:
+            self.hits += 1
+            return path, True
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            path, hit = await self._compute_once(key, compute)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            future.set_result(path)
+            return path, hit
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Retrieve it here so an exception nobody else awaited is not logged
+                future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+
+def load_result_cache(config_path: Path = CONFIG_PATH) -> ResultCache:
+    """Create the ResultCache configured under result_cache in configs/inference.yaml"""
+    settings = {}
+    if Path(config_path).exists():
+        with open(config_path) as f:
+            settings = (yaml.safe_load(f) or {}).get('result_cache', {})
+    return ResultCache(settings.get('dir', DEFAULT_CACHE_DIR),
+                       int(settings.get('max_size_mb', DEFAULT_MAX_SIZE_MB) * 1024 * 1024))
@@ -1,8 +1,55 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import Dict
+from fastapi import APIRouter, HTTPException, UploadFile, File, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from typing import Dict, Optional
 import os
 import tempfile
 
+from api.jobs import PRIORITIES, JobQueue, load_job_settings
+from api.result_cache import cache_key, load_result_cache
+from inference import metrics
+
+# Result cache (singleton, created on first /generate)
+_result_cache = None
+# Render job queue (singleton, created on first use)
+_job_queue = None
+
+def _get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = load_result_cache()
+    return _result_cache
+
+def _get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        settings = load_job_settings()
+        _job_queue = JobQueue(settings['db'], settings['dir'])
+    return _job_queue
+
+def _validate_upload(audio: UploadFile, fps: int, mouth: str, silence: Optional[str]):
+    if not audio.filename.endswith(('.wav', '.mp3', '.flac')):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported file format. Use WAV, MP3, or FLAC"
+        )
+    if mouth not in ('model', 'viseme') or silence not in (None, 'idle', 'interpolate') \
+            or not 1 <= fps <= 120:
+        raise HTTPException(status_code=400, detail="Invalid render options")
+
+def _render_upload(audio_bytes: bytes, suffix: str, output_path: str, options: dict):
+    """Render uploaded audio to a video file (runs in a worker thread)"""
+    from demo.app import generate_video
+    
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(audio_bytes)
+        tmp_path = tmp.name
+    try:
+        generate_video(tmp_path, output_path, options['fps'], mouth=options['mouth'],
+                       silence=options['silence'], with_audio=options['with_audio'])
+    finally:
+        os.unlink(tmp_path)
+
 router = APIRouter()
 
 @router.get("/")
@@ -15,46 +62,156 @@ def root() -> Dict[str, str]:
     }
 
 @router.get("/health")
-def health_check() -> Dict[str, str]:
-    """Health check endpoint for monitoring"""
-    return {"status": "healthy"}
+def health_check(response: Response) -> Dict[str, str]:
+    """
+    Health check endpoint for monitoring
+    
+    Reports ready only once the models are loaded and warmed up; until then
+    it answers 503 so load balancers keep traffic away. If warm-up failed the
+    503 carries status "failed" and the error.
+    """
+    error = metrics.models_error()
+    if error is not None:
+        response.status_code = 503
+        return {"status": "failed", "models": "error", "error": error}
+    if not metrics.models_ready():
+        response.status_code = 503
+        return {"status": "starting", "models": "loading"}
+    return {"status": "healthy", "models": "ready"}
+
+@router.get("/metrics")
+def metrics_endpoint() -> Response:
+    """Prometheus metrics: requests, queue depth, stage latencies, batch sizes, throughput"""
+    return Response(content=metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
 
 @router.post("/generate")
-async def generate_avatar(audio: UploadFile = File(...)) -> Dict[str, str]:
+async def generate_avatar(audio: UploadFile = File(...), fps: int = 30, mouth: str = 'model',
+                          silence: Optional[str] = None, with_audio: bool = False) -> FileResponse:
     """
-    Generate avatar from uploaded audio file
+    Generate avatar video from uploaded audio file
+    
+    Results are cached on disk by audio content, pipeline version and render
+    options: a repeated request is served from the cache without inference
+    (X-Cache: hit), and identical requests arriving together are computed once.
     
     Args:
         audio: Audio file upload
+        fps: Frames per second of the output video
+        mouth: 'model' (full models) or 'viseme' (spectral visemes)
+        silence: Skip inference on silent spans: 'idle' or 'interpolate'
+        with_audio: Mux the uploaded audio into the video (needs ffmpeg)
         
     Returns:
-        Result with status and output path
+        The rendered MP4 video
     """
+    _validate_upload(audio, fps, mouth, silence)
+    
+    from inference.realtime_pipeline import get_pipeline_version
+    
     try:
-        # Validate file type
-        if not audio.filename.endswith(('.wav', '.mp3', '.flac')):
-            raise HTTPException(
-                status_code=400,
-                detail="Unsupported file format. Use WAV, MP3, or FLAC"
-            )
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio.filename)[1]) as tmp:
-            content = await audio.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-        
-        # TODO: Process with pipeline
-        # from inference.realtime_pipeline import run_pipeline
-        # frame = run_pipeline(tmp_path)
-        
-        # Clean up
-        os.unlink(tmp_path)
-        
-        return {
-            "status": "success",
-            "message": "Avatar generated (placeholder implementation)"
-        }
+        content = await audio.read()
+        options = {'fps': fps, 'mouth': mouth, 'silence': silence, 'with_audio': with_audio}
+        # Loads and hashes the models on a cold process: keep it off the event loop
+        version = await run_in_threadpool(get_pipeline_version)
+        key = cache_key(content, version, options)
+        suffix = os.path.splitext(audio.filename)[1]
         
+        path, hit = await _get_result_cache().get_or_compute(
+            key, lambda output_path: _render_upload(content, suffix, output_path, options))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return FileResponse(path, media_type='video/mp4', filename='avatar.mp4',
+                        headers={'X-Cache': 'hit' if hit else 'miss'})
+
+@router.websocket("/stream")
+async def stream_avatar(websocket: WebSocket, fps: int = 30, format: str = 'wav',
+                        preview: bool = False, keyframe_interval: int = 60):
+    """
+    Stream avatar frames for live viewers as dirty-rectangle deltas
+    
+    The client sends the audio file as one binary message; the server then
+    sends one binary message per frame (postprocessing.frame_delta format:
+    periodic keyframes, changed patches in between) as soon as it is
+    rendered, and closes the connection after the last frame. Frames carry
+    their index, so the client paces playback at fps.
+    
+    Args:
+        websocket: Client connection
+        fps: Frames per second
+        format: Audio file format: 'wav', 'mp3' or 'flac'
+        preview: Render at the preview resolution
+        keyframe_interval: Frames between full keyframes
+    """
+    await websocket.accept()
+    if format not in ('wav', 'mp3', 'flac') or not 1 <= fps <= 120 or keyframe_interval < 1:
+        await websocket.close(code=1003, reason="Invalid stream options")
+        return
+    
+    from demo.app import stream_frame_deltas
+    
+    content = await websocket.receive_bytes()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{format}") as tmp:
+        tmp.write(content)
+        tmp_path = tmp.name
+    try:
+        async for message in iterate_in_threadpool(
+                stream_frame_deltas(tmp_path, fps, preview, keyframe_interval)):
+            await websocket.send_bytes(message)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        await websocket.close(code=1011, reason=str(e)[:120])
+    finally:
+        os.unlink(tmp_path)
+
+@router.post("/jobs")
+async def submit_job(audio: UploadFile = File(...), fps: int = 30, mouth: str = 'model',
+                     silence: Optional[str] = None, with_audio: bool = False,
+                     priority: Optional[str] = None) -> Dict:
+    """
+    Queue a render job for long clips
+    
+    Args:
+        audio: Audio file upload
+        fps, mouth, silence, with_audio: Render options as for /generate
+        priority: 'interactive', 'normal' or 'batch' (default: interactive for
+                  clips up to 30 s, batch for longer ones)
+        
+    Returns:
+        Job status with the job_id to poll
+    """
+    _validate_upload(audio, fps, mouth, silence)
+    if priority is not None and priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority. Use one of {list(PRIORITIES)}")
+    
+    content = await audio.read()
+    options = {'fps': fps, 'mouth': mouth, 'silence': silence, 'with_audio': with_audio}
+    # Writes the upload, probes it and inserts into SQLite: keep it off the event loop
+    return await run_in_threadpool(_get_job_queue().submit, content,
+                                   os.path.splitext(audio.filename)[1], options, priority)
+
+@router.get("/jobs/stats")
+def job_stats() -> Dict:
+    """Job counts, mean queue/render time and throughput per priority class"""
+    return _get_job_queue().stats()
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str) -> Dict:
+    """Status, progress and timing of a render job"""
+    job = _get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/result")
+def job_result(job_id: str) -> FileResponse:
+    """Download the video of a finished render job"""
+    job = _get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(_get_job_queue().result_path(job_id), media_type='video/mp4',
+                        filename=f"{job_id}.mp4")
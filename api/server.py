@@ -1,6 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router
+from inference import metrics
+from inference.profiling import DEFAULT_PROFILE_DIR, PROFILE_HEADER, profile_dir, profile_run
+from inference.realtime_pipeline import warm_up
+from api.jobs import load_job_settings, start_workers
+import asyncio
+import traceback
 import uvicorn
 
 app = FastAPI(
@@ -20,10 +26,50 @@ app.add_middleware(
 
 app.include_router(router)
 
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Count requests by route and status, and track how many are in flight"""
+    metrics.queue_depth.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.queue_depth.dec()
+        # The matched route template (/jobs/{job_id}), not the raw path: one
+        # series per job id or 404 probe would grow without bound
+        route = request.scope.get('route')
+        metrics.requests_total.inc(getattr(route, 'path', 'unmatched'), str(status))
+
+@app.middleware("http")
+async def profile_on_demand(request: Request, call_next):
+    """Profile a single request when it carries the X-Avatar-Profile: 1 header"""
+    if request.headers.get(PROFILE_HEADER) != '1':
+        return await call_next(request)
+    
+    name = 'request' + request.url.path.replace('/', '-').rstrip('-')
+    with profile_run(name, profile_dir() or DEFAULT_PROFILE_DIR) as paths:
+        response = await call_next(request)
+    # Tell the caller where the trace went (or that another profile was running)
+    response.headers[PROFILE_HEADER] = paths['trace'] if paths else 'busy'
+    return response
+
+def _warm_up_done(future):
+    """Log a failed warm-up and record it, so /health reports the failure instead of waiting"""
+    if future.cancelled() or future.exception() is None:
+        return
+    error = future.exception()
+    print(f"⚠️  Model warm-up failed: {error}")
+    traceback.print_exception(type(error), error, error.__traceback__)
+    metrics.set_models_failed(f"{type(error).__name__}: {error}")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize models on startup"""
     print("Starting Avatar System API...")
+    # Warm up in the background; /health reports 503 until it finishes
+    asyncio.get_running_loop().run_in_executor(None, warm_up).add_done_callback(_warm_up_done)
     print("API documentation available at: http://localhost:8000/docs")
 
 @app.on_event("shutdown")
@@ -32,9 +78,16 @@ async def shutdown_event():
     print("Shutting down Avatar System API...")
 
 if __name__ == "__main__":
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
+    # Render job workers belong to the server entry point, not the app: every
+    # process serving the app (uvicorn --workers, api/model_server.py) would
+    # otherwise start its own pool, each worker loading its own models
+    job_workers = start_workers(load_job_settings())
+    try:
+        uvicorn.run(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            log_level="info"
+        )
+    finally:
+        job_workers.stop()
@@ -0,0 +1,269 @@
+"""
+Batch render a whole LJ Speech-style dataset with a worker pool
+
+Every clip is rendered to <output-dir>/<file_id>.mp4 by a pool of worker
+processes that each load the models once. Finished clips are recorded in
+<output-dir>/manifest.jsonl together with a render key (SHA-1 of the input
+audio, the pipeline version and the render options), so an interrupted job can
+be restarted and only re-renders clips that are missing, whose audio changed or
+that were rendered by other models, configs or options.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from data_loader import LJSpeechLoader
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+# Per-worker FeatureStore, opened on first use
+_feature_store = None
+
+
+def _file_sha1(path: str) -> str:
+    """SHA-1 of a file's contents, read in 1 MB blocks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def render_key(audio_sha1: str, pipeline_version: str, fps: int, codec: str) -> str:
+    """Key of a rendered clip: changes with its audio, the pipeline version or the options"""
+    key = {'audio_sha1': audio_sha1, 'pipeline_version': pipeline_version,
+           'fps': fps, 'codec': codec}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest(output_dir: Path) -> dict:
+    """
+    Load the completed-clip manifest of a batch output directory
+
+    Returns:
+        done: Dict mapping file_id to its latest manifest entry
+    """
+    done = {}
+    manifest_path = output_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return done
+
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Partially written last line from an interrupted run
+                continue
+            done[entry['file_id']] = entry
+    return done
+
+
+def _init_worker():
+    """Keep each worker on one intra-op thread so processes don't oversubscribe cores"""
+    import torch
+    torch.set_num_threads(1)
+
+
+def _get_feature_store(path: str, fps: int):
+    global _feature_store
+    if _feature_store is None:
+        from inference.realtime_pipeline import open_feature_store
+        _feature_store = open_feature_store(path, fps)
+    return _feature_store
+
+
+def _render_clip(task: dict) -> dict:
+    """
+    Render one clip in a worker process
+
+    Args:
+        task: Dict with file_id, audio_path, output_path, fps, codec,
+              params_path, features_path and the render key recorded by a
+              previous run
+
+    Returns:
+        result: Dict with file_id, status ('done', 'skipped' or 'error') and,
+                for rendered clips, the manifest entry fields
+    """
+    file_id = task['file_id']
+    start = time.perf_counter()
+    try:
+        from inference.realtime_pipeline import get_pipeline_version
+
+        audio_sha1 = _file_sha1(task['audio_path'])
+        key = render_key(audio_sha1, get_pipeline_version(), task['fps'], task['codec'])
+        if key == task['previous_key'] and os.path.exists(task['output_path']) \
+                and (not task['params_path'] or os.path.exists(task['params_path'])):
+            return {'file_id': file_id, 'status': 'skipped'}
+
+        import librosa
+        from inference.realtime_pipeline import SAMPLE_RATE, infer_parameters, parameters_from_features
+        from inference.param_sequence import save_param_sequence
+        from demo.app import render_video
+
+        store = _get_feature_store(task['features_path'], task['fps']) if task['features_path'] else None
+        if store is not None and file_id in store:
+            # Cached encoder output: skip audio decode and SpeechEncoder
+            params = parameters_from_features(store.get(file_id), task['fps'])
+            audio_seconds = len(params['expression']) / task['fps']
+        else:
+            audio, _ = librosa.load(task['audio_path'], sr=SAMPLE_RATE)
+            params = infer_parameters(audio, task['fps'])
+            audio_seconds = len(audio) / SAMPLE_RATE
+        if task['params_path']:
+            save_param_sequence(task['params_path'], params)
+        render_video(params, task['output_path'], codec=task['codec'], verbose=False)
+
+        return {
+            'file_id': file_id,
+            'status': 'done',
+            'audio_sha1': audio_sha1,
+            'render_key': key,
+            'output': os.path.basename(task['output_path']),
+            'frames': len(params['expression']),
+            'audio_seconds': round(audio_seconds, 3),
+            'render_seconds': round(time.perf_counter() - start, 3),
+        }
+    except Exception as e:
+        return {'file_id': file_id, 'status': 'error', 'error': str(e)}
+
+
+def _read_subset(path: str) -> list:
+    """Read file_ids (first '|'-separated column) from a subset manifest file"""
+    with open(path, encoding='utf-8') as f:
+        return [line.split('|')[0].strip() for line in f if line.strip()]
+
+
+def batch_render(dataset_path: str, output_dir: str, subset_path: str = None,
+                 workers: int = None, fps: int = 30, codec: str = None,
+                 save_params: bool = False, limit: int = None, features_path: str = None):
+    """
+    Render every clip of a dataset, skipping clips that are already done
+
+    Args:
+        dataset_path: Path to LJ Speech dataset folder
+        output_dir: Directory for rendered videos and the manifest
+        subset_path: Optional file listing the file_ids to render, one per line
+        workers: Number of worker processes (None = CPU count)
+        fps: Frames per second for output videos
+        codec: OpenCV FourCC code for output videos (None = ffmpeg when installed)
+        save_params: Also write <file_id>.npz parameter files
+        limit: Render at most this many clips (after subset filtering)
+        features_path: Optional FeatureStore directory (see cache_features.py)
+                       whose cached encoder features are used when present
+    """
+    loader = LJSpeechLoader(dataset_path)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    samples = [loader.get_sample(i) for i in range(len(loader))]
+    if subset_path:
+        wanted = set(_read_subset(subset_path))
+        samples = [s for s in samples if s['file_id'] in wanted]
+    if limit is not None:
+        samples = samples[:limit]
+
+    done = load_manifest(output_dir)
+    tasks = []
+    for sample in samples:
+        file_id = sample['file_id']
+        tasks.append({
+            'file_id': file_id,
+            'audio_path': sample['audio_path'],
+            'output_path': str(output_dir / f"{file_id}.mp4"),
+            'params_path': str(output_dir / f"{file_id}.npz") if save_params else None,
+            'fps': fps,
+            'codec': codec,
+            'features_path': features_path,
+            'previous_key': done.get(file_id, {}).get('render_key'),
+        })
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Rendering {len(tasks)} clips with {workers} workers "
+          f"({sum(t['previous_key'] is not None for t in tasks)} in manifest)")
+
+    counts = {'done': 0, 'skipped': 0, 'error': 0}
+    audio_seconds = 0.0
+    start = time.perf_counter()
+
+    with open(output_dir / MANIFEST_NAME, 'a', encoding='utf-8') as manifest, \
+            mp.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(_render_clip, tasks):
+            status = result.pop('status')
+            counts[status] += 1
+
+            if status == 'done':
+                audio_seconds += result['audio_seconds']
+                manifest.write(json.dumps(result) + '\n')
+                manifest.flush()
+            elif status == 'error':
+                print(f"  ⚠️  {result['file_id']}: {result['error']}")
+
+            finished = sum(counts.values())
+            if finished % 50 == 0 or finished == len(tasks):
+                elapsed = time.perf_counter() - start
+                rate = counts['done'] / elapsed * 3600 if elapsed > 0 else 0.0
+                print(f"  {finished}/{len(tasks)} clips "
+                      f"(rendered {counts['done']}, skipped {counts['skipped']}, "
+                      f"errors {counts['error']}) - {rate:.0f} clips/hour")
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ Batch complete in {elapsed:.1f}s")
+    print(f"  Rendered: {counts['done']}, skipped: {counts['skipped']}, errors: {counts['error']}")
+    if counts['done'] and elapsed > 0:
+        print(f"  Throughput: {counts['done'] / elapsed * 3600:.0f} clips/hour, "
+              f"{audio_seconds / elapsed:.2f}x real time")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch render avatar videos for a whole dataset')
+    parser.add_argument('--dataset', type=str,
+                       default=r"C:\Users\Yuva sri\Downloads\lj-speech-dataset-master\lj-speech-dataset",
+                       help='Path to LJ Speech dataset')
+    parser.add_argument('--output-dir', type=str, default='batch_renders',
+                       help='Output directory for videos and manifest')
+    parser.add_argument('--subset', type=str, default=None,
+                       help='File listing the file_ids to render (default: whole dataset)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--fps', type=int, default=30,
+                       help='Frames per second (default: 30)')
+    parser.add_argument('--codec', type=str, default=None,
+                       choices=['XVID', 'MJPG', 'mp4v', 'avc1'],
+                       help='Use the OpenCV writer with this codec (default: FFmpeg if installed)')
+    parser.add_argument('--save-params', action='store_true',
+                       help='Also save per-clip parameter files (.npz)')
+    parser.add_argument('--limit', type=int, default=None,
+                       help='Render at most this many clips')
+    parser.add_argument('--features', type=str, default=None,
+                       help='Feature store built by cache_features.py (skips encoding cached clips)')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dataset):
+        print(f"Error: Dataset not found: {args.dataset}")
+        return
+
+    try:
+        batch_render(args.dataset, args.output_dir, args.subset, args.workers,
+                     args.fps, args.codec, args.save_params, args.limit, args.features)
+    except Exception as e:
+        print(f"Error during batch render: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Precompute SpeechEncoder features for a whole LJ Speech-style dataset
+
+Runs the encoder once per clip and stores the per-frame [T, 256] features in a
+sharded, memory-mapped FeatureStore, so calibration, evaluation and batch
+renders (batch_render.py --features) can skip audio decoding and encoding.
+Clips already in the store are skipped; a store built with other encoder
+weights is detected as stale and rebuilt.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from data_loader import LJSpeechLoader
+from inference.realtime_pipeline import SAMPLE_RATE, encode_features, open_feature_store
+
+
+def cache_features(dataset_path: str, store_path: str, fps: int = 30,
+                   batch_size: int = 32, num_workers: int = 4, limit: int = None):
+    """
+    Encode every dataset clip missing from the feature store
+
+    Args:
+        dataset_path: Path to LJ Speech dataset folder
+        store_path: Feature store directory
+        fps: Frame rate the features are computed at
+        batch_size: Number of frame windows encoded at once
+        num_workers: Number of audio decode workers
+        limit: Process at most this many clips
+    """
+    loader = LJSpeechLoader(dataset_path, sample_rate=SAMPLE_RATE)
+    store = open_feature_store(store_path, fps)
+
+    indices = [i for i in range(len(loader)) if loader.metadata.file_id(i) not in store]
+    missing = [i for i in indices if not os.path.exists(loader.get_audio_path(i))]
+    if missing:
+        print(f"Warning: skipping {len(missing)} clips with missing audio files")
+        missing = set(missing)
+        indices = [i for i in indices if i not in missing]
+    if limit is not None:
+        indices = indices[:limit]
+    print(f"Encoding {len(indices)} clips ({len(store)} already cached)")
+
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    for count, sample in enumerate(loader.iter_samples(indices, num_workers=num_workers), 1):
+        store.add(sample['file_id'], encode_features(sample['audio'], fps, batch_size))
+        audio_seconds += len(sample['audio']) / SAMPLE_RATE
+
+        if count % 100 == 0:
+            elapsed = time.perf_counter() - start
+            print(f"  Encoded {count}/{len(indices)} clips ({audio_seconds / elapsed:.1f}x real time)")
+    store.flush()
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ Feature store: {store_path} ({len(store)} clips)")
+    if indices and elapsed > 0:
+        print(f"  Encoded {len(indices)} clips in {elapsed:.1f}s ({audio_seconds / elapsed:.1f}x real time)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute speech features for a dataset')
+    parser.add_argument('--dataset', type=str,
+                       default=r"C:\Users\Yuva sri\Downloads\lj-speech-dataset-master\lj-speech-dataset",
+                       help='Path to LJ Speech dataset')
+    parser.add_argument('--store', type=str, default='feature_store',
+                       help='Feature store directory')
+    parser.add_argument('--fps', type=int, default=30,
+                       help='Frames per second the features are computed at (default: 30)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Frame windows encoded at once (default: 32)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Audio decode workers (default: 4)')
+    parser.add_argument('--limit', type=int, default=None,
+                       help='Encode at most this many clips')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dataset):
+        print(f"Error: Dataset not found: {args.dataset}")
+        return
+
+    try:
+        cache_features(args.dataset, args.store, args.fps, args.batch_size, args.workers, args.limit)
+    except Exception as e:
+        print(f"Error caching features: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
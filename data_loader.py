@@ -1,53 +1,136 @@
 """LJ Speech Dataset Loader"""
 import os
-import csv
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+def _decode_audio(path: str, sample_rate: int) -> np.ndarray:
+    """Decode and resample one clip to mono float32 (runs in prefetch workers)"""
+    import librosa
+    audio, _ = librosa.load(path, sr=sample_rate)
+    return audio.astype(np.float32, copy=False)
+
+
+class LJSpeechMetadata(Sequence):
+    """
+    Compact view of an LJ Speech metadata.csv
+
+    Keeps the raw file bytes plus one row of field offsets per clip instead of
+    three Python strings per row; fields are decoded on access.
+    """
+
+    def __init__(self, raw: bytes = b''):
+        """
+        Parse '|'-separated metadata rows with vectorized NumPy scans
+
+        Args:
+            raw: Contents of metadata.csv
+        """
+        self._raw = raw
+        self._offsets = self._parse(raw)
+
+    @staticmethod
+    def _parse(raw: bytes) -> np.ndarray:
+        """Return [N, 6] start/end byte offsets of (file_id, text, normalized_text)"""
+        data = np.frombuffer(raw, dtype=np.uint8)
+        if len(data) == 0:
+            return np.zeros((0, 6), dtype=np.int64)
+
+        line_ends = np.flatnonzero(data == ord('\n'))
+        if len(line_ends) == 0 or line_ends[-1] != len(data) - 1:
+            line_ends = np.append(line_ends, len(data))
+        line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+
+        # Drop the '\r' of CRLF line endings
+        content_ends = line_ends.copy()
+        has_cr = (content_ends > line_starts) & (data[np.minimum(content_ends - 1, len(data) - 1)] == ord('\r'))
+        content_ends[has_cr] -= 1
+
+        # Locate the first three '|' separators of every line
+        pipes = np.flatnonzero(data == ord('|'))
+        pipe_line = np.searchsorted(line_ends, pipes)
+        counts = np.bincount(pipe_line, minlength=len(line_ends))
+        first = np.searchsorted(pipe_line, np.arange(len(line_ends)))
+
+        # Rows need at least 3 fields; extra fields are ignored
+        valid = np.flatnonzero(counts >= 2)
+        sep1 = pipes[first[valid]]
+        sep2 = pipes[first[valid] + 1]
+        end3 = content_ends[valid].copy()
+        has_sep3 = counts[valid] >= 3
+        end3[has_sep3] = pipes[first[valid][has_sep3] + 2]
+
+        return np.stack([line_starts[valid], sep1, sep1 + 1, sep2, sep2 + 1, end3], axis=1).astype(np.int64)
+
+    def _field(self, start: int, end: int) -> str:
+        return self._raw[start:end].decode('utf-8')
+
+    def file_id(self, index: int) -> str:
+        """Get only the file_id of a row"""
+        start, end = self._offsets[index, :2]
+        return self._field(start, end)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> Tuple[str, str, str]:
+        row = self._offsets[index]
+        return (self._field(row[0], row[1]), self._field(row[2], row[3]), self._field(row[4], row[5]))
+
 
 class LJSpeechLoader:
     """Loader for LJ Speech dataset"""
     
-    def __init__(self, dataset_path: str):
+    def __init__(self, dataset_path: str, sample_rate: int = 16000):
         """
         Initialize LJ Speech loader
         
         Args:
             dataset_path: Path to LJ Speech dataset folder
+            sample_rate: Sample rate that decoded audio is resampled to
         """
         self.dataset_path = Path(dataset_path)
         self.metadata_file = self.dataset_path / "metadata.csv"
         self.wavs_dir = self.dataset_path / "wavs"
+        self.sample_rate = sample_rate
         
         # Load metadata
         self.metadata = self._load_metadata()
         
-    def _load_metadata(self) -> List[Tuple[str, str, str]]:
+    def _load_metadata(self) -> LJSpeechMetadata:
         """Load metadata from CSV file"""
-        metadata = []
-        
         if not self.metadata_file.exists():
             print(f"Warning: metadata.csv not found at {self.metadata_file}")
-            return metadata
+            return LJSpeechMetadata()
             
-        with open(self.metadata_file, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f, delimiter='|')
-            for row in reader:
-                if len(row) >= 3:
-                    file_id, text, normalized_text = row[0], row[1], row[2]
-                    metadata.append((file_id, text, normalized_text))
-                    
-        return metadata
+        with open(self.metadata_file, 'rb') as f:
+            return LJSpeechMetadata(f.read())
     
     def __len__(self) -> int:
         """Get number of samples"""
         return len(self.metadata)
     
+    def __getitem__(self, index: int) -> dict:
+        """Get complete sample with decoded audio for given index"""
+        sample = self.get_sample(index)
+        sample['audio'] = self.load_audio(index)
+        return sample
+    
+    def __iter__(self) -> Iterator[dict]:
+        """Iterate over all samples with decoded audio, prefetching ahead"""
+        return self.iter_samples()
+    
     def get_audio_path(self, index: int) -> str:
         """Get audio file path for given index"""
         if index < 0 or index >= len(self.metadata):
             raise IndexError(f"Index {index} out of range [0, {len(self.metadata)})")
             
-        file_id = self.metadata[index][0]
+        file_id = self.metadata.file_id(index)
         audio_path = self.wavs_dir / f"{file_id}.wav"
         
         return str(audio_path)
@@ -57,7 +140,8 @@ class LJSpeechLoader:
         if index < 0 or index >= len(self.metadata):
             raise IndexError(f"Index {index} out of range [0, {len(self.metadata)})")
             
-        return self.metadata[index][1], self.metadata[index][2]
+        _, text, normalized_text = self.metadata[index]
+        return text, normalized_text
     
     def get_sample(self, index: int) -> dict:
         """Get complete sample (audio path and text) for given index"""
@@ -68,7 +152,106 @@ class LJSpeechLoader:
             'audio_path': audio_path,
             'text': text,
             'normalized_text': normalized_text,
-            'file_id': self.metadata[index][0]
+            'file_id': self.metadata.file_id(index)
+        }
+    
+    def load_audio(self, index: int) -> np.ndarray:
+        """Decode audio for given index, resampled to self.sample_rate"""
+        return _decode_audio(self.get_audio_path(index), self.sample_rate)
+    
+    def get_duration(self, index: int) -> float:
+        """Get clip duration in seconds from the file header, without decoding"""
+        import soundfile as sf
+        info = sf.info(self.get_audio_path(index))
+        return info.frames / info.samplerate
+    
+    def iter_samples(self, indices: Optional[List[int]] = None, prefetch: int = 8,
+                     num_workers: int = 4, use_processes: bool = False) -> Iterator[dict]:
+        """
+        Iterate over samples while decoding the next clips in the background
+        
+        Args:
+            indices: Sample indices to visit, in order (None = all samples)
+            prefetch: Number of clips decoded ahead of the consumer
+            num_workers: Number of decode workers
+            use_processes: Decode in worker processes instead of threads
+            
+        Yields:
+            sample: Sample dict as from get_sample, plus 'audio' (float32 array)
+        """
+        if indices is None:
+            indices = range(len(self))
+        indices = iter(indices)
+        prefetch = max(1, prefetch)
+        
+        executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_cls(max_workers=num_workers) as executor:
+            pending = deque()
+            
+            def submit_next():
+                index = next(indices, None)
+                if index is not None:
+                    sample = self.get_sample(index)
+                    pending.append((sample, executor.submit(
+                        _decode_audio, sample['audio_path'], self.sample_rate)))
+            
+            for _ in range(prefetch):
+                submit_next()
+            
+            while pending:
+                sample, future = pending.popleft()
+                submit_next()
+                sample['audio'] = future.result()
+                yield sample
+    
+    def iter_batches(self, batch_size: int = 8, bucket_by_length: bool = True,
+                     indices: Optional[List[int]] = None, **prefetch_kwargs) -> Iterator[dict]:
+        """
+        Iterate over zero-padded batches of decoded clips
+        
+        With bucket_by_length, clips are sorted by duration (read from file
+        headers) before batching, so clips in a batch have similar lengths and
+        little of the padded batch is wasted.
+        
+        Args:
+            batch_size: Number of clips per batch
+            bucket_by_length: Group clips of similar duration into batches
+            indices: Sample indices to use (None = all samples)
+            **prefetch_kwargs: Passed to iter_samples (prefetch, num_workers, use_processes)
+            
+        Yields:
+            batch: Dict with 'file_id' and 'text' lists, 'audio' [B, max_len]
+                   float32 array and 'lengths' [B] array of valid samples
+        """
+        if indices is None:
+            indices = range(len(self))
+        indices = list(indices)
+        if bucket_by_length:
+            durations = np.array([self.get_duration(i) for i in indices])
+            indices = [indices[i] for i in np.argsort(durations, kind='stable')]
+        
+        batch = []
+        for sample in self.iter_samples(indices, **prefetch_kwargs):
+            batch.append(sample)
+            if len(batch) == batch_size:
+                yield self._collate(batch)
+                batch = []
+        if batch:
+            yield self._collate(batch)
+    
+    @staticmethod
+    def _collate(samples: List[dict]) -> dict:
+        """Stack decoded samples into one zero-padded batch"""
+        lengths = np.array([len(s['audio']) for s in samples], dtype=np.int64)
+        audio = np.zeros((len(samples), lengths.max(initial=0)), dtype=np.float32)
+        for row, sample in enumerate(samples):
+            audio[row, :lengths[row]] = sample['audio']
+        
+        return {
+            'file_id': [s['file_id'] for s in samples],
+            'text': [s['text'] for s in samples],
+            'audio': audio,
+            'lengths': lengths
         }
 
 
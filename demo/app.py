@@ -5,8 +5,7 @@ This script demonstrates the avatar system with video generation capabilities.
 """
 import argparse
 import os
-import cv2
-import numpy as np
+import time
 import librosa
 from pathlib import Path
 import sys
@@ -14,10 +13,171 @@ import sys
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from inference.realtime_pipeline import run_pipeline
+from inference.realtime_pipeline import (create_renderer, infer_parameters, render_parameters,
+                                         render_threads, stream_parameters, viseme_parameters)
+from inference import metrics
+from inference.param_sequence import save_param_sequence
+from inference.profiling import PROFILE_ENV, profile_dir, profile_run
+from postprocessing.frame_delta import DeltaEncoder
+from postprocessing.frame_pool import FramePool
+from postprocessing.video_writer import ENCODER_PRESETS, open_video_writer
+from preprocessing.audio_cleaner import stream_clean_audio
 
 
-def generate_video(audio_path: str, output_path: str, fps: int = 30):
+def _frame_pool(renderer):
+    """Ring of frames for the render loop: enough for every render thread's frames in flight"""
+    width, height = renderer.resolution
+    return FramePool((height, width, 3), 2 * render_threads(renderer) + 1)
+
+
+def render_video(params: dict, output_path: str, codec: str = None, size: tuple = None,
+                 verbose: bool = True, audio_path: str = None, backend: str = 'auto',
+                 preset: str = 'fast', threads: int = 0, progress=None, preview: bool = False,
+                 supersample: int = None, quality: int = None):
+    """
+    Render a parameter sequence to a video file without running any model
+    
+    Frames are rendered into a ring of preallocated buffers (FramePool) in
+    the writer's native channel order and handed to the writer as they are,
+    so the steady-state loop makes no per-frame allocations.
+    
+    Args:
+        params: Parameter dict from infer_parameters or load_param_sequence
+        output_path: Path to output video file (or image sequence pattern,
+                     e.g. frames/%06d.jpg)
+        codec: OpenCV FourCC code to use (forces the OpenCV writer)
+        size: Output frame size as (width, height), rendered natively
+              (None = configured resolution)
+        verbose: Print progress and summary lines
+        audio_path: Audio file muxed into the output in the same pass (ffmpeg only)
+        backend: Video writer backend: 'auto', 'ffmpeg', 'opencv' or 'images'
+        preset: ffmpeg encoder preset (see postprocessing.video_writer.ENCODER_PRESETS)
+        threads: ffmpeg / image encoder threads (0 = auto)
+        progress: Optional callback progress(frames_done, total_frames)
+        preview: Render at the preview resolution without supersampling
+        supersample: Anti-aliasing supersampling factor (None = configured)
+        quality: JPEG quality / PNG compression level of image sequences
+    """
+    fps = params['fps']
+    total_frames = len(params['expression'])
+    if total_frames == 0:
+        raise ValueError("Parameter sequence has no frames to render")
+    
+    renderer = create_renderer(preview=preview, resolution=size, supersample=supersample)
+    width, height = renderer.resolution
+    out = open_video_writer(output_path, fps, (width, height), audio_path=audio_path,
+                            backend=backend, preset=preset, threads=threads,
+                            codec=codec, verbose=verbose, channels=None, quality=quality)
+    
+    start = time.perf_counter()
+    frames = render_parameters(params, renderer, pool=_frame_pool(renderer), channels=out.channels)
+    for frame_idx, frame in enumerate(frames):
+        with metrics.time_stage('video_write'):
+            out.write(frame)
+        
+        if progress is not None:
+            progress(frame_idx + 1, total_frames)
+        if verbose and (frame_idx + 1) % 30 == 0:
+            print(f"  Rendered {frame_idx + 1}/{total_frames} frames ({(frame_idx + 1) / total_frames * 100:.1f}%)")
+    
+    with metrics.time_stage('video_write'):
+        out.release()
+    metrics.record_frames(total_frames, time.perf_counter() - start)
+    if verbose:
+        print(f"✓ Video saved to: {output_path}")
+        print(f"✓ Frames: {total_frames}, Resolution: {width}x{height}, FPS: {fps}")
+
+
+def stream_video(audio_path: str, output_path: str, fps: int = 30, codec: str = None,
+                 with_audio: bool = False, backend: str = 'auto', preset: str = 'fast',
+                 threads: int = 0, normalize: str = 'rms', preview: bool = False,
+                 supersample: int = None, quality: int = None):
+    """
+    Generate video from audio in constant memory
+    
+    Audio is decoded and normalized block by block (stream_clean_audio), each
+    frame is inferred once its window has arrived and rendered frames go
+    straight to the writer, so arbitrarily long recordings never have to fit
+    in memory.
+    
+    Args:
+        audio_path: Path to input audio file
+        output_path: Path to output video file
+        fps: Frames per second for output video
+        codec: OpenCV FourCC code to use (forces the OpenCV writer)
+        with_audio: Mux the input audio into the output video (needs ffmpeg)
+        backend: Video writer backend: 'auto', 'ffmpeg', 'opencv' or 'images'
+        preset: ffmpeg encoder preset (see postprocessing.video_writer.ENCODER_PRESETS)
+        threads: ffmpeg / image encoder threads (0 = auto)
+        normalize: Streaming gain mode: 'rms' (AGC) or 'peak'
+        preview: Render at the preview resolution without supersampling
+        supersample: Anti-aliasing supersampling factor (None = configured)
+        quality: JPEG quality / PNG compression level of image sequences
+    """
+    print(f"Streaming audio: {audio_path}")
+    
+    renderer = create_renderer(preview=preview, supersample=supersample)
+    pool = _frame_pool(renderer)
+    out = None
+    total_frames = 0
+    start = time.perf_counter()
+    for chunk in stream_parameters(stream_clean_audio(audio_path, mode=normalize), fps):
+        if out is None:
+            width, height = renderer.resolution
+            out = open_video_writer(output_path, fps, (width, height),
+                                    audio_path=audio_path if with_audio else None,
+                                    backend=backend, preset=preset, threads=threads,
+                                    codec=codec, channels=None, quality=quality)
+        for frame in render_parameters(chunk, renderer, pool=pool, channels=out.channels):
+            with metrics.time_stage('video_write'):
+                out.write(frame)
+            total_frames += 1
+        
+        if total_frames % (fps * 10) < len(chunk['expression']):
+            print(f"  Rendered {total_frames} frames ({total_frames / fps:.1f}s)")
+    
+    if out is None:
+        raise ValueError("Audio is too short to render any frames")
+    with metrics.time_stage('video_write'):
+        out.release()
+    metrics.record_frames(total_frames, time.perf_counter() - start)
+    print(f"✓ Video saved to: {output_path}")
+    print(f"✓ Frames: {total_frames}, Resolution: {width}x{height}, FPS: {fps}")
+
+
+def stream_frame_deltas(audio_path: str, fps: int = 30, preview: bool = False,
+                        keyframe_interval: int = 60):
+    """
+    Render audio frame by frame as dirty-rectangle delta messages
+    
+    Runs the constant-memory streaming pipeline of stream_video, but instead
+    of writing a video each frame is encoded by
+    postprocessing.frame_delta.DeltaEncoder for live viewers.
+    
+    Args:
+        audio_path: Path to input audio file
+        fps: Frames per second
+        preview: Render at the preview resolution without supersampling
+        keyframe_interval: Frames between full keyframes
+        
+    Yields:
+        message: Binary frame message (see postprocessing.frame_delta)
+    """
+    renderer = create_renderer(preview=preview)
+    pool = _frame_pool(renderer)
+    encoder = DeltaEncoder(keyframe_interval)
+    for chunk in stream_parameters(stream_clean_audio(audio_path), fps):
+        for frame in render_parameters(chunk, renderer, pool=pool):
+            yield encoder.encode(frame)
+
+
+def generate_video(audio_path: str, output_path: str, fps: int = 30,
+                   params_path: str = None, codec: str = None, with_audio: bool = False,
+                   backend: str = 'auto', preset: str = 'fast', threads: int = 0,
+                   mouth: str = 'model', silence: str = None, progress=None,
+                   single_pass: bool = False, keyframe_rate: float = None,
+                   interpolation: str = 'cubic', preview: bool = False,
+                   supersample: int = None, quality: int = None):
     """
     Generate video from audio with talking avatar
     
@@ -25,100 +185,56 @@ def generate_video(audio_path: str, output_path: str, fps: int = 30):
         audio_path: Path to input audio file
         output_path: Path to output video file
         fps: Frames per second for output video
+        params_path: Optional path to also save the per-frame parameter
+                     sequence (.npz) for later render-only runs
+        codec: OpenCV FourCC code to use (forces the OpenCV writer)
+        with_audio: Mux the input audio into the output video (needs ffmpeg)
+        backend: Video writer backend: 'auto', 'ffmpeg', 'opencv' or 'images'
+        preset: ffmpeg encoder preset (see postprocessing.video_writer.ENCODER_PRESETS)
+        threads: ffmpeg / image encoder threads (0 = auto)
+        mouth: 'model' runs the full model chain per frame; 'viseme' drives
+               the mouth from spectral visemes and skips the models entirely
+        silence: Skip model inference on silent spans, holding the idle pose
+                 ('idle') or interpolating across them ('interpolate')
+        progress: Optional callback progress(frames_done, total_frames)
+        single_pass: Encode the whole clip in one conv pass instead of once
+                     per frame window (offline only; see encode_features)
+        keyframe_rate: Run the models at this rate (Hz) and interpolate the
+                       parameters up to fps (None = every frame)
+        interpolation: Keyframe interpolation, 'cubic' or 'linear'
+        preview: Render at the preview resolution without supersampling
+        supersample: Anti-aliasing supersampling factor (None = configured)
+        quality: JPEG quality / PNG compression level of image sequences
     """
     print(f"Loading audio: {audio_path}")
     
     # Load audio
-    audio, sr = librosa.load(audio_path, sr=16000)
+    with metrics.time_stage('decode'):
+        audio, sr = librosa.load(audio_path, sr=16000)
     duration = len(audio) / sr
     total_frames = int(duration * fps)
     
     print(f"Audio duration: {duration:.2f}s, generating {total_frames} frames at {fps} FPS")
     
-    # Generate first frame to get dimensions
-    print("Generating frames...")
-    first_frame = run_pipeline(audio_path)
-    height, width = first_frame.shape[:2]
-    
-    # Create video writer with better codec compatibility
-    # Try different codecs for better compatibility
-    codecs = [
-        ('avc1', 'H.264 (best compatibility)'),
-        ('XVID', 'Xvid'),
-        ('MJPG', 'Motion JPEG'),
-        ('mp4v', 'MPEG-4')
-    ]
+    if mouth == 'viseme':
+        print("Extracting visemes...")
+        params = viseme_parameters(audio, fps)
+    else:
+        # Run encoder -> expression -> motion for every frame window
+        print("Running models...")
+        params = infer_parameters(audio, fps, silence=silence, single_pass=single_pass,
+                                  keyframe_rate=keyframe_rate, interpolation=interpolation)
+        if silence:
+            print(f"Skipped inference on {int(params['silent'].sum())}/{total_frames} silent frames")
     
-    out = None
-    for codec, name in codecs:
-        try:
-            fourcc = cv2.VideoWriter_fourcc(*codec)
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            if out.isOpened():
-                print(f"Using codec: {name}")
-                break
-        except:
-            continue
-    
-    if out is None or not out.isOpened():
-        # Fallback to default
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-    
-    if not out.isOpened():
-        raise RuntimeError(f"Failed to create video writer for {output_path}")
-    
-    # Calculate samples per frame
-    samples_per_frame = int(sr / fps)
-    
-    # Generate video frame by frame
-    for frame_idx in range(total_frames):
-        # Extract audio segment for this frame
-        start_sample = frame_idx * samples_per_frame
-        end_sample = min(start_sample + 16000, len(audio))
-        
-        # Pad if needed
-        audio_segment = audio[start_sample:start_sample + 16000]
-        if len(audio_segment) < 16000:
-            audio_segment = np.pad(audio_segment, (0, 16000 - len(audio_segment)))
-        
-        # Generate frame (using the full pipeline with audio variation)
-        import torch
-        from models import SpeechEncoder, ExpressionModel, MotionModel, Renderer
-        
-        # Initialize models (will use singleton cache)
-        speech_encoder = SpeechEncoder()
-        expression_model = ExpressionModel()
-        motion_model = MotionModel()
-        renderer = Renderer()
-        
-        speech_encoder.eval()
-        expression_model.eval()
-        motion_model.eval()
-        
-        # Process audio segment
-        audio_tensor = torch.FloatTensor(audio_segment).unsqueeze(0)
-        
-        with torch.no_grad():
-            # Extract features
-            features = speech_encoder(audio_tensor)
-            # Generate expression
-            expression = expression_model(features)
-            # Generate motion
-            motion = motion_model(expression)
-            # Render frame
-            frame = renderer.render(expression, motion)
-        
-        # Convert RGB to BGR for OpenCV
-        frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        out.write(frame_bgr)
-        
-        if (frame_idx + 1) % 30 == 0:
-            print(f"  Generated {frame_idx + 1}/{total_frames} frames ({(frame_idx + 1) / total_frames * 100:.1f}%)")
+    if params_path:
+        save_param_sequence(params_path, params)
+        print(f"✓ Parameters saved to: {params_path}")
     
-    out.release()
-    print(f"✓ Video saved to: {output_path}")
-    print(f"✓ Duration: {duration:.2f}s, Resolution: {width}x{height}, FPS: {fps}")
+    print("Generating frames...")
+    render_video(params, output_path, codec=codec, audio_path=audio_path if with_audio else None,
+                 backend=backend, preset=preset, threads=threads, progress=progress,
+                 preview=preview, supersample=supersample, quality=quality)
 
 
 def main():
@@ -126,9 +242,49 @@ def main():
     parser.add_argument('--audio', type=str, required=True,
                        help='Input audio file path')
     parser.add_argument('--output', type=str, default='output_video.mp4',
-                       help='Output video file path')
+                       help='Output video file path (or image pattern, e.g. frames/%%06d.jpg)')
     parser.add_argument('--fps', type=int, default=30,
                        help='Frames per second (default: 30)')
+    parser.add_argument('--save-params', type=str, default=None,
+                       help='Also save per-frame parameters to this .npz file')
+    parser.add_argument('--with-audio', action='store_true',
+                       help='Mux the input audio into the video (requires FFmpeg)')
+    parser.add_argument('--backend', type=str, default='auto',
+                       choices=['auto', 'ffmpeg', 'opencv', 'images'],
+                       help='Video writer backend (default: images for .jpg/.png output, '
+                            'else ffmpeg if installed)')
+    parser.add_argument('--preset', type=str, default='fast',
+                       choices=sorted(ENCODER_PRESETS),
+                       help='FFmpeg encoder preset (default: fast)')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='FFmpeg / image encoder threads (default: 0 = auto)')
+    parser.add_argument('--quality', type=int, default=None,
+                       help='Image sequence JPEG quality (0-100, default 90) or PNG '
+                            'compression level (0-9, default 3)')
+    parser.add_argument('--mouth', type=str, default='model',
+                       choices=['model', 'viseme'],
+                       help='Mouth driver: full models (default) or cheap spectral visemes')
+    parser.add_argument('--skip-silence', type=str, default=None,
+                       choices=['idle', 'interpolate'],
+                       help='Skip inference on silent spans: hold idle pose or interpolate')
+    parser.add_argument('--single-pass', action='store_true',
+                       help='Encode the clip in one conv pass (offline, ~30x less encoder compute)')
+    parser.add_argument('--keyframe-rate', type=float, default=None,
+                       help='Run the models at this rate (Hz, e.g. 10-15) and interpolate to --fps')
+    parser.add_argument('--interpolation', type=str, default='cubic',
+                       choices=['cubic', 'linear'],
+                       help='Keyframe interpolation (default: cubic)')
+    parser.add_argument('--stream', type=str, default=None, nargs='?', const='rms',
+                       choices=['rms', 'peak'],
+                       help='Decode, normalize (rms AGC or peak) and render in constant memory')
+    parser.add_argument('--preview', action='store_true',
+                       help='Render a quick preview at the configured preview resolution')
+    parser.add_argument('--supersample', type=int, default=None,
+                       help='Anti-aliasing: draw at N x the resolution and downsample '
+                            '(default: configured, usually 1)')
+    parser.add_argument('--profile', type=str, default=None, metavar='DIR',
+                       help=f'Write a Chrome trace and speedscope profile of the run to DIR '
+                            f'(also enabled by ${PROFILE_ENV})')
     
     args = parser.parse_args()
     
@@ -137,8 +293,30 @@ def main():
         print(f"Error: Audio file not found: {args.audio}")
         return
     
+    output_dir = profile_dir(args.profile)
+    if output_dir:
+        with profile_run('generate_video', output_dir):
+            _generate_from_args(args)
+    else:
+        _generate_from_args(args)
+
+
+def _generate_from_args(args):
+    """Generate the video requested on the command line"""
     try:
-        generate_video(args.audio, args.output, args.fps)
+        if args.stream:
+            stream_video(args.audio, args.output, args.fps, with_audio=args.with_audio,
+                         backend=args.backend, preset=args.preset, threads=args.threads,
+                         normalize=args.stream, preview=args.preview,
+                         supersample=args.supersample, quality=args.quality)
+            return
+        generate_video(args.audio, args.output, args.fps, params_path=args.save_params,
+                       with_audio=args.with_audio, backend=args.backend,
+                       preset=args.preset, threads=args.threads, mouth=args.mouth,
+                       silence=args.skip_silence, single_pass=args.single_pass,
+                       keyframe_rate=args.keyframe_rate, interpolation=args.interpolation,
+                       preview=args.preview, supersample=args.supersample,
+                       quality=args.quality)
     except Exception as e:
         print(f"Error generating video: {e}")
         import traceback
@@ -3,35 +3,167 @@ Convert video to different formats for better compatibility
 """
 import cv2
 import argparse
+import json
+import re
+import shutil
+import subprocess
+import sys
+import time
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-def convert_video(input_path: str, output_path: str, codec: str = 'XVID'):
+from postprocessing.video_writer import ffmpeg_available
+
+
+# Video/audio codecs each container accepts as-is, and the audio codec used when
+# the input audio has to be re-encoded
+CONTAINER_CODECS = {
+    '.mp4': ({'h264', 'hevc', 'mpeg4', 'av1'}, {'aac', 'mp3', 'alac'}, 'aac'),
+    '.m4v': ({'h264', 'hevc', 'mpeg4'}, {'aac', 'mp3', 'alac'}, 'aac'),
+    '.mov': ({'h264', 'hevc', 'mpeg4', 'mjpeg', 'prores'}, {'aac', 'mp3', 'alac', 'pcm_s16le'}, 'aac'),
+    '.mkv': (None, None, 'aac'),  # Matroska holds anything
+    '.avi': ({'mpeg4', 'h264', 'mjpeg', 'rawvideo'}, {'mp3', 'pcm_s16le', 'ac3'}, 'mp3'),
+}
+
+# FourCC choices mapped to (ffmpeg codec name, encoder arguments)
+FOURCC_ENCODERS = {
+    'avc1': ('h264', ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20', '-pix_fmt', 'yuv420p']),
+    'XVID': ('mpeg4', ['-c:v', 'mpeg4', '-vtag', 'xvid', '-q:v', '3']),
+    'mp4v': ('mpeg4', ['-c:v', 'mpeg4', '-q:v', '3']),
+    'MJPG': ('mjpeg', ['-c:v', 'mjpeg', '-q:v', '3', '-pix_fmt', 'yuvj420p']),
+}
+
+# Codec used when none is requested and the input codec can't be kept
+DEFAULT_FOURCC = {'.avi': 'XVID'}
+
+
+def probe_media(path: str) -> dict:
     """
-    Convert video to different codec/format
+    Inspect the first video/audio stream of a media file with ffprobe (or ffmpeg)
+    
+    Returns:
+        info: Dict with 'video_codec', 'audio_codec' (None if absent) and
+              'duration' in seconds (None if unknown)
+    """
+    if shutil.which('ffprobe'):
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_type,codec_name:format=duration',
+             '-of', 'json', path],
+            capture_output=True, text=True, check=True)
+        data = json.loads(result.stdout)
+        streams = data.get('streams', [])
+        duration = data.get('format', {}).get('duration')
+        return {
+            'video_codec': next((st['codec_name'] for st in streams if st['codec_type'] == 'video'), None),
+            'audio_codec': next((st['codec_name'] for st in streams if st['codec_type'] == 'audio'), None),
+            'duration': float(duration) if duration not in (None, 'N/A') else None,
+        }
+    
+    # Without ffprobe, parse the stream summary ffmpeg prints for an input
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-i', path], capture_output=True, text=True)
+    video = re.search(r'Stream #\S+.*?: Video: (\w+)', result.stderr)
+    audio = re.search(r'Stream #\S+.*?: Audio: (\w+)', result.stderr)
+    duration = re.search(r'Duration: (\d+):(\d+):([\d.]+)', result.stderr)
+    return {
+        'video_codec': video.group(1) if video else None,
+        'audio_codec': audio.group(1) if audio else None,
+        'duration': (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60
+                     + float(duration.group(3))) if duration else None,
+    }
+
+
+def plan_conversion(info: dict, output_path: str, codec: str = None, mode: str = 'auto') -> dict:
+    """
+    Decide per stream whether to copy or re-encode
     
     Args:
-        input_path: Input video file
-        output_path: Output video file
-        codec: Codec to use (XVID, MJPG, avc1, mp4v)
+        info: Result of probe_media for the input
+        output_path: Output file (its extension selects the container)
+        codec: Requested FourCC (None = keep input codec if the container allows)
+        mode: 'auto', 'remux' (stream copy only) or 'transcode' (always re-encode video)
+        
+    Returns:
+        plan: Dict with 'video' and 'audio' ffmpeg argument lists and 'remux'
+              (True when no stream is re-encoded)
     """
-    print(f"Converting {input_path} to {output_path}")
-    print(f"Using codec: {codec}")
+    ext = Path(output_path).suffix.lower()
+    video_ok, audio_ok, audio_default = CONTAINER_CODECS.get(ext, (None, None, 'aac'))
+    
+    target_codec = FOURCC_ENCODERS[codec][0] if codec else info['video_codec']
+    can_copy_video = (info['video_codec'] is not None
+                      and target_codec == info['video_codec']
+                      and (video_ok is None or info['video_codec'] in video_ok))
     
+    if mode == 'remux' and not can_copy_video:
+        raise ValueError(f"Cannot remux {info['video_codec']} video into {ext or 'this container'}"
+                         + (f" as {codec}" if codec else ""))
+    
+    if can_copy_video and mode != 'transcode':
+        video_args = ['-c:v', 'copy']
+    else:
+        fourcc = codec or DEFAULT_FOURCC.get(ext, 'avc1')
+        video_args = FOURCC_ENCODERS[fourcc][1]
+    
+    if info['audio_codec'] is None:
+        audio_args = ['-an']
+    elif audio_ok is None or info['audio_codec'] in audio_ok:
+        audio_args = ['-c:a', 'copy']
+    else:
+        audio_args = ['-c:a', {'aac': 'aac', 'mp3': 'libmp3lame'}.get(audio_default, audio_default)]
+    
+    return {
+        'video': video_args,
+        'audio': audio_args,
+        'remux': video_args[1] == 'copy' and audio_args[-1] in ('copy', '-an'),
+    }
+
+
+def _convert_ffmpeg(input_path: str, output_path: str, codec: str, mode: str, threads: int) -> float:
+    """Convert with ffmpeg; returns the input duration in seconds (or None)"""
+    info = probe_media(input_path)
+    print(f"Input streams: video={info['video_codec']}, audio={info['audio_codec'] or 'none'}")
+    
+    plan = plan_conversion(info, output_path, codec, mode)
+    if plan['remux']:
+        print("Mode: remux (stream copy, no re-encode)")
+    else:
+        video = 'copy' if plan['video'][1] == 'copy' else f"re-encode with {plan['video'][1]}"
+        audio = 'none' if plan['audio'] == ['-an'] else (
+            'copy' if plan['audio'][1] == 'copy' else f"re-encode with {plan['audio'][1]}")
+        print(f"Mode: transcode (video: {video}, audio: {audio})")
+    
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-i', input_path,
+           '-map', '0:v:0', '-map', '0:a:0?', *plan['video'], *plan['audio'],
+           '-threads', str(threads), output_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()}")
+    return info['duration']
+
+
+def _convert_opencv(input_path: str, output_path: str, codec: str):
+    """
+    Re-encode every frame through OpenCV (fallback without ffmpeg; drops audio)
+    
+    Returns:
+        duration: Input duration in seconds, or None if the file can't be opened
+    """
     # Open input video
     cap = cv2.VideoCapture(input_path)
     
     if not cap.isOpened():
         print(f"Error: Cannot open video file: {input_path}")
-        return False
+        return None
     
     # Get video properties
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     
-    print(f"Input: {width}x{height}, {fps} FPS, {total_frames} frames")
+    print(f"Input: {width}x{height}, {fps:g} FPS, {total_frames} frames")
+    print("⚠️  FFmpeg not found: re-encoding with OpenCV, audio track will be dropped")
     
     # Create output video writer
     fourcc = cv2.VideoWriter_fourcc(*codec)
@@ -40,7 +172,7 @@ def convert_video(input_path: str, output_path: str, codec: str = 'XVID'):
     if not out.isOpened():
         print(f"Error: Cannot create output video with codec {codec}")
         cap.release()
-        return False
+        return None
     
     # Copy frames
     frame_count = 0
@@ -58,8 +190,51 @@ def convert_video(input_path: str, output_path: str, codec: str = 'XVID'):
     cap.release()
     out.release()
     
-    print(f"✓ Conversion complete: {output_path}")
     print(f"  Processed {frame_count} frames")
+    return frame_count / fps if fps else 0.0
+
+
+def convert_video(input_path: str, output_path: str, codec: str = None, mode: str = 'auto',
+                  threads: int = 0):
+    """
+    Convert video to different codec/format
+    
+    With ffmpeg installed, the input is probed first: if its video codec fits
+    the output container (and matches codec, when given) the streams are
+    copied without re-encoding; otherwise the video is transcoded with a
+    multi-threaded encoder. The audio track is kept either way.
+    
+    Args:
+        input_path: Input video file
+        output_path: Output video file
+        codec: Codec to use (XVID, MJPG, avc1, mp4v; None = keep input codec if possible)
+        mode: 'auto', 'remux' (fail rather than re-encode) or 'transcode' (always re-encode)
+        threads: ffmpeg encoder threads (0 = auto)
+    """
+    print(f"Converting {input_path} to {output_path}")
+    if codec:
+        print(f"Using codec: {codec}")
+    
+    start = time.perf_counter()
+    if ffmpeg_available():
+        try:
+            duration = _convert_ffmpeg(input_path, output_path, codec, mode, threads)
+        except (RuntimeError, ValueError, subprocess.CalledProcessError) as e:
+            print(f"Error: {e}")
+            return False
+    else:
+        if mode == 'remux':
+            print("Error: Remuxing requires FFmpeg")
+            return False
+        duration = _convert_opencv(input_path, output_path, codec or DEFAULT_FOURCC.get(
+            Path(output_path).suffix.lower(), 'mp4v'))
+        if duration is None:
+            return False
+    elapsed = time.perf_counter() - start
+    
+    print(f"✓ Conversion complete: {output_path}")
+    if duration and elapsed > 0:
+        print(f"  Took {elapsed:.2f}s for {duration:.2f}s of video ({duration / elapsed:.1f}x real time)")
     return True
 
 
@@ -69,9 +244,15 @@ def main():
                        help='Input video file')
     parser.add_argument('--output', type=str, default='output_video_converted.avi',
                        help='Output video file')
-    parser.add_argument('--codec', type=str, default='XVID',
+    parser.add_argument('--codec', type=str, default=None,
                        choices=['XVID', 'MJPG', 'mp4v', 'avc1'],
-                       help='Codec to use (default: XVID)')
+                       help='Codec to use (default: keep input codec if the container allows, '
+                            'else XVID for .avi and avc1 otherwise)')
+    parser.add_argument('--mode', type=str, default='auto',
+                       choices=['auto', 'remux', 'transcode'],
+                       help='auto: stream copy when possible; remux: copy only; transcode: always re-encode')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='FFmpeg encoder threads (default: 0 = auto)')
     
     args = parser.parse_args()
     
@@ -79,7 +260,7 @@ def main():
         print(f"Error: Input file not found: {args.input}")
         return
     
-    convert_video(args.input, args.output, args.codec)
+    convert_video(args.input, args.output, args.codec, args.mode, args.threads)
 
 
 if __name__ == "__main__":
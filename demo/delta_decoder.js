@@ -0,0 +1,74 @@
+/*
+ * Browser decoder for the /stream frame messages (postprocessing/frame_delta.py)
+ *
+ * Message (little endian): u8 version, u8 type (0 = keyframe, 1 = delta),
+ * u32 frame index, u16 width, u16 height, u16 rect count, then per rect
+ * u16 x, y, w, h and w * h * 3 RGB bytes, row major.
+ *
+ * Usage:
+ *   const decoder = new DeltaDecoder(canvas.getContext('2d'));
+ *   const ws = new WebSocket('ws://localhost:8000/stream?fps=30&format=wav');
+ *   ws.binaryType = 'arraybuffer';
+ *   ws.onopen = () => ws.send(audioFile);          // a File or ArrayBuffer
+ *   ws.onmessage = (event) => decoder.decode(event.data);
+ */
+class DeltaDecoder {
+    constructor(context) {
+        this.context = context;
+        this.image = null;
+        this.index = null;
+    }
+
+    decode(buffer) {
+        const view = new DataView(buffer);
+        const version = view.getUint8(0);
+        const keyframe = view.getUint8(1) === 0;
+        const index = view.getUint32(2, true);
+        const width = view.getUint16(6, true);
+        const height = view.getUint16(8, true);
+        const count = view.getUint16(10, true);
+        if (version !== 1) {
+            throw new Error(`Unsupported frame delta version ${version}`);
+        }
+        if (keyframe && (!this.image || this.image.width !== width || this.image.height !== height)) {
+            this.context.canvas.width = width;
+            this.context.canvas.height = height;
+            this.image = this.context.createImageData(width, height);
+        } else if (!this.image) {
+            throw new Error('Delta received before any keyframe');
+        }
+
+        // Patches are RGB; ImageData is RGBA (alpha stays 255)
+        const pixels = this.image.data;
+        const bytes = new Uint8Array(buffer);
+        const rects = [];
+        let offset = 12;
+        for (let r = 0; r < count; r++) {
+            const x = view.getUint16(offset, true);
+            const y = view.getUint16(offset + 2, true);
+            const w = view.getUint16(offset + 4, true);
+            const h = view.getUint16(offset + 6, true);
+            offset += 8;
+            rects.push([x, y, w, h]);
+            for (let row = 0; row < h; row++) {
+                let dst = ((y + row) * width + x) * 4;
+                for (let col = 0; col < w; col++, dst += 4, offset += 3) {
+                    pixels[dst] = bytes[offset];
+                    pixels[dst + 1] = bytes[offset + 1];
+                    pixels[dst + 2] = bytes[offset + 2];
+                    pixels[dst + 3] = 255;
+                }
+            }
+        }
+        // Only the changed rects are repainted
+        for (const [x, y, w, h] of rects) {
+            this.context.putImageData(this.image, 0, 0, x, y, w, h);
+        }
+        this.index = index;
+        return index;
+    }
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = { DeltaDecoder };
+}
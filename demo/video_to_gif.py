@@ -3,15 +3,234 @@ Convert video to animated GIF for universal compatibility
 """
 import cv2
 import argparse
+import itertools
+import sys
 from pathlib import Path
-from PIL import Image
+from PIL import GifImagePlugin, Image
 import numpy as np
 
 
+def build_palette(frames, colors: int = 256):
+    """
+    Build one global GIF palette from a sample of RGB frames
+    
+    Args:
+        frames: Iterable of RGB frames [H, W, 3] (a small subsample is enough)
+        colors: Palette size (at most 256)
+        
+    Returns:
+        palette: Palette as 768 bytes (RGB triplets, zero padded)
+        lut: Color lookup table [32, 32, 32] mapping 5-bit RGB to palette index
+    """
+    sample = np.concatenate([np.asarray(f, dtype=np.uint8) for f in frames], axis=0)
+    quantized = Image.fromarray(sample).quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+    palette = np.array(quantized.getpalette()[:colors * 3], dtype=np.int32).reshape(-1, 3)
+    
+    # Nearest palette entry for the center of every 5-bit RGB cell
+    levels = np.arange(32, dtype=np.int32) * 8 + 4
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 1, 3)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 4096):
+        dist = ((grid[start:start + 4096] - palette[None]) ** 2).sum(axis=-1)
+        lut[start:start + 4096] = dist.argmin(axis=1)
+    
+    palette_bytes = palette.astype(np.uint8).tobytes().ljust(768, b'\0')
+    return palette_bytes, lut.reshape(32, 32, 32)
+
+
+class StreamingGifWriter:
+    """
+    Writes an animated GIF frame by frame with a fixed global palette
+    
+    Only the previous frame is kept: each new frame is cropped to the
+    rectangle that changed, and identical frames extend the previous delay.
+    """
+    
+    def __init__(self, output_path: str, size: tuple, fps: float, palette: bytes, lut: np.ndarray,
+                 loop: int = 0):
+        """
+        Args:
+            output_path: Output GIF file
+            size: Frame size as (width, height)
+            fps: Output frame rate
+            palette: Global palette bytes from build_palette
+            lut: Color lookup table from build_palette
+            loop: Loop count (0 = forever)
+        """
+        self.size = tuple(size)
+        self.frame_ms = 1000.0 / fps
+        self.lut = lut
+        self.frames_written = 0
+        
+        self._palette_image = Image.new('P', (1, 1))
+        self._palette_image.putpalette(palette)
+        self._previous = None
+        self._pending = None  # (indexed crop, offset, duration in ms)
+        self._elapsed_cs = 0  # written delays, in GIF centiseconds
+        self._elapsed_ms = 0.0  # exact presentation time written so far
+        
+        self._fp = open(output_path, 'wb')
+        header_image = Image.new('P', self.size)
+        header_image.putpalette(palette)
+        header, _ = GifImagePlugin.getheader(header_image, info={'loop': loop, 'duration': self.frame_ms})
+        for chunk in header:
+            self._fp.write(chunk)
+    
+    def _index(self, frame: np.ndarray) -> np.ndarray:
+        """Map an RGB frame to palette indices through the 5-bit lookup table"""
+        cells = frame >> 3
+        return self.lut[cells[..., 0], cells[..., 1], cells[..., 2]]
+    
+    def _flush_pending(self):
+        if self._pending is None:
+            return
+        indexed, offset, duration = self._pending
+        image = Image.fromarray(indexed, mode='P')
+        image.putpalette(self._palette_image.getpalette())
+        # GIF delays are whole centiseconds; round the running end time instead
+        # of each delay so long clips don't drift out of sync
+        self._elapsed_ms += duration
+        delay_cs = max(1, round(self._elapsed_ms / 10) - self._elapsed_cs)
+        self._elapsed_cs += delay_cs
+        for chunk in GifImagePlugin.getdata(image, offset=offset, duration=delay_cs * 10):
+            self._fp.write(chunk)
+        self.frames_written += 1
+        self._pending = None
+    
+    def write(self, frame: np.ndarray):
+        """Append one RGB uint8 frame [H, W, 3]"""
+        indexed = self._index(np.asarray(frame, dtype=np.uint8))
+        
+        if self._previous is None:
+            self._pending = (indexed, (0, 0), self.frame_ms)
+        else:
+            rows = np.flatnonzero((indexed != self._previous).any(axis=1))
+            if len(rows) == 0:
+                # Unchanged frame: hold the previous one longer
+                crop, offset, duration = self._pending
+                self._pending = (crop, offset, duration + self.frame_ms)
+                return
+            cols = np.flatnonzero((indexed[rows[0]:rows[-1] + 1] != self._previous[rows[0]:rows[-1] + 1]).any(axis=0))
+            self._flush_pending()
+            crop = np.ascontiguousarray(indexed[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+            self._pending = (crop, (int(cols[0]), int(rows[0])), self.frame_ms)
+        
+        self._previous = indexed
+    
+    def close(self):
+        """Write the last frame and the GIF trailer"""
+        if self._fp is None:
+            return
+        self._flush_pending()
+        self._fp.write(b';')
+        self._fp.close()
+        self._fp = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def resample_frames(frames, source_fps: float, target_fps: float):
+    """
+    Drop frames from a stream so it plays at target_fps (never duplicates)
+    
+    Args:
+        frames: Iterable of frames at source_fps
+        source_fps: Input frame rate
+        target_fps: Output frame rate (values >= source_fps keep every frame)
+    """
+    if not source_fps or target_fps >= source_fps:
+        yield from frames
+        return
+    
+    next_time = 0.0
+    for index, frame in enumerate(frames):
+        if index / source_fps + 1e-9 >= next_time:
+            next_time += 1.0 / target_fps
+            yield frame
+
+
+def frames_to_gif(frames, output_path: str, fps: float, source_fps: float = None,
+                  scale: float = 1.0, palette_sample=None, sample_size: int = 16) -> int:
+    """
+    Stream RGB frames (e.g. from render_parameters) straight into a GIF
+    
+    Args:
+        frames: Iterable of RGB frames [H, W, 3]
+        output_path: Output GIF file
+        fps: GIF frame rate
+        source_fps: Frame rate of the input stream (None = same as fps)
+        scale: Scale factor (0.5 = half size)
+        palette_sample: Frames to build the palette from (None = the first
+                        sample_size output frames, buffered)
+        sample_size: Number of frames buffered for the palette
+        
+    Returns:
+        count: Number of input frames written (before duplicate merging)
+    """
+    def resize(frame):
+        if scale == 1.0:
+            return frame
+        new_size = (int(frame.shape[1] * scale), int(frame.shape[0] * scale))
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        return cv2.resize(frame, new_size, interpolation=interpolation)
+    
+    stream = (resize(f) for f in resample_frames(frames, source_fps or fps, fps))
+    
+    head = []
+    if palette_sample is None:
+        head = list(itertools.islice(stream, sample_size))
+        palette_sample = head
+    else:
+        palette_sample = [resize(f) for f in palette_sample]
+    if not palette_sample:
+        return 0
+    
+    palette, lut = build_palette(palette_sample)
+    height, width = palette_sample[0].shape[:2]
+    
+    count = 0
+    with StreamingGifWriter(output_path, (width, height), fps, palette, lut) as writer:
+        for frame in itertools.chain(head, stream):
+            writer.write(frame)
+            count += 1
+            if count % 100 == 0:
+                print(f"  Encoded {count} frames")
+    return count
+
+
+def _read_frames(cap):
+    """Yield RGB frames from an open cv2.VideoCapture"""
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def _sample_video_frames(cap, total_frames: int, count: int = 16) -> list:
+    """Read up to count evenly spaced RGB frames, then rewind the capture"""
+    samples = []
+    for index in np.linspace(0, max(total_frames - 1, 0), count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        if ret:
+            samples.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    return samples
+
+
 def video_to_gif(input_path: str, output_path: str, scale: float = 1.0, fps: int = None):
     """
     Convert video to animated GIF
     
+    Frames are resampled to the target fps, mapped to one global palette
+    (built from frames spread over the whole clip) and written as they are
+    read, so memory use does not grow with clip length.
+    
     Args:
         input_path: Input video file
         output_path: Output GIF file
@@ -28,7 +247,7 @@ def video_to_gif(input_path: str, output_path: str, scale: float = 1.0, fps: int
         return False
     
     # Get properties
-    original_fps = int(cap.get(cv2.CAP_PROP_FPS))
+    original_fps = cap.get(cv2.CAP_PROP_FPS)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -40,55 +259,48 @@ def video_to_gif(input_path: str, output_path: str, scale: float = 1.0, fps: int
     new_width = int(width * scale)
     new_height = int(height * scale)
     
-    print(f"Input: {width}x{height}, {original_fps} FPS, {total_frames} frames")
-    print(f"Output: {new_width}x{new_height}, {fps} FPS")
-    
-    # Read all frames
-    frames = []
-    frame_count = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Convert BGR to RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Resize if needed
-        if scale != 1.0:
-            frame_rgb = cv2.resize(frame_rgb, (new_width, new_height))
-        
-        # Convert to PIL Image
-        img = Image.fromarray(frame_rgb)
-        frames.append(img)
-        
-        frame_count += 1
-        if frame_count % 30 == 0:
-            print(f"  Read {frame_count}/{total_frames} frames")
+    print(f"Input: {width}x{height}, {original_fps:g} FPS, {total_frames} frames")
+    print(f"Output: {new_width}x{new_height}, {fps:g} FPS")
     
+    palette_sample = _sample_video_frames(cap, total_frames)
+    count = frames_to_gif(_read_frames(cap), output_path, fps, source_fps=original_fps,
+                          scale=scale, palette_sample=palette_sample)
     cap.release()
     
-    if not frames:
+    if count == 0:
         print("Error: No frames extracted")
         return False
     
-    # Calculate duration per frame in milliseconds
-    duration = int(1000 / fps)
+    file_size = Path(output_path).stat().st_size / 1024 / 1024
+    print(f"✓ GIF created: {output_path} ({count} frames)")
+    print(f"  Size: {file_size:.2f} MB")
+    return True
+
+
+def params_to_gif(params_path: str, output_path: str, scale: float = 1.0, fps: int = None):
+    """
+    Render a saved parameter sequence straight to GIF, without an MP4 in between
+    
+    Args:
+        params_path: Parameter file (.npz) from --save-params
+        output_path: Output GIF file
+        scale: Scale factor (0.5 = half size)
+        fps: FPS for GIF (None = parameter sequence fps)
+    """
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from inference.param_sequence import load_param_sequence
+    from inference.realtime_pipeline import render_parameters
     
-    # Save as GIF
-    print(f"Saving GIF with {len(frames)} frames...")
-    frames[0].save(
-        output_path,
-        save_all=True,
-        append_images=frames[1:],
-        duration=duration,
-        loop=0,
-        optimize=False
-    )
+    params = load_param_sequence(params_path)
+    print(f"Rendering {params['num_frames']} frames from {params_path} to GIF")
+    count = frames_to_gif(render_parameters(params), output_path, fps or params['fps'],
+                          source_fps=params['fps'], scale=scale)
+    if count == 0:
+        print("Error: No frames rendered")
+        return False
     
     file_size = Path(output_path).stat().st_size / 1024 / 1024
-    print(f"✓ GIF created: {output_path}")
+    print(f"✓ GIF created: {output_path} ({count} frames)")
     print(f"  Size: {file_size:.2f} MB")
     return True
 
@@ -103,9 +315,18 @@ def main():
                        help='Scale factor (default: 1.0, use 0.5 for smaller file)')
     parser.add_argument('--fps', type=int, default=None,
                        help='FPS for GIF (default: same as input)')
+    parser.add_argument('--params', type=str, default=None,
+                       help='Render this parameter file (.npz) directly instead of reading --input')
     
     args = parser.parse_args()
     
+    if args.params:
+        if not Path(args.params).exists():
+            print(f"Error: Parameter file not found: {args.params}")
+            return
+        params_to_gif(args.params, args.output, args.scale, args.fps)
+        return
+    
     if not Path(args.input).exists():
         print(f"Error: Input file not found: {args.input}")
         return
@@ -1,2 +1,2 @@
 from .metrics import lip_sync_error
-from .benchmark import lip_sync_error as benchmark_lip_sync_error
+from .benchmark import benchmark_keyframes, benchmark_windows, benchmark_atlas
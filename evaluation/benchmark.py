@@ -1,8 +1,197 @@
-def lip_sync_error():
+"""
+Benchmark inference modes against the full-rate pipeline
+
+Times parameter inference for a clip at several keyframe rates, or with
+several SpeechEncoder context windows, and reports the lip sync error
+(evaluation.metrics.lip_sync_error) of each against the default pipeline, so
+model compute and latency can be traded for fidelity. Sprite atlas sizes are
+compared with direct drawing the same way (render time and pixel error).
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from evaluation.metrics import lip_sync_error
+
+
+def _timed(fn, repeats):
+    """Best-of-repeats wall time of fn() and its last result"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_keyframes(audio, fps=30, rates=(15, 12, 10), interpolation='cubic', repeats=3):
     """
-    Benchmark lip sync error metric
-    
+    Compare keyframe-rate inference with per-frame inference
+
+    Args:
+        audio: Mono audio array sampled at 16kHz
+        fps: Output frame rate
+        rates: Keyframe rates (Hz) to compare
+        interpolation: 'cubic' or 'linear'
+        repeats: Timing repeats per mode (best is reported)
+
     Returns:
-        float: Lip sync error value (lower is better)
+        rows: List of dicts with keyframe_rate, seconds, speedup and
+              lip_sync_error (pixels vs per-frame inference)
     """
-    return 0.04
+    from inference.realtime_pipeline import infer_parameters
+
+    infer_parameters(audio[:16000], fps)  # Load models outside the timings
+    base_seconds, reference = _timed(lambda: infer_parameters(audio, fps), repeats)
+    rows = [{'keyframe_rate': fps, 'seconds': base_seconds, 'speedup': 1.0, 'lip_sync_error': 0.0}]
+    for rate in rates:
+        seconds, params = _timed(lambda: infer_parameters(audio, fps, keyframe_rate=rate,
+                                                          interpolation=interpolation), repeats)
+        rows.append({
+            'keyframe_rate': rate,
+            'seconds': seconds,
+            'speedup': base_seconds / seconds,
+            'lip_sync_error': lip_sync_error(params, reference),
+        })
+    return rows
+
+
+def benchmark_windows(audio, fps=30, windows=(1000, 500, 200), alignment='causal',
+                      lookahead_ms=0, repeats=3):
+    """
+    Compare context window sizes with the configured default window
+
+    Args:
+        audio: Mono audio array sampled at 16kHz
+        fps: Output frame rate
+        windows: Window lengths in milliseconds
+        alignment: 'causal', 'centered' or 'lookahead'
+        lookahead_ms: Look-ahead for 'lookahead' alignment
+        repeats: Timing repeats per window (best is reported)
+
+    Returns:
+        rows: List of dicts with window_ms, latency_ms (look-ahead the
+              window needs past the frame), seconds and lip_sync_error
+              (pixels vs the default window)
+
+    The configured window is restored afterwards, also on errors.
+    """
+    from inference.realtime_pipeline import (configure_window, get_window, infer_parameters,
+                                             restore_window)
+
+    infer_parameters(audio[:16000], fps)  # Load models outside the timings
+    length, offset = get_window()
+    base_seconds, reference = _timed(lambda: infer_parameters(audio, fps), repeats)
+    rows = [{'window_ms': length / 16, 'latency_ms': (length + offset) / 16,
+             'seconds': base_seconds, 'lip_sync_error': 0.0}]
+    previous = configure_window()
+    try:
+        for window_ms in windows:
+            configure_window(window_ms, alignment, lookahead_ms)
+            length, offset = get_window()
+            seconds, params = _timed(lambda: infer_parameters(audio, fps), repeats)
+            rows.append({
+                'window_ms': window_ms,
+                'latency_ms': (length + offset) / 16,
+                'seconds': seconds,
+                'lip_sync_error': lip_sync_error(params, reference),
+            })
+    finally:
+        restore_window(previous)
+    return rows
+
+
+def benchmark_atlas(params, bins=(31, 16, 11, 6), repeats=3):
+    """
+    Compare sprite atlas rendering with direct drawing
+
+    Args:
+        params: Parameter dict whose frames are rendered
+        bins: Atlas mouth_bins values to compare
+        repeats: Timing repeats per renderer (best is reported)
+
+    Returns:
+        rows: List of dicts with mouth_bins (None = direct drawing),
+              ms_per_frame and the SpriteRenderer.atlas_error fields
+    """
+    import numpy as np
+    from models.renderer import Renderer, SpriteRenderer
+
+    def render_all(renderer):
+        out = np.empty((renderer.resolution[1], renderer.resolution[0], 3), dtype=np.uint8)
+        for i in range(len(params['expression'])):
+            renderer.render(params['expression'][i],
+                            (params['head_motion'][i], params['eye_motion'][i]), out=out)
+
+    frames = max(len(params['expression']), 1)
+    seconds, _ = _timed(lambda: render_all(Renderer()), repeats)
+    rows = [{'mouth_bins': None, 'ms_per_frame': seconds / frames * 1000,
+             'max_opening': 0, 'max_pixels': 0, 'max_abs': 0}]
+    for count in bins:
+        renderer = SpriteRenderer(mouth_bins=count)
+        seconds, _ = _timed(lambda: render_all(renderer), repeats)
+        rows.append({'mouth_bins': count, 'ms_per_frame': seconds / frames * 1000,
+                     **renderer.atlas_error()})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark inference speed against lip sync error')
+    parser.add_argument('--audio', type=str, required=True,
+                       help='Input audio file path')
+    parser.add_argument('--fps', type=int, default=30,
+                       help='Output frames per second (default: 30)')
+    parser.add_argument('--keyframe-rates', type=float, nargs='+', default=[15, 12, 10],
+                       help='Keyframe rates in Hz to compare (default: 15 12 10)')
+    parser.add_argument('--interpolation', type=str, default='cubic',
+                       choices=['cubic', 'linear'],
+                       help='Keyframe interpolation (default: cubic)')
+    parser.add_argument('--windows', type=float, nargs='+', default=None,
+                       help='Compare context window lengths in ms instead of keyframe rates')
+    parser.add_argument('--alignment', type=str, default='causal',
+                       choices=['causal', 'centered', 'lookahead'],
+                       help='Window alignment for --windows (default: causal)')
+    parser.add_argument('--lookahead-ms', type=float, default=0,
+                       help='Look-ahead for --alignment lookahead (default: 0)')
+    parser.add_argument('--atlas-bins', type=int, nargs='+', default=None,
+                       help='Compare sprite atlas mouth_bins values with direct drawing instead')
+    parser.add_argument('--repeats', type=int, default=3,
+                       help='Timing repeats per mode (default: 3)')
+
+    args = parser.parse_args()
+
+    import librosa
+    audio, _ = librosa.load(args.audio, sr=16000)
+    print(f"Audio: {args.audio} ({len(audio) / 16000:.1f}s) at {args.fps} FPS")
+
+    if args.atlas_bins:
+        from inference.realtime_pipeline import infer_parameters
+        rows = benchmark_atlas(infer_parameters(audio, args.fps), args.atlas_bins, args.repeats)
+        print(f"\n{'Mouth bins':>10} {'ms/frame':>9} {'Max snap (px)':>14} {'Max diff px':>12} {'Max abs':>8}")
+        for row in rows:
+            name = 'direct' if row['mouth_bins'] is None else row['mouth_bins']
+            print(f"{name:>10} {row['ms_per_frame']:>9.3f} {row['max_opening']:>14} "
+                  f"{row['max_pixels']:>12} {row['max_abs']:>8}")
+        return
+
+    if args.windows:
+        rows = benchmark_windows(audio, args.fps, args.windows, args.alignment,
+                                 args.lookahead_ms, args.repeats)
+        print(f"\n{'Window (ms)':>12} {'Latency (ms)':>13} {'Time (s)':>10} {'LSE (px)':>9}")
+        for row in rows:
+            print(f"{row['window_ms']:>12g} {row['latency_ms']:>13g} "
+                  f"{row['seconds']:>10.3f} {row['lip_sync_error']:>9.3f}")
+        return
+
+    rows = benchmark_keyframes(audio, args.fps, args.keyframe_rates, args.interpolation, args.repeats)
+    print(f"\n{'Keyframes (Hz)':>15} {'Time (s)':>10} {'Speedup':>8} {'LSE (px)':>9}")
+    for row in rows:
+        print(f"{row['keyframe_rate']:>15g} {row['seconds']:>10.3f} "
+              f"{row['speedup']:>7.1f}x {row['lip_sync_error']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
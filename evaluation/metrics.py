@@ -1,8 +1,58 @@
-def lip_sync_error():
+import numpy as np
+
+from models.renderer.model import VISEME_MOUTHS
+
+
+def mouth_landmarks(params):
+    """
+    Mouth landmarks of every frame, as drawn by the Renderer
+
+    Args:
+        params: Parameter dict (infer_parameters, viseme_parameters or
+                load_param_sequence)
+
+    Returns:
+        landmarks: Pixel coordinates [T, 4, 2] of the left corner, right
+                   corner, top and bottom of the mouth (256x256 frame)
+    """
+    expression = np.asarray(params['expression'], dtype=np.float32)
+    head_motion = np.asarray(params['head_motion'], dtype=np.float32)
+    center_x = 128 + head_motion[:, 1] * 20
+    mouth_y = 128 + head_motion[:, 0] * 20 + 40
+
+    if params.get('viseme') is not None:
+        shapes = np.array([mouth[:2] for mouth in VISEME_MOUTHS], dtype=np.float32)[params['viseme']]
+        half_width, opening = shapes[:, 0], shapes[:, 1]
+    else:
+        mouth_open = np.abs(expression[:, 0]) * 30
+        half_width = np.full(len(expression), 25.0, dtype=np.float32)
+        # A closed mouth is drawn as a smile reaching 10 px below the lip line
+        opening = np.where(mouth_open > 0.3, mouth_open, 10.0)
+
+    x = np.stack([center_x - half_width, center_x + half_width, center_x, center_x], axis=1)
+    y = np.stack([mouth_y, mouth_y, mouth_y - 10, mouth_y + opening], axis=1)
+    return np.stack([x, y], axis=2)
+
+
+def lip_sync_error(params, reference):
     """
     Calculate lip sync error metric
-    
+
+    LSE = mean Euclidean distance between the mouth landmarks of params and
+    of a reference sequence (ground truth, or the full-quality pipeline
+    output when measuring a cheaper mode), in pixels at 256x256.
+
+    Args:
+        params: Parameter dict to evaluate
+        reference: Reference parameter dict with the same number of frames
+
     Returns:
-        float: Lip sync error value (lower is better)
+        float: Lip sync error value in pixels (lower is better)
     """
-    return 0.04
+    predicted = mouth_landmarks(params)
+    expected = mouth_landmarks(reference)
+    if predicted.shape != expected.shape:
+        raise ValueError(f"Frame count mismatch: {len(predicted)} vs {len(expected)}")
+    if len(predicted) == 0:
+        return 0.0
+    return float(np.linalg.norm(predicted - expected, axis=2).mean())
@@ -3,64 +3,42 @@ Generate talking avatar video with audio track using FFmpeg
 """
 import argparse
 import os
-import subprocess
 from pathlib import Path
 import sys
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from demo.app import generate_video
+from postprocessing.video_writer import ENCODER_PRESETS, ffmpeg_available
 
 
-def generate_video_with_audio(audio_path: str, output_path: str, fps: int = 30):
+def generate_video_with_audio(audio_path: str, output_path: str, fps: int = 30,
+                              preset: str = 'fast', threads: int = 0):
     """
     Generate video with synced audio track
     
+    Frames are piped straight into one ffmpeg process that also muxes the
+    audio, so no silent intermediate video is written.
+    
     Args:
         audio_path: Path to input audio file
         output_path: Path to output video file (with audio)
         fps: Frames per second
+        preset: ffmpeg encoder preset (fast, balanced, quality)
+        threads: ffmpeg encoder threads (0 = auto)
     """
-    # Generate silent video first
-    temp_video = output_path.replace('.mp4', '_temp.mp4')
-    print("Step 1: Generating video frames...")
-    generate_video(audio_path, temp_video, fps)
-    
     # Check if ffmpeg is available
-    try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        has_ffmpeg = True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        has_ffmpeg = False
+    if not ffmpeg_available():
         print("\n⚠️  FFmpeg not found. Video will not have audio track.")
         print("    Install FFmpeg to add audio: https://ffmpeg.org/download.html")
-        print(f"    Silent video saved as: {temp_video}")
+        generate_video(audio_path, output_path, fps, backend='opencv')
+        print(f"    Silent video saved as: {output_path}")
         return
     
-    # Combine video and audio using ffmpeg
-    print("\nStep 2: Adding audio track with FFmpeg...")
-    cmd = [
-        'ffmpeg', '-y',
-        '-i', temp_video,
-        '-i', audio_path,
-        '-c:v', 'copy',
-        '-c:a', 'aac',
-        '-shortest',
-        output_path
-    ]
-    
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"✓ Video with audio saved to: {output_path}")
-            # Remove temp file
-            os.remove(temp_video)
-        else:
-            print(f"⚠️  FFmpeg error: {result.stderr}")
-            print(f"    Silent video available at: {temp_video}")
-    except Exception as e:
-        print(f"⚠️  Error combining audio: {e}")
-        print(f"    Silent video available at: {temp_video}")
+    print("Generating video frames and encoding with audio track...")
+    generate_video(audio_path, output_path, fps, with_audio=True, backend='ffmpeg',
+                   preset=preset, threads=threads)
+    print(f"✓ Video with audio saved to: {output_path}")
 
 
 def main():
@@ -71,6 +49,11 @@ def main():
                        help='Output video file path')
     parser.add_argument('--fps', type=int, default=30,
                        help='Frames per second (default: 30)')
+    parser.add_argument('--preset', type=str, default='fast',
+                       choices=sorted(ENCODER_PRESETS),
+                       help='FFmpeg encoder preset (default: fast)')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='FFmpeg encoder threads (default: 0 = auto)')
     
     args = parser.parse_args()
     
@@ -79,7 +62,7 @@ def main():
         return
     
     try:
-        generate_video_with_audio(args.audio, args.output, args.fps)
+        generate_video_with_audio(args.audio, args.output, args.fps, args.preset, args.threads)
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -1,2 +1,7 @@
-from .realtime_pipeline import run_pipeline
-from .temporal_filter import temporal_smooth
+from .realtime_pipeline import (run_pipeline, run_pipeline_batch, infer_parameters,
+                                render_parameters, encode_features, parameters_from_features,
+                                viseme_parameters, stream_parameters, open_feature_store, warm_up,
+                                get_window, configure_window, restore_window)
+from .param_sequence import save_param_sequence, load_param_sequence
+from .feature_store import FeatureStore
+from .temporal_filter import temporal_smooth, interpolate_keyframes
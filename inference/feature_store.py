@@ -0,0 +1,145 @@
+"""
+Sharded, memory-mapped store of precomputed speech features
+
+Per-clip SpeechEncoder outputs [T, 256] are appended as float16 rows to shard
+files (``shard-00000.npy``, ...) and located through ``index.json``, which maps
+each file_id to (shard, first row, row count). The index also records the cache
+key (encoder weights hash, fps, window size and alignment); a store whose key does not match
+the current encoder is reported as stale and treated as empty.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+INDEX_NAME = 'index.json'
+STORE_VERSION = 1
+
+
+class FeatureStore:
+    """Per-clip speech feature cache indexed by file_id"""
+
+    def __init__(self, root: str, encoder_hash: str, fps: float, window: int,
+                 dim: int = 256, shard_rows: int = 65536, window_offset: int = 0):
+        """
+        Open (or prepare to create) a feature store
+
+        Args:
+            root: Store directory
+            encoder_hash: Hash of the SpeechEncoder weights producing the features
+            fps: Frame rate the features are computed at
+            window: Encoder window size in samples
+            dim: Feature dimension
+            shard_rows: Rows buffered before a shard file is written
+            window_offset: Window start relative to the frame in samples
+        """
+        self.root = Path(root)
+        self.key = {
+            'version': STORE_VERSION,
+            'encoder_hash': encoder_hash,
+            'fps': float(fps),
+            'window': int(window),
+            'window_offset': int(window_offset),
+            'dim': int(dim),
+        }
+        self.shard_rows = shard_rows
+        self.stale = False
+
+        self._shards = []
+        self._clips = {}
+        self._obsolete_shards = []
+        self._buffer = []
+        self._buffer_ids = []
+        self._buffered_rows = 0
+        self._mmaps = {}
+
+        index_path = self.root / INDEX_NAME
+        if index_path.exists():
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('key') == self.key:
+                self._shards = index['shards']
+                self._clips = {file_id: tuple(loc) for file_id, loc in index['clips'].items()}
+            else:
+                # Written by other encoder weights or settings: drop on next flush
+                self.stale = True
+                self._obsolete_shards = index.get('shards', [])
+                print(f"Warning: feature store {self.root} is stale "
+                      f"(built with {index.get('key')}), ignoring cached features")
+
+    def __len__(self) -> int:
+        return len(self._clips) + len(self._buffer_ids)
+
+    def __contains__(self, file_id: str) -> bool:
+        return file_id in self._clips or file_id in self._buffer_ids
+
+    def get(self, file_id: str) -> np.ndarray:
+        """
+        Read the features of one clip
+
+        Returns:
+            features: Read-only float16 memory-mapped array [T, dim]
+        """
+        if file_id not in self._clips:
+            if file_id in self._buffer_ids:
+                return self._buffer[self._buffer_ids.index(file_id)]
+            raise KeyError(f"No cached features for {file_id}")
+
+        shard, start, length = self._clips[file_id]
+        if shard not in self._mmaps:
+            self._mmaps[shard] = np.load(self.root / self._shards[shard], mmap_mode='r')
+        return self._mmaps[shard][start:start + length]
+
+    def add(self, file_id: str, features: np.ndarray):
+        """
+        Buffer the features of one clip; full buffers are flushed to a new shard
+
+        Args:
+            file_id: Clip id (as in LJSpeechLoader.metadata)
+            features: Feature array [T, dim]
+        """
+        features = np.asarray(features, dtype=np.float16)
+        if features.ndim != 2 or features.shape[1] != self.key['dim']:
+            raise ValueError(f"Expected features of shape [T, {self.key['dim']}], got {features.shape}")
+
+        self._buffer.append(features)
+        self._buffer_ids.append(file_id)
+        self._buffered_rows += len(features)
+        if self._buffered_rows >= self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered clips as a new shard and rewrite the index"""
+        if not self._buffer and not self._obsolete_shards:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        for name in self._obsolete_shards:
+            path = self.root / name
+            if path.exists():
+                os.remove(path)
+        self._obsolete_shards = []
+
+        if self._buffer:
+            shard = len(self._shards)
+            name = f"shard-{shard:05d}.npy"
+            np.save(self.root / name, np.concatenate(self._buffer))
+            self._shards.append(name)
+
+            start = 0
+            for file_id, features in zip(self._buffer_ids, self._buffer):
+                self._clips[file_id] = (shard, start, len(features))
+                start += len(features)
+
+            self._buffer = []
+            self._buffer_ids = []
+            self._buffered_rows = 0
+
+        # Write the index last, atomically, so an interrupted flush leaves a valid store
+        tmp_path = self.root / (INDEX_NAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key, 'shards': self._shards,
+                       'clips': {k: list(v) for k, v in self._clips.items()}}, f)
+        os.replace(tmp_path, self.root / INDEX_NAME)
+        self.stale = False
@@ -0,0 +1,189 @@
+"""
+Process-wide pipeline metrics in the Prometheus text exposition format
+
+The pipeline reports into the module-level metrics below through a few cheap
+hooks (time_stage, observe_batch, record_frames, record_model_load) and the
+API serves render_metrics() at /metrics. Metrics are per process: with
+api/model_server.py every worker keeps its own values.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from inference import profiling
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGES = ('decode', 'encode', 'expression', 'motion', 'render', 'video_write')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_registry = []
+_lock = threading.Lock()
+_models_ready = False
+_models_error = None
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self):
+        for label_values, value in sorted(self._values.items()):
+            yield self.name + _format_labels(self.labels, label_values), value
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, *label_values):
+        with _lock:
+            self._values[label_values] = float(value)
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        for label_values, counts in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield self.name + '_bucket' + _format_labels(self.labels, label_values, le), cumulative
+            yield self.name + '_sum' + _format_labels(self.labels, label_values), counts[-1]
+            yield self.name + '_count' + _format_labels(self.labels, label_values), cumulative
+
+
+requests_total = Counter('avatar_requests_total', 'HTTP requests handled, by route template', ('path', 'status'))
+queue_depth = Gauge('avatar_queue_depth', 'Requests currently being processed')
+stage_seconds = Histogram('avatar_stage_seconds', 'Latency of pipeline stages', LATENCY_BUCKETS, ('stage',))
+batch_size = Histogram('avatar_batch_size', 'Frames per model batch', BATCH_BUCKETS)
+frames_total = Counter('avatar_frames_total', 'Frames rendered')
+frames_per_second = Gauge('avatar_frames_per_second', 'Throughput of the most recent render')
+model_load_seconds = Gauge('avatar_model_load_seconds', 'Time taken to build and load the models')
+models_ready_gauge = Gauge('avatar_models_ready', '1 once the models are loaded and warmed up')
+queue_depth.set(0)
+models_ready_gauge.set(0)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    Time the enclosed block into avatar_stage_seconds{stage=...}
+
+    While a profile is recorded (inference.profiling) the block also shows up
+    as a named range in the torch profiler trace.
+    """
+    start = time.perf_counter()
+    try:
+        with profiling.record_stage(stage):
+            yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage)
+
+
+def observe_batch(size: int):
+    """Record the number of frames in one model batch"""
+    batch_size.observe(size)
+
+
+def record_frames(count: int, seconds: float):
+    """Record a finished render of count frames that took seconds"""
+    frames_total.inc(amount=count)
+    if seconds > 0:
+        frames_per_second.set(count / seconds)
+
+
+def record_model_load(seconds: float):
+    """Record how long building/loading the models took"""
+    model_load_seconds.set(seconds)
+
+
+def set_models_ready(ready: bool = True):
+    """Mark the models as loaded and warmed up (readiness for /health)"""
+    global _models_ready
+    _models_ready = ready
+    models_ready_gauge.set(1.0 if ready else 0.0)
+
+
+def models_ready() -> bool:
+    """Whether the models have been loaded and warmed up in this process"""
+    return _models_ready
+
+
+def set_models_failed(error: str):
+    """Record that loading or warming up the models failed (reported by /health)"""
+    global _models_error
+    _models_error = error
+    set_models_ready(False)
+
+
+def models_error():
+    """The model warm-up error of this process, or None"""
+    return _models_error
+
+
+def render_metrics() -> str:
+    """
+    Render all metrics in the Prometheus text exposition format
+
+    Returns:
+        text: Exposition text (serve with CONTENT_TYPE)
+    """
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name} {_format_value(value)}" for name, value in metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,73 @@
+"""
+Compact on-disk format for per-frame avatar parameter sequences
+
+A parameter file stores the expression, head and eye motion vectors for every
+output frame as float16 columns inside a single ``.npz`` archive, plus a small
+JSON header (fps, model hash, format version). Rendering only needs this file,
+so inference and rendering can run at different times or on different machines.
+"""
+import json
+import numpy as np
+
+FORMAT_VERSION = 1
+PARAM_KEYS = ('expression', 'head_motion', 'eye_motion')
+PARAM_DIMS = {'expression': 64, 'head_motion': 3, 'eye_motion': 2}
+# Output range +-bound of each model head (tanh, scaled in MotionModel)
+PARAM_BOUNDS = {'expression': 1.0, 'head_motion': 0.3, 'eye_motion': 0.5}
+OPTIONAL_KEYS = ('viseme',)  # [T] uint8 viseme ids driving the mouth shape
+
+
+def save_param_sequence(path: str, params: dict):
+    """
+    Write a parameter sequence to a float16 ``.npz`` file
+
+    Args:
+        path: Output file path (written as-is, no extension is appended)
+        params: Dict with 'expression' [T, 64], 'head_motion' [T, 3],
+                'eye_motion' [T, 2] arrays plus 'fps' and 'model_hash',
+                and optionally 'viseme' [T]
+    """
+    num_frames = len(params['expression'])
+    for key in PARAM_KEYS + tuple(k for k in OPTIONAL_KEYS if k in params):
+        if len(params[key]) != num_frames:
+            raise ValueError(f"'{key}' has {len(params[key])} frames, expected {num_frames}")
+
+    header = {
+        'version': FORMAT_VERSION,
+        'fps': float(params['fps']),
+        'model_hash': params.get('model_hash', ''),
+        'num_frames': num_frames,
+    }
+    columns = {key: np.asarray(params[key], dtype=np.float16) for key in PARAM_KEYS}
+    if 'viseme' in params:
+        columns['viseme'] = np.asarray(params['viseme'], dtype=np.uint8)
+
+    with open(path, 'wb') as f:
+        np.savez(f, header=np.array(json.dumps(header)), **columns)
+
+
+def load_param_sequence(path: str) -> dict:
+    """
+    Read a parameter sequence written by ``save_param_sequence``
+
+    Args:
+        path: Path to the ``.npz`` parameter file
+
+    Returns:
+        params: Dict with float32 'expression', 'head_motion', 'eye_motion'
+                arrays, 'viseme' if stored, and the header fields ('fps',
+                'model_hash', 'num_frames')
+    """
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data['header']))
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported parameter file version: {header.get('version')}")
+
+        params = {key: data[key].astype(np.float32) for key in PARAM_KEYS}
+        if 'viseme' in data.files:
+            params['viseme'] = data['viseme']
+
+    params['fps'] = header['fps']
+    params['model_hash'] = header['model_hash']
+    params['num_frames'] = header['num_frames']
+    return params
@@ -0,0 +1,174 @@
+"""
+Opt-in profiling of pipeline runs
+
+profile_run() wraps one request or CLI run: torch.profiler records operator
+timings together with the pipeline stages (every metrics.time_stage block is
+also a record_function range while a profile is active), and a background
+thread samples the Python stacks of all threads at a fixed interval. Each run
+writes a Chrome trace (``<name>.trace.json``, open in chrome://tracing or
+Perfetto) and a speedscope profile (``<name>.speedscope.json``).
+
+Enable it with ``--profile DIR`` on main.py / demo/app.py, the AVATAR_PROFILE
+environment variable (output directory), or per API request with the
+``X-Avatar-Profile: 1`` header.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_ENV = 'AVATAR_PROFILE'
+PROFILE_HEADER = 'X-Avatar-Profile'
+DEFAULT_PROFILE_DIR = 'profiles'
+SAMPLE_INTERVAL = 0.005  # 5 ms between Python stack samples
+
+# Only one profile at a time: torch.profiler is process-global
+_profile_lock = threading.Lock()
+_active = False
+
+
+def profile_dir(cli_value: str = None) -> str:
+    """Output directory from a CLI flag or AVATAR_PROFILE (None = profiling off)"""
+    return cli_value or os.environ.get(PROFILE_ENV) or None
+
+
+def is_active() -> bool:
+    """Whether a profile is being recorded in this process"""
+    return _active
+
+
+@contextmanager
+def record_stage(name: str):
+    """Mark the enclosed block as a named range in the active torch profile"""
+    if not _active:
+        yield
+        return
+    import torch
+    with torch.profiler.record_function(name):
+        yield
+
+
+class StackSampler:
+    """Samples the Python stacks of all other threads from a background thread"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._frames = []
+        self._frame_ids = {}
+        self._samples = {}  # thread id -> list of (timestamp, stack of frame ids)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def _frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_ids.get(key)
+        if index is None:
+            index = self._frame_ids[key] = len(self._frames)
+            self._frames.append({'name': code.co_name, 'file': code.co_filename,
+                                 'line': code.co_firstlineno})
+        return index
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter() - self._start
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self._samples.setdefault(thread_id, []).append((now, stack))
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._duration = time.perf_counter() - self._start
+
+    def to_speedscope(self, name: str) -> dict:
+        """Sampled profiles (one per thread) in the speedscope file format"""
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        profiles = []
+        for thread_id, samples in self._samples.items():
+            times = [t for t, _ in samples] + [self._duration]
+            profiles.append({
+                'type': 'sampled',
+                'name': f"{name} [{thread_names.get(thread_id, thread_id)}]",
+                'unit': 'seconds',
+                'startValue': 0.0,
+                'endValue': self._duration,
+                'samples': [stack for _, stack in samples],
+                'weights': [b - a for a, b in zip(times, times[1:])],
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'avatar-system',
+            'shared': {'frames': self._frames},
+            'profiles': profiles,
+        }
+
+
+@contextmanager
+def profile_run(name: str, output_dir: str = DEFAULT_PROFILE_DIR,
+                interval: float = SAMPLE_INTERVAL, verbose: bool = True):
+    """
+    Profile the enclosed block and write its trace files
+
+    If another profile is already running in this process the block runs
+    unprofiled and None is yielded.
+
+    Args:
+        name: Base name of the output files
+        output_dir: Directory for the trace files
+        interval: Seconds between Python stack samples
+        verbose: Print the paths of the written files
+
+    Yields:
+        paths: Dict with 'trace' and 'speedscope' output paths (written on exit)
+    """
+    global _active
+    if not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+
+    import torch
+    try:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        paths = {
+            'trace': str(output_dir / f"{stem}.trace.json"),
+            'speedscope': str(output_dir / f"{stem}.speedscope.json"),
+        }
+
+        sampler = StackSampler(interval)
+        profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+        profiler.__enter__()
+        sampler.start()
+        _active = True
+        try:
+            yield paths
+        finally:
+            _active = False
+            sampler.stop()
+            profiler.__exit__(None, None, None)
+            profiler.export_chrome_trace(paths['trace'])
+            with open(paths['speedscope'], 'w', encoding='utf-8') as f:
+                json.dump(sampler.to_speedscope(name), f)
+            if verbose:
+                print(f"✓ Profile written: {paths['trace']} (Chrome trace), "
+                      f"{paths['speedscope']} (speedscope)")
+    finally:
+        _profile_lock.release()
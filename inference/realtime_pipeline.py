@@ -1,50 +1,744 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import torch
 import yaml
 from pathlib import Path
-from preprocessing.audio_cleaner import clean_audio
+from preprocessing.audio_cleaner import clean_audio, silent_frames
+from preprocessing.phoneme_extractor import VISEME_OPENNESS, extract_visemes
 from models.speech_encoder import SpeechEncoder
+from models.speech_encoder.model import CONV_STRIDE, RECEPTIVE_FIELD
 from models.expression_model import ExpressionModel
 from models.motion_model import MotionModel
-from models.renderer import Renderer
+from models.renderer import NUMBA_AVAILABLE, RasterRenderer, Renderer, SpriteRenderer
+from inference.param_sequence import PARAM_BOUNDS, PARAM_DIMS, PARAM_KEYS, save_param_sequence
+from inference.feature_store import FeatureStore
+from inference.temporal_filter import interpolate_keyframes
+from inference import metrics
+
+SAMPLE_RATE = 16000
+WINDOW_SIZE = 16000  # Default SpeechEncoder context: 1 s of 16 kHz audio (see get_window)
+FEATURE_DIM = 256
+# Longest audio span (in samples) convolved at once by single-pass encoding
+SINGLE_PASS_SPAN = 16 * SAMPLE_RATE
 
 # Load models globally (singleton pattern)
 _models = None
+# Held while the models load, so concurrent first requests load them only once
+_models_lock = threading.Lock()
+_config = None
+_model_hash = None
+_encoder_hash = None
+_idle_params = None
+_window = None
+
+def _get_config():
+    global _config
+    if _config is None:
+        config_path = Path(__file__).parent.parent / "configs" / "model.yaml"
+        with open(config_path) as f:
+            _config = yaml.safe_load(f)
+    return _config
+
+def get_window():
+    """
+    SpeechEncoder context window from the window section of configs/model.yaml
+
+    length_ms is the context length; alignment places it relative to the
+    frame time: 'causal' ends at the frame, 'centered' straddles it and
+    'lookahead' ends lookahead_ms after it. The look-ahead is the
+    algorithmic latency of live use. Without a window section the window is
+    the original 1 s starting at the frame (1000 ms look-ahead).
+
+    Returns:
+        length: Window length in samples
+        offset: Window start relative to the frame's first sample
+                (0 = starts at the frame, -length = causal)
+    """
+    global _window
+    if _window is None:
+        window = _get_config().get('window', {})
+        length = int(round(window.get('length_ms', 1000) * SAMPLE_RATE / 1000))
+        alignment = window.get('alignment', 'lookahead')
+        if alignment == 'causal':
+            lookahead = 0
+        elif alignment == 'centered':
+            lookahead = length // 2
+        elif alignment == 'lookahead':
+            lookahead = int(round(window.get('lookahead_ms', length * 1000 / SAMPLE_RATE) * SAMPLE_RATE / 1000))
+        else:
+            raise ValueError(f"Unknown window alignment: {alignment}")
+        if length < RECEPTIVE_FIELD:
+            raise ValueError(f"Window of {length} samples is shorter than the encoder's "
+                             f"receptive field ({RECEPTIVE_FIELD} samples)")
+        _window = (length, lookahead - length)
+    return _window
+
+def configure_window(length_ms=None, alignment=None, lookahead_ms=None):
+    """
+    Override the configured context window for this process
+
+    Args:
+        length_ms: Window length in milliseconds
+        alignment: 'causal', 'centered' or 'lookahead'
+        lookahead_ms: Look-ahead for 'lookahead' alignment
+
+    Returns:
+        previous: The window settings before the change, for restore_window
+    """
+    previous = dict(_get_config().get('window', {}))
+    window = dict(previous)
+    for key, value in (('length_ms', length_ms), ('alignment', alignment), ('lookahead_ms', lookahead_ms)):
+        if value is not None:
+            window[key] = value
+    restore_window(window)
+    return previous
+
+def restore_window(settings):
+    """Replace the window settings with ones returned by configure_window"""
+    global _window, _idle_params
+    _get_config()['window'] = dict(settings)
+    _window = None
+    _idle_params = None
+    get_window()
+
+def _frame_size(size):
+    """(width, height) of a configured frame size: N (square) or [width, height]"""
+    if isinstance(size, (int, float)):
+        return int(size), int(size)
+    return tuple(int(v) for v in size)
+
+def create_renderer(name=None, preview=False, resolution=None, supersample=None):
+    """
+    Create the renderer backend named by the renderer key of configs/model.yaml
+
+    Args:
+        name: 'neural' (PIL drawing), 'raster' (Numba kernel that releases
+              the GIL; falls back to 'neural' when numba is not installed) or
+              'atlas' (precomputed part sprites, mouth_bins from the atlas
+              section of configs/model.yaml) (None = configured backend)
+        preview: Render at render.preview_resolution without supersampling
+        resolution: Frame size as (width, height) (None = render.resolution)
+        supersample: Supersampling factor for anti-aliasing (None =
+                     render.supersample; the atlas never supersamples)
+
+    Returns:
+        renderer: Renderer, RasterRenderer or SpriteRenderer
+    """
+    config = _get_config()
+    name = name or config.get('renderer', 'neural')
+    render = config.get('render', {})
+    if preview:
+        resolution = resolution or _frame_size(render.get('preview_resolution', 128))
+        supersample = 1
+    resolution = resolution or _frame_size(render.get('resolution', 256))
+    supersample = supersample or render.get('supersample', 1)
+
+    if name == 'atlas':
+        return SpriteRenderer(resolution, config.get('atlas', {}).get('mouth_bins'))
+    if name == 'raster':
+        if NUMBA_AVAILABLE:
+            return RasterRenderer(resolution, supersample)
+        print("⚠️  numba is not installed; using the PIL renderer")
+        return Renderer(resolution, supersample)
+    if name != 'neural':
+        raise ValueError(f"Unknown renderer: {name}")
+    return Renderer(resolution, supersample)
 
 def _get_models():
     global _models
-    if _models is None:
+    if _models is not None:
+        return _models
+    with _models_lock:
+        if _models is not None:
+            return _models
+        start = time.perf_counter()
         # Load configuration
-        config_path = Path(__file__).parent.parent / "configs" / "model.yaml"
-        with open(config_path) as f:
-            config = yaml.safe_load(f)
-        
-        _models = {
-            'speech': SpeechEncoder(),
-            'expression': ExpressionModel(),
-            'motion': MotionModel(),
-            'renderer': Renderer()
-        }
+        config = _get_config()
+
+        # Seed weight initialization so every process builds identical models
+        # (and identical model hashes) without disturbing the global RNG
+        with torch.random.fork_rng():
+            torch.manual_seed(config.get('seed', 0))
+            models = {
+                'speech': SpeechEncoder(),
+                'expression': ExpressionModel(),
+                'motion': MotionModel(),
+                'renderer': create_renderer()
+            }
+        for name in ('speech', 'expression', 'motion'):
+            models[name].eval()
+        # Published only once complete: readers outside the lock must never see it half built
+        _models = models
+        metrics.record_model_load(time.perf_counter() - start)
     return _models
 
-def run_pipeline(audio_path):
-    audio = clean_audio(audio_path)
-    
+def _weights_hash(names):
+    """Short SHA-1 of the state dicts of the named models"""
+    models = _get_models()
+    digest = hashlib.sha1()
+    for name in names:
+        for key, tensor in models[name].state_dict().items():
+            digest.update(f"{name}.{key}".encode())
+            digest.update(tensor.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def get_model_hash():
+    """
+    Short content hash of the loaded model weights
+
+    Stored in parameter files so a render can tell which weights produced them.
+    """
+    global _model_hash
+    if _model_hash is None:
+        _model_hash = _weights_hash(('speech', 'expression', 'motion'))
+    return _model_hash
+
+def get_encoder_hash():
+    """Short content hash of the SpeechEncoder weights (feature cache key)"""
+    global _encoder_hash
+    if _encoder_hash is None:
+        _encoder_hash = _weights_hash(('speech',))
+    return _encoder_hash
+
+def get_pipeline_version():
+    """
+    Version string of everything that determines pipeline output
+
+    Combines the model weights hash with a hash of configs/model.yaml, for
+    keying caches of rendered results.
+    """
+    config = json.dumps(_get_config(), sort_keys=True).encode()
+    return f"{get_model_hash()}-{hashlib.sha1(config).hexdigest()[:8]}"
+
+def warm_up():
+    """
+    Load the models, compute their hashes and run one forward pass
+
+    Marks the process ready for /health (metrics.models_ready) once done.
+    """
+    _get_models()
+    get_model_hash()
+    get_encoder_hash()
+    _get_idle_parameters()
+    metrics.set_models_ready()
+
+def share_models():
+    """
+    Load the models and move their weights into shared memory
+
+    Called by a parent process before forking workers (api/model_server.py):
+    the workers then attach to one copy of the weights instead of each
+    holding its own. The models are warmed up here too (warm_up), so
+    workers start ready.
+
+    Returns:
+        nbytes: Size of the shared weights in bytes
+    """
+    models = _get_models()
+    nbytes = 0
+    for name in ('speech', 'expression', 'motion'):
+        models[name].share_memory()
+        nbytes += sum(t.numel() * t.element_size() for t in models[name].state_dict().values())
+    warm_up()
+    return nbytes
+
+def _run_models(models, audio):
+    """Run encoder -> expression -> motion on an audio batch [B, window length]"""
+    metrics.observe_batch(len(audio))
+    with metrics.time_stage('encode'):
+        features = models['speech'](audio)
+    with metrics.time_stage('expression'):
+        expression = models['expression'](features)
+    with metrics.time_stage('motion'):
+        head_motion, eye_motion = models['motion'](expression)
+    return expression, head_motion, eye_motion
+
+def _frame_windows(audio, fps):
+    """
+    Strided view of the audio window that drives each output frame
+
+    Frame i sees the get_window() window placed at i * (SAMPLE_RATE // fps)
+    (by default 1 s starting there), zero-padded outside the clip.
+
+    Returns:
+        windows: Read-only array view [num_frames, window length]
+    """
+    length, offset = get_window()
+    samples_per_frame = int(SAMPLE_RATE / fps)
+    num_frames = int(len(audio) / SAMPLE_RATE * fps)
+    front = max(0, -offset)
+    padded = np.pad(np.asarray(audio, dtype=np.float32), (front, length + max(0, offset)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, length)
+    return windows[front + offset::samples_per_frame][:num_frames]
+
+def encode_features(audio, fps=30, batch_size=32, frames=None, single_pass=False):
+    """
+    Run the SpeechEncoder over the window of every output frame
+
+    Args:
+        audio: Mono audio array sampled at 16kHz
+        fps: Output frame rate
+        batch_size: Number of frame windows encoded at once
+        frames: Optional frame indices to encode (None = all frames)
+        single_pass: Offline mode: run the conv stack once over the clip and
+                     pool every window from a prefix sum
+                     (SpeechEncoder.encode_windows) instead of once per
+                     window; ~1/30th of the conv compute at 30 fps. Exact
+                     when the frame hop is a multiple of 40 samples (25 or
+                     50 fps), otherwise windows shift by up to 1.25 ms
+
+    Returns:
+        features: Float32 array [T, 256] (or [len(frames), 256])
+    """
+    if single_pass:
+        return _encode_single_pass(audio, fps, frames)
+
+    models = _get_models()
+    windows = _frame_windows(audio, fps)
+    if frames is not None:
+        windows = windows[frames]
+
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(windows), batch_size):
+            batch = torch.from_numpy(np.ascontiguousarray(windows[start:start + batch_size]))
+            metrics.observe_batch(len(batch))
+            with metrics.time_stage('encode'):
+                outputs.append(models['speech'](batch).numpy())
+
+    return np.concatenate(outputs) if outputs else np.zeros((0, FEATURE_DIM), dtype=np.float32)
+
+def _encode_single_pass(audio, fps, frames=None):
+    """encode_features(single_pass=True), in spans of at most SINGLE_PASS_SPAN samples"""
+    encoder = _get_models()['speech']
+    length, offset = get_window()
+    num_frames = int(len(audio) / SAMPLE_RATE * fps)
+    frames = np.arange(num_frames) if frames is None else np.asarray(frames)
+    # Zero padding around the clip, as each window gets in _frame_windows
+    front = max(0, -offset)
+    starts = frames * int(SAMPLE_RATE / fps) + offset + front
+    padded = torch.from_numpy(np.pad(np.asarray(audio, dtype=np.float32),
+                                     (front, length + max(0, offset) + CONV_STRIDE)))
+
+    outputs = []
+    begin = 0
+    with torch.no_grad():
+        while begin < len(starts):
+            end = int(np.searchsorted(starts, starts[begin] + SINGLE_PASS_SPAN, side='right'))
+            metrics.observe_batch(end - begin)
+            with metrics.time_stage('encode'):
+                outputs.append(encoder.encode_windows(padded, starts[begin:end], length).numpy())
+            begin = end
+
+    return np.concatenate(outputs) if outputs else np.zeros((0, FEATURE_DIM), dtype=np.float32)
+
+def parameters_from_features(features, fps=30):
+    """
+    Compute per-frame expression and motion parameters from encoder features
+
+    Args:
+        features: Speech features [T, 256] (e.g. read from a FeatureStore)
+        fps: Frame rate the features were computed at
+
+    Returns:
+        params: Dict with 'expression' [T, 64], 'head_motion' [T, 3],
+                'eye_motion' [T, 2] float32 arrays, 'fps' and 'model_hash'
+    """
+    models = _get_models()
+    features = torch.from_numpy(np.asarray(features, dtype=np.float32))
+
+    with torch.no_grad():
+        with metrics.time_stage('expression'):
+            expression = models['expression'](features)
+        with metrics.time_stage('motion'):
+            head_motion, eye_motion = models['motion'](expression)
+
+    return {
+        'expression': expression.numpy(),
+        'head_motion': head_motion.numpy(),
+        'eye_motion': eye_motion.numpy(),
+        'fps': fps,
+        'model_hash': get_model_hash(),
+    }
+
+def _get_idle_parameters():
+    """Model output for a silent window (the idle pose), computed once"""
+    global _idle_params
+    if _idle_params is None:
+        models = _get_models()
+        with torch.no_grad():
+            outputs = _run_models(models, torch.zeros(1, get_window()[0]))
+        _idle_params = {key: value.numpy()[0] for key, value in zip(PARAM_KEYS, outputs)}
+    return _idle_params
+
+def _fill_silence(speech_params, speech, num_frames, mode):
+    """
+    Expand parameters computed for speech frames to all frames
+
+    Silent frames take the idle pose ('idle'), or are interpolated linearly
+    between the surrounding speech frames ('interpolate'); silence before the
+    first or after the last speech frame always uses the idle pose.
+    """
+    idle = _get_idle_parameters()
+    params = {}
+    for key in PARAM_KEYS:
+        values = np.repeat(idle[key][None], num_frames, axis=0)
+        values[speech] = speech_params[key]
+
+        if mode == 'interpolate' and len(speech) > 1:
+            inner = np.arange(speech[0], speech[-1] + 1)
+            inner = inner[~np.isin(inner, speech)]
+            right = np.searchsorted(speech, inner)
+            left_frame, right_frame = speech[right - 1], speech[right]
+            weight = ((inner - left_frame) / (right_frame - left_frame))[:, None].astype(np.float32)
+            values[inner] = (1 - weight) * values[left_frame] + weight * values[right_frame]
+
+        params[key] = values
+    return params
+
+def _keyframes(frames, fps, keyframe_rate):
+    """
+    Frames to run the models on when inferring at keyframe_rate
+
+    Every (fps / keyframe_rate)-th frame among the given frame indices, plus
+    the first and last frame of each run of consecutive frames, so
+    interpolation never has to extrapolate or bridge a gap.
+    """
+    if len(frames) == 0:
+        return frames
+    step = fps / keyframe_rate
+    on_grid = np.isin(frames, np.round(np.arange(0, frames[-1] + 1, step)).astype(frames.dtype))
+    gaps = np.diff(frames) > 1
+    boundaries = np.concatenate([[True], gaps]) | np.concatenate([gaps, [True]])
+    return frames[on_grid | boundaries]
+
+def _parameters_at(audio, fps, batch_size, frames, keyframe_rate, interpolation, single_pass):
+    """Model parameters for the given frames, optionally from interpolated keyframes"""
+    if keyframe_rate is None or keyframe_rate >= fps:
+        features = encode_features(audio, fps, batch_size, frames=frames, single_pass=single_pass)
+        return parameters_from_features(features, fps)
+
+    keys = _keyframes(frames, fps, keyframe_rate)
+    key_params = parameters_from_features(
+        encode_features(audio, fps, batch_size, frames=keys, single_pass=single_pass), fps)
+    params = dict(key_params)
+    for key in PARAM_KEYS:
+        # Clipped like the models' tanh outputs: cubic segments can overshoot them
+        bound = PARAM_BOUNDS[key]
+        params[key] = interpolate_keyframes(keys, key_params[key], frames, interpolation,
+                                            bounds=(-bound, bound))
+    return params
+
+def infer_parameters(audio, fps=30, batch_size=32, silence=None, single_pass=False,
+                     keyframe_rate=None, interpolation='cubic'):
+    """
+    Compute per-frame expression and motion parameters for a whole clip
+
+    Args:
+        audio: Mono audio array sampled at 16kHz
+        fps: Output frame rate
+        batch_size: Number of frame windows run through the encoder at once
+        silence: How to handle frames labelled silent by the energy VAD:
+                 None runs the models on every frame; 'idle' uses the idle
+                 pose and 'interpolate' blends between neighbouring speech
+                 frames, both without running the models on silent frames
+        single_pass: Encode the whole clip in one conv pass (see encode_features)
+        keyframe_rate: Run the models at this rate (Hz) only and interpolate
+                       the parameters up to fps (None = every frame)
+        interpolation: Keyframe interpolation, 'cubic' or 'linear'
+
+    Returns:
+        params: Dict with 'expression' [T, 64], 'head_motion' [T, 3],
+                'eye_motion' [T, 2] float32 arrays, 'fps' and 'model_hash'
+                ('silent' [T] mask too when silence gating is used)
+    """
+    num_frames = int(len(audio) / SAMPLE_RATE * fps)
+    if silence is None:
+        return _parameters_at(audio, fps, batch_size, np.arange(num_frames), keyframe_rate,
+                              interpolation, single_pass)
+    if silence not in ('idle', 'interpolate'):
+        raise ValueError(f"Unknown silence mode: {silence}")
+
+    length, offset = get_window()
+    silent = silent_frames(audio, SAMPLE_RATE, fps, lookahead=max(0, length + offset) / SAMPLE_RATE)
+    speech = np.flatnonzero(~silent)
+    speech_params = _parameters_at(audio, fps, batch_size, speech, keyframe_rate,
+                                   interpolation, single_pass)
+
+    params = _fill_silence(speech_params, speech, len(silent), silence)
+    params['fps'] = fps
+    params['model_hash'] = speech_params['model_hash']
+    params['silent'] = silent
+    return params
+
+def stream_parameters(blocks, fps=30, batch_size=32):
+    """
+    Compute parameters incrementally from a stream of audio blocks
+
+    Frames are run through the models as soon as their full context window
+    (get_window) has arrived (in batches of batch_size), and consumed audio is dropped, so
+    memory stays constant however long the stream is. The concatenated output
+    matches infer_parameters on the whole clip.
+
+    Args:
+        blocks: Iterable of mono float32 audio blocks sampled at 16kHz
+                (e.g. preprocessing.stream_clean_audio)
+        fps: Output frame rate
+        batch_size: Number of frames run through the models at once
+
+    Yields:
+        params: Parameter dict (as infer_parameters) for the next chunk of frames
+    """
+    length, window_offset = get_window()
+    samples_per_frame = int(SAMPLE_RATE / fps)
+    # Windows reaching before the clip start see zeros, as in _frame_windows
+    buffer = np.zeros(max(0, -window_offset), dtype=np.float32)
+    offset = -len(buffer)  # Absolute sample index of buffer[0]
+    total = 0
+    next_frame = 0
+
+    def run(count):
+        nonlocal buffer, offset, next_frame
+        start = next_frame * samples_per_frame + window_offset - offset
+        needed = start + (count - 1) * samples_per_frame + length
+        audio = buffer if len(buffer) >= needed else np.pad(buffer, (0, needed - len(buffer)))
+        windows = np.lib.stride_tricks.sliding_window_view(audio[start:needed], length)
+        windows = windows[::samples_per_frame][:count]
+        metrics.observe_batch(count)
+        with torch.no_grad(), metrics.time_stage('encode'):
+            features = _get_models()['speech'](torch.from_numpy(np.ascontiguousarray(windows))).numpy()
+
+        next_frame += count
+        drop = min(max(0, next_frame * samples_per_frame + window_offset - offset), len(buffer))
+        buffer = buffer[drop:]
+        offset += drop
+        return parameters_from_features(features, fps)
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, np.asarray(block, dtype=np.float32)])
+        total += len(block)
+        # Frames that exist and whose window is complete
+        complete = (total - window_offset - length) // samples_per_frame + 1
+        ready = min(complete, int(total / SAMPLE_RATE * fps)) - next_frame
+        while ready >= batch_size:
+            yield run(batch_size)
+            ready -= batch_size
+
+    # End of stream: remaining frames see zero padding, as in _frame_windows
+    num_frames = int(total / SAMPLE_RATE * fps)
+    while next_frame < num_frames:
+        yield run(min(batch_size, num_frames - next_frame))
+
+def viseme_parameters(audio, fps=30):
+    """
+    Cheap parameter sequence driven only by visemes (no model inference)
+
+    The mouth follows per-frame visemes from the spectral classifier; the
+    rest of the face stays in its neutral pose.
+
+    Args:
+        audio: Mono audio array sampled at 16kHz
+        fps: Output frame rate
+
+    Returns:
+        params: Parameter dict as from infer_parameters, plus 'viseme' [T]
+    """
+    visemes = extract_visemes(audio, SAMPLE_RATE, fps)
+    expression = np.zeros((len(visemes), PARAM_DIMS['expression']), dtype=np.float32)
+    expression[:, 0] = VISEME_OPENNESS[visemes]
+
+    return {
+        'expression': expression,
+        'head_motion': np.zeros((len(visemes), PARAM_DIMS['head_motion']), dtype=np.float32),
+        'eye_motion': np.zeros((len(visemes), PARAM_DIMS['eye_motion']), dtype=np.float32),
+        'viseme': visemes,
+        'fps': fps,
+        'model_hash': 'visemes',
+    }
+
+def open_feature_store(root, fps=30):
+    """Open a FeatureStore keyed to the current encoder weights and window"""
+    length, offset = get_window()
+    return FeatureStore(root, get_encoder_hash(), fps, length, FEATURE_DIM, window_offset=offset)
+
+def render_threads(renderer):
+    """Default number of render threads: one per CPU if the renderer releases the GIL"""
+    return (os.cpu_count() or 1) if getattr(renderer, 'nogil', False) else 1
+
+def render_parameters(params, renderer=None, threads=None, pool=None, channels='rgb'):
+    """
+    Render frames from a parameter sequence without running any model
+
+    Args:
+        params: Parameter dict from ``infer_parameters`` or ``load_param_sequence``
+        renderer: Renderer to draw with (the configured backend is created if omitted)
+        threads: Render threads (None = render_threads(renderer))
+        pool: Optional postprocessing.FramePool to render into instead of
+              allocating every frame; a yielded frame is then only valid until
+              the next one is requested
+        channels: Channel order of the frames, 'rgb' or 'bgr'
+
+    Consecutive frames with identical parameters (e.g. gated silence held at
+    the idle pose) reuse the previously rendered frame. With several threads
+    up to 2 * threads frames (and fewer than len(pool)) are in flight and
+    frames are yielded in order.
+
+    Yields:
+        frame: Image as numpy array [H, W, 3]
+    """
+    renderer = renderer or create_renderer()
+    if threads is None:
+        threads = render_threads(renderer)
+    in_flight = 2 * threads if pool is None else min(2 * threads, len(pool) - 1)
+    visemes = params.get('viseme')
+
+    def render(i, out):
+        with metrics.time_stage('render'):
+            return renderer.render(params['expression'][i],
+                                   (params['head_motion'][i], params['eye_motion'][i]),
+                                   viseme=None if visemes is None else visemes[i],
+                                   out=out, channels=channels)
+
+    # Index of the frame each frame repeats (itself unless unchanged)
+    sources = [0] * len(params['expression'])
+    for i in range(1, len(sources)):
+        sources[i] = sources[i - 1] if _same_parameters(params, i - 1, i) else i
+
+    if threads <= 1 or in_flight < 2:
+        frame = None
+        for i, source in enumerate(sources):
+            if source == i:
+                frame = render(i, None if pool is None else pool.next())
+            yield frame
+        return
+
+    with ThreadPoolExecutor(threads) as executor:
+        pending = {}
+        submitted = 0
+        frame = None
+        for i, source in enumerate(sources):
+            while submitted < len(sources) and len(pending) < in_flight:
+                if sources[submitted] == submitted:
+                    out = None if pool is None else pool.next()
+                    pending[submitted] = executor.submit(render, submitted, out)
+                submitted += 1
+            if source == i:
+                frame = pending.pop(i).result()
+            yield frame
+
+def _same_parameters(params, a, b):
+    """Check whether frames a and b of a parameter sequence render identically"""
+    keys = PARAM_KEYS + (('viseme',) if 'viseme' in params else ())
+    return all(np.array_equal(params[key][a], params[key][b]) for key in keys)
+
+def _first_window(audio):
+    """The first frame's context window of a clip (see get_window), zero-padded outside it"""
+    length, offset = get_window()
+    start = max(0, offset)
+    window = np.zeros(length, dtype=np.float32)
+    clip = np.asarray(audio[start:max(0, offset + length)], dtype=np.float32)
+    window[start - offset:start - offset + len(clip)] = clip
+    return window
+
+def run_pipeline(audio_path, params_path=None):
+    with metrics.time_stage('decode'):
+        audio = clean_audio(audio_path)
+
     # Ensure audio has correct shape [batch_size, sequence_length]
-    # clean_audio returns 1D array, need to match expected input of 16000
-    if len(audio) < 16000:
-        # Pad if too short
-        audio = torch.nn.functional.pad(torch.tensor(audio), (0, 16000 - len(audio)))
-    else:
-        # Truncate if too long
-        audio = torch.tensor(audio[:16000])
-    
-    audio = audio.unsqueeze(0).float()  # Add batch dimension [1, 16000]
+    # clean_audio returns 1D array; take the first frame's context window
+    audio = torch.from_numpy(_first_window(audio)).unsqueeze(0)  # Add batch dimension [1, length]
 
     models = _get_models()
-    
-    features = models['speech'](audio)
-    expression = models['expression'](features)
-    head_motion, eye_motion = models['motion'](expression)
-    frame = models['renderer'].render(expression, head_motion)
+
+    with torch.no_grad():
+        expression, head_motion, eye_motion = _run_models(models, audio)
+    with metrics.time_stage('render'):
+        frame = models['renderer'].render(expression, (head_motion, eye_motion))
+
+    if params_path:
+        save_param_sequence(params_path, {
+            'expression': expression.numpy(),
+            'head_motion': head_motion.numpy(),
+            'eye_motion': eye_motion.numpy(),
+            'fps': _get_config().get('fps', 30),
+            'model_hash': get_model_hash(),
+        })
 
     return frame
+
+def _decode_timed(path):
+    """clean_audio(path), its wall time and the error it raised, if any"""
+    start = time.perf_counter()
+    try:
+        with metrics.time_stage('decode'):
+            audio = clean_audio(path)
+        return audio, time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, e
+
+def run_pipeline_batch(audio_paths, batch_size=32, workers=None):
+    """
+    Run run_pipeline over many files in one process
+
+    The models are loaded once. Files are decoded concurrently on a thread
+    pool (the next batch while the current one runs through the models), the
+    first-frame windows of a batch go through the models as one batch, and
+    the frames are rendered with render_parameters.
+
+    Args:
+        audio_paths: Audio file paths
+        batch_size: Files per model batch
+        workers: Decode threads (None = one per CPU)
+
+    Yields:
+        result: Dict per file, in input order, with path, error (None or the
+                exception), frame [H, W, 3] RGB, params (one-frame parameter
+                dict as run_pipeline saves it), duration (s of audio) and
+                timing (decode, models and render seconds; models and render
+                are the file's share of its batch)
+    """
+    paths = list(audio_paths)
+    models = _get_models()
+    fps = _get_config().get('fps', 30)
+    pending = deque()
+    submitted = 0
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as executor:
+        for first in range(0, len(paths), batch_size):
+            # Keep up to one more batch decoding while this one runs
+            while submitted < min(len(paths), first + 2 * batch_size):
+                pending.append(executor.submit(_decode_timed, paths[submitted]))
+                submitted += 1
+            results, decoded, windows = [], [], []
+            for path in paths[first:first + batch_size]:
+                audio, seconds, error = pending.popleft().result()
+                results.append({
+                    'path': path, 'error': error, 'frame': None, 'params': None,
+                    'duration': 0.0 if audio is None else len(audio) / SAMPLE_RATE,
+                    'timing': {'decode': seconds, 'models': 0.0, 'render': 0.0},
+                })
+                if error is None:
+                    decoded.append(results[-1])
+                    windows.append(_first_window(audio))
+            if decoded:
+                start = time.perf_counter()
+                with torch.no_grad():
+                    outputs = _run_models(models, torch.from_numpy(np.stack(windows)))
+                params = dict(zip(PARAM_KEYS, (output.numpy() for output in outputs)))
+                models_seconds = (time.perf_counter() - start) / len(decoded)
+
+                start = time.perf_counter()
+                frames = list(render_parameters(params, models['renderer']))
+                render_seconds = (time.perf_counter() - start) / len(decoded)
+                for i, result in enumerate(decoded):
+                    result['frame'] = frames[i]
+                    result['params'] = {key: params[key][i:i + 1] for key in PARAM_KEYS}
+                    result['params'].update({'fps': fps, 'model_hash': get_model_hash()})
+                    result['timing']['models'] = models_seconds
+                    result['timing']['render'] = render_seconds
+            yield from results
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def temporal_smooth(frames):
     """
     Apply temporal smoothing filter to video frames
@@ -10,3 +13,58 @@ def temporal_smooth(frames):
     """
     # TODO: Implement temporal smoothing (e.g., moving average, Kalman filter)
     return frames
+
+
+def interpolate_keyframes(key_times, key_values, times, method='cubic', bounds=None):
+    """
+    Interpolate per-keyframe parameter vectors to other time points
+
+    Vectorized over frames and parameter dimensions. 'cubic' is a cubic
+    Hermite spline whose tangents come from np.gradient over the (possibly
+    unevenly spaced) keyframes, so it passes through every keyframe without
+    the overshoot of a global spline; 'linear' blends the two neighbours.
+    Times outside the keyframe range hold the first/last keyframe. A cubic
+    segment can still overshoot its keyframes between them, so values can be
+    clipped to the range the parameters are valid in.
+
+    Args:
+        key_times: Increasing keyframe times or frame indices [K]
+        key_values: Parameter vectors at the keyframes [K, D]
+        times: Times to evaluate [T]
+        method: 'cubic' or 'linear'
+        bounds: (low, high) to clip the interpolated values to (None = no clipping)
+
+    Returns:
+        values: Interpolated parameters [T, D] (dtype of key_values)
+    """
+    if method not in ('cubic', 'linear'):
+        raise ValueError(f"Unknown interpolation method: {method}")
+    key_times = np.asarray(key_times, dtype=np.float64)
+    key_values = np.asarray(key_values)
+    if len(key_times) == 0:
+        if len(times):
+            raise ValueError("Cannot interpolate without keyframes")
+        return key_values.copy()
+    times = np.clip(np.asarray(times, dtype=np.float64), key_times[0], key_times[-1])
+    if len(key_times) == 1:
+        return np.repeat(key_values, len(times), axis=0)
+
+    # Segment k spans key_times[k]..key_times[k + 1]
+    k = np.clip(np.searchsorted(key_times, times, side='right') - 1, 0, len(key_times) - 2)
+    span = key_times[k + 1] - key_times[k]
+    t = ((times - key_times[k]) / span)[:, None]
+    v0 = key_values[k].astype(np.float64)
+    v1 = key_values[k + 1].astype(np.float64)
+    if method == 'linear':
+        return (v0 + (v1 - v0) * t).astype(key_values.dtype)
+
+    tangents = np.gradient(key_values.astype(np.float64), key_times, axis=0)
+    m0 = tangents[k] * span[:, None]
+    m1 = tangents[k + 1] * span[:, None]
+    t2 = t * t
+    t3 = t2 * t
+    values = ((2 * t3 - 3 * t2 + 1) * v0 + (t3 - 2 * t2 + t) * m0
+              + (-2 * t3 + 3 * t2) * v1 + (t3 - t2) * m1)
+    if bounds is not None:
+        np.clip(values, bounds[0], bounds[1], out=values)
+    return values.astype(key_values.dtype)
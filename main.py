@@ -1,33 +1,191 @@
 """
 Real-Time Talking Avatar System - Main Entry Point
 
-This script runs the avatar generation pipeline from audio input.
+This script runs the avatar generation pipeline from audio input. Several
+inputs (files, globs, directories or a --manifest listing) are processed in
+one process with the models loaded once: decoded concurrently, run through
+the models in batches, and written to an output directory.
 """
 import argparse
+import glob
+import os
 import sys
+import time
 from pathlib import Path
 import cv2
 import yaml
 
-from inference.realtime_pipeline import run_pipeline
+from inference.param_sequence import save_param_sequence
+from inference.realtime_pipeline import run_pipeline, run_pipeline_batch
+from inference.profiling import PROFILE_ENV, profile_dir, profile_run
+from postprocessing.image_writer import DEFAULT_QUALITY, IMAGE_EXTENSIONS, ImageEncoder
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac')
+
+
+def _read_manifest(path: str) -> list:
+    """Audio paths (first '|'-separated column) listed in a manifest, relative to it"""
+    base = Path(path).parent
+    with open(path, encoding='utf-8') as f:
+        entries = [line.split('|')[0].strip() for line in f]
+    return [str(base / entry) for entry in entries if entry and not entry.startswith('#')]
+
+
+def expand_inputs(inputs: list, manifest: str = None) -> list:
+    """
+    Resolve input arguments to audio files
+    
+    Args:
+        inputs: Audio files, glob patterns (** recurses) or directories
+                (their audio files, not recursive)
+        manifest: Optional file listing one audio path per line
+        
+    Returns:
+        paths: Audio file paths in argument order, without duplicates
+    """
+    paths = []
+    for item in inputs:
+        if glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+        elif os.path.isdir(item):
+            paths.extend(sorted(str(p) for p in Path(item).iterdir()
+                                if p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            paths.append(item)
+    if manifest:
+        paths.extend(_read_manifest(manifest))
+    return list(dict.fromkeys(paths))
+
+
+def _output_names(paths: list, ext: str) -> list:
+    """One output file name per input: its stem, numbered when stems repeat"""
+    names, seen = [], {}
+    for path in paths:
+        stem = Path(path).stem
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(f"{stem}{ext}" if seen[stem] == 1 else f"{stem}_{seen[stem] - 1}{ext}")
+    return names
+
+
+def run_batch(paths: list, output_dir: str, fmt: str = 'png', quality: int = None,
+              params_dir: str = None, batch_size: int = 32, workers: int = None) -> list:
+    """
+    Render the first frame of many audio files in one warm process
+    
+    Args:
+        paths: Audio file paths
+        output_dir: Directory for the images (<stem>.<fmt>)
+        fmt: Image format, 'png' or 'jpg'
+        quality: JPEG quality or PNG compression level
+        params_dir: Optional directory for per-file parameters (<stem>.npz)
+        batch_size: Files per model batch
+        workers: Decode and encode threads (None = one per CPU)
+        
+    Returns:
+        results: run_pipeline_batch result dicts, with 'output' and the
+                 timing's 'total' added
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if params_dir:
+        os.makedirs(params_dir, exist_ok=True)
+    names = _output_names(paths, '.' + fmt)
+    
+    results = []
+    with ImageEncoder(fmt, quality, threads=workers or 0, channels='rgb') as encoder:
+        for result, name in zip(run_pipeline_batch(paths, batch_size, workers), names):
+            result['timing']['total'] = sum(result['timing'].values())
+            results.append(result)
+            if result['error'] is not None:
+                print(f"⚠️  {result['path']}: {result['error']}")
+                continue
+            result['output'] = os.path.join(output_dir, name)
+            encoder.submit(result['frame'], result['output'])
+            result['frame'] = None
+            if params_dir:
+                save_param_sequence(os.path.join(params_dir, Path(name).stem + '.npz'), result['params'])
+    return results
+
+
+def _print_summary(results: list, seconds: float):
+    """Per-file timing table and total throughput"""
+    width = max(len('File'), *(len(result['path']) for result in results))
+    print(f"\n{'File':<{width}} {'Audio (s)':>9} {'Decode (ms)':>11} {'Models (ms)':>11} "
+          f"{'Render (ms)':>11} {'Total (ms)':>10}")
+    for result in results:
+        timing = result['timing']
+        status = '' if result['error'] is None else '  failed'
+        print(f"{result['path']:<{width}} {result['duration']:>9.2f} {timing['decode'] * 1000:>11.1f} "
+              f"{timing['models'] * 1000:>11.1f} {timing['render'] * 1000:>11.1f} "
+              f"{timing['total'] * 1000:>10.1f}{status}")
+    
+    done = [result for result in results if result['error'] is None]
+    audio_seconds = sum(result['duration'] for result in done)
+    print(f"\n✓ {len(done)}/{len(results)} files in {seconds:.2f}s: "
+          f"{len(done) / seconds:.1f} files/s, {audio_seconds / seconds:.1f}s of audio per second")
+
+
+def _batch_from_args(args, paths: list):
+    """Run the batch requested on the command line and print its summary"""
+    output = args.output or 'outputs'
+    print(f"Processing {len(paths)} audio files...")
+    start = time.perf_counter()
+    try:
+        results = run_batch(paths, output, args.image_format, args.quality, args.save_params,
+                            args.batch_size, args.workers)
+    except Exception as e:
+        print(f"Error during batch execution: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    
+    _print_summary(results, time.perf_counter() - start)
+    print(f"✓ Outputs saved to: {output}")
+    if any(result['error'] is not None for result in results):
+        sys.exit(1)
 
 
 def main():
     parser = argparse.ArgumentParser(description='Real-Time Talking Avatar System')
-    parser.add_argument('--audio', type=str, required=True,
-                       help='Path to input audio file')
-    parser.add_argument('--output', type=str, default='output.png',
-                       help='Path to output image file')
+    parser.add_argument('--audio', type=str, nargs='+', default=[],
+                       help='Input audio file(s), glob patterns (quote them) or directories')
+    parser.add_argument('--manifest', type=str, default=None,
+                       help='File listing input audio paths, one per line (relative to the manifest)')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Output image file (.png or .jpg; default output.png), or the output '
+                            'directory for several inputs (default: outputs)')
+    parser.add_argument('--image-format', type=str, default='png', choices=['png', 'jpg'],
+                       help='Image format for several inputs (default: png)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Files per model batch for several inputs (default: 32)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Decode and encode threads for several inputs (default: one per CPU)')
+    parser.add_argument('--quality', type=int, default=None,
+                       help='JPEG quality (0-100, default 90) or PNG compression level (0-9, default 3)')
     parser.add_argument('--config', type=str, default='configs/inference.yaml',
                        help='Path to inference configuration file')
+    parser.add_argument('--save-params', type=str, default=None,
+                       help='Also save the frame parameters to this .npz file '
+                            '(a directory of <stem>.npz for several inputs)')
+    parser.add_argument('--profile', type=str, default=None, metavar='DIR',
+                       help=f'Write a Chrome trace and speedscope profile of the run to DIR '
+                            f'(also enabled by ${PROFILE_ENV})')
     
     args = parser.parse_args()
     
-    # Check if audio file exists
-    audio_path = Path(args.audio)
-    if not audio_path.exists():
-        print(f"Error: Audio file not found: {args.audio}")
-        sys.exit(1)
+    # A single plain file keeps the single-image behavior; anything else is a batch
+    batch = args.manifest is not None or len(args.audio) != 1 \
+        or glob.has_magic(args.audio[0]) or os.path.isdir(args.audio[0])
+    if batch:
+        paths = expand_inputs(args.audio, args.manifest)
+        if not paths:
+            print("Error: No input audio files found")
+            sys.exit(1)
+    else:
+        # Check if audio file exists
+        audio_path = Path(args.audio[0])
+        if not audio_path.exists():
+            print(f"Error: Audio file not found: {args.audio[0]}")
+            sys.exit(1)
     
     # Load inference config
     config_path = Path(args.config)
@@ -36,15 +194,38 @@ def main():
             config = yaml.safe_load(f)
         print(f"Loaded config: {config}")
     
-    print(f"Processing audio: {args.audio}")
+    if batch:
+        output_dir = profile_dir(args.profile)
+        if output_dir:
+            with profile_run('run_batch', output_dir):
+                _batch_from_args(args, paths)
+        else:
+            _batch_from_args(args, paths)
+        return
+    
+    args.output = args.output or 'output.png'
+    print(f"Processing audio: {args.audio[0]}")
     print("Running pipeline...")
     
     try:
         # Run the avatar generation pipeline
-        frame = run_pipeline(str(audio_path))
+        output_dir = profile_dir(args.profile)
+        if output_dir:
+            with profile_run('run_pipeline', output_dir):
+                frame = run_pipeline(str(audio_path), params_path=args.save_params)
+        else:
+            frame = run_pipeline(str(audio_path), params_path=args.save_params)
         
-        # Save output frame
-        cv2.imwrite(args.output, frame)
+        # Save output frame (rendered RGB); any format OpenCV writes, with
+        # --quality applied to JPEG and PNG
+        params = []
+        fmt = IMAGE_EXTENSIONS.get(os.path.splitext(args.output)[1].lower())
+        if fmt is not None:
+            quality = DEFAULT_QUALITY[fmt] if args.quality is None else args.quality
+            flag = cv2.IMWRITE_JPEG_QUALITY if fmt == 'jpg' else cv2.IMWRITE_PNG_COMPRESSION
+            params = [flag, int(quality)]
+        if not cv2.imwrite(args.output, cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), params):
+            raise RuntimeError(f"Could not write image {args.output}")
         print(f"✓ Output saved to: {args.output}")
         
     except Exception as e:
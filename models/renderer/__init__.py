@@ -1,3 +1,5 @@
 from .model import Renderer
+from .raster import RasterRenderer, NUMBA_AVAILABLE
+from .sprites import SpriteRenderer
 
-__all__ = ['Renderer']
+__all__ = ['Renderer', 'RasterRenderer', 'SpriteRenderer', 'NUMBA_AVAILABLE']
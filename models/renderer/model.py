@@ -1,23 +1,107 @@
+import threading
 import torch
 import numpy as np
 from PIL import Image, ImageDraw
 
+# Geometry is in normalized units: 1/DESIGN_SIZE of the frame's shorter side
+# (pixels of the original 256x256 frame), scaled to the render resolution
+DESIGN_SIZE = 256
+
+# Mouth shape per viseme id (see preprocessing.phoneme_extractor.VISEMES):
+# (half width, opening below the lip line, closed) in normalized units
+VISEME_MOUTHS = [
+    (25, 10, True),   # sil: relaxed closed smile
+    (22, 0, True),    # PP: lips pressed together
+    (22, 4, False),   # FF: lower lip tucked, slight opening
+    (24, 6, False),   # SS: teeth nearly together
+    (25, 28, False),  # aa: wide open
+    (27, 14, False),  # E: spread, mid open
+    (28, 8, False),   # I: spread, nearly closed
+    (15, 20, False),  # O: rounded
+    (10, 10, False),  # U: small and rounded
+]
+
+# Channel orders a frame can be rendered in
+CHANNEL_ORDERS = ('rgb', 'bgr')
+
 class Renderer:
-    def __init__(self):
-        """Initialize the neural renderer"""
-        self.resolution = (256, 256)
+    def __init__(self, resolution=(256, 256), supersample=1):
+        """
+        Initialize the neural renderer
+        
+        Args:
+            resolution: Output frame size as (width, height)
+            supersample: Draw at this multiple of the resolution and
+                         box-filter down (anti-aliasing for final renders;
+                         1 = draw directly)
+        """
+        self.resolution = tuple(int(v) for v in resolution)
+        self.supersample = int(supersample)
+        if self.supersample < 1:
+            raise ValueError("supersample must be at least 1")
+        # Size of the canvas drawn on and pixels per normalized unit on it
+        self.canvas_size = tuple(v * self.supersample for v in self.resolution)
+        self.scale = min(self.canvas_size) / DESIGN_SIZE
+        # Drawing canvas reused across frames, one per rendering thread
+        self._local = threading.local()
     
-    def render(self, expression, motion):
+    def render(self, expression, motion, viseme=None, out=None, channels='rgb'):
         """
         Render avatar frame from expression and motion parameters
         
         Args:
             expression: Expression features tensor [batch, 64]
             motion: Motion parameters tuple (head_motion [batch, 3], eye_motion [batch, 2])
+            viseme: Optional viseme id; when given, the mouth shape comes from
+                    VISEME_MOUTHS instead of expression[0]
+            out: Optional uint8 buffer [H, W, 3] to write the frame into
+            channels: Channel order of the frame, 'rgb' or 'bgr'
             
         Returns:
-            frame: RGB image as numpy array [H, W, 3]
+            frame: Image as numpy array [H, W, 3] (out, when given)
+        """
+        if channels not in CHANNEL_ORDERS:
+            raise ValueError(f"Unknown channel order '{channels}', choose from {CHANNEL_ORDERS}")
+        
+        expression, head_motion, eye_motion = self.unpack(expression, motion)
+        
+        # Clear the canvas to the skin tone background
+        img = getattr(self._local, 'canvas', None)
+        if img is None:
+            img = self._local.canvas = Image.new('RGB', self.canvas_size)
+        img.paste((240, 220, 200), (0, 0) + self.canvas_size)
+        self.draw(ImageDraw.Draw(img), expression, head_motion, eye_motion, viseme)
+        if self.supersample > 1:
+            img = img.reduce(self.supersample)
+        
+        # Convert to numpy array
+        if out is None:
+            out = np.empty((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        pixels = np.asarray(img)
+        out[...] = pixels if channels == 'rgb' else pixels[..., ::-1]
+        return out
+    
+    def draw(self, draw, expression, head_motion, eye_motion, viseme=None):
         """
+        Draw the face parts of one frame
+        
+        Args:
+            draw: PIL ImageDraw (or an object with its ellipse/arc/line methods)
+            expression: Expression features [64]
+            head_motion: Head motion [3]
+            eye_motion: Eye motion [2]
+            viseme: Optional viseme id (see render)
+        """
+        center_x, center_y, eyes_x, eyes_y, mouth_y = self.anchors(head_motion, eye_motion)
+        self.draw_face(draw, center_x, center_y)
+        self.draw_eyes(draw, eyes_x, eyes_y)
+        self.draw_nose(draw, center_x, center_y)
+        self.draw_mouth(draw, center_x, mouth_y, *self.mouth_shape(expression, viseme))
+        self.draw_eyebrows(draw, eyes_x, eyes_y - self.eyebrow_raise(expression))
+    
+    @staticmethod
+    def unpack(expression, motion):
+        """Expression [64], head motion [3] and eye motion [2] of the frame as numpy arrays"""
         # Convert tensors to numpy
         if torch.is_tensor(expression):
             expression = expression.detach().cpu().numpy()[0]
@@ -31,11 +115,25 @@ class Renderer:
                 motion = motion.detach().cpu().numpy()[0]
             head_motion = motion[:3]
             eye_motion = motion[3:5]
+        return expression, head_motion, eye_motion
+    
+    def px(self, value):
+        """Canvas pixels of a length in normalized units"""
+        return int(round(value * self.scale))
+    
+    def width(self, value):
+        """Canvas line width of a width in normalized units (at least 1 px)"""
+        return max(1, self.px(value))
+    
+    def anchors(self, head_motion, eye_motion):
+        """
+        Canvas positions the face parts are drawn at
         
-        # Create canvas with skin tone background
-        img = Image.new('RGB', self.resolution, color=(240, 220, 200))
-        draw = ImageDraw.Draw(img)
-        
+        Returns:
+            center_x, center_y: Face center with head motion
+            eyes_x, eyes_y: Midpoint between the eyes with eye motion
+            mouth_y: Lip line
+        """
         # Extract motion parameters
         head_yaw = head_motion[1] if len(head_motion) > 1 else 0
         head_pitch = head_motion[0] if len(head_motion) > 0 else 0
@@ -43,74 +141,81 @@ class Renderer:
         eye_y = eye_motion[1] if len(eye_motion) > 1 else 0
         
         # Face center with head motion
-        center_x = 128 + int(head_yaw * 20)
-        center_y = 128 + int(head_pitch * 20)
+        center_x = self.canvas_size[0] // 2 + int(head_yaw * 20 * self.scale)
+        center_y = self.canvas_size[1] // 2 + int(head_pitch * 20 * self.scale)
+        eyes_x = center_x + int(eye_x * 10 * self.scale)
+        eyes_y = center_y - self.px(20) + int(eye_y * 10 * self.scale)
+        return center_x, center_y, eyes_x, eyes_y, center_y + self.px(40)
+    
+    def mouth_shape(self, expression, viseme=None):
+        """
+        Mouth of the frame as (half width, opening below the lip line, closed)
+        in canvas pixels
         
-        # Draw face (circle)
-        face_radius = 80
+        The opening follows expression[0] unless a viseme id is given.
+        """
+        if viseme is not None:
+            half_width, opening, closed = VISEME_MOUTHS[int(viseme)]
+            return self.px(half_width), self.px(opening), closed
+        mouth_open = abs(expression[0]) * 30
+        if mouth_open > 0.3:
+            # Open mouth (talking)
+            return self.px(25), int(mouth_open * self.scale), False
+        # Closed mouth (smile)
+        return self.px(25), self.px(10), True
+    
+    def eyebrow_raise(self, expression):
+        """Eyebrow raise in canvas pixels from expression[1]"""
+        return int(expression[1] * 10 * self.scale) if len(expression) > 1 else 0
+    
+    def draw_face(self, draw, center_x, center_y):
+        """Draw the face (circle) around its center"""
+        face_radius = self.px(80)
         draw.ellipse([
             center_x - face_radius, center_y - face_radius,
             center_x + face_radius, center_y + face_radius
-        ], fill=(255, 220, 180), outline=(200, 160, 120), width=3)
-        
-        # Draw eyes based on eye motion
-        eye_offset_x = int(eye_x * 10)
-        eye_offset_y = int(eye_y * 10)
-        
-        # Left eye
-        left_eye_x = center_x - 30 + eye_offset_x
-        left_eye_y = center_y - 20 + eye_offset_y
-        draw.ellipse([left_eye_x - 10, left_eye_y - 8, 
-                     left_eye_x + 10, left_eye_y + 8], 
-                    fill=(255, 255, 255), outline=(0, 0, 0), width=2)
-        draw.ellipse([left_eye_x - 5, left_eye_y - 5, 
-                     left_eye_x + 5, left_eye_y + 5], 
-                    fill=(50, 50, 200))
-        
-        # Right eye
-        right_eye_x = center_x + 30 + eye_offset_x
-        right_eye_y = center_y - 20 + eye_offset_y
-        draw.ellipse([right_eye_x - 10, right_eye_y - 8, 
-                     right_eye_x + 10, right_eye_y + 8], 
-                    fill=(255, 255, 255), outline=(0, 0, 0), width=2)
-        draw.ellipse([right_eye_x - 5, right_eye_y - 5, 
-                     right_eye_x + 5, right_eye_y + 5], 
-                    fill=(50, 50, 200))
-        
-        # Draw nose
+        ], fill=(255, 220, 180), outline=(200, 160, 120), width=self.width(3))
+    
+    def draw_eyes(self, draw, eyes_x, eyes_y):
+        """Draw both eyes around the midpoint between them"""
+        px = self.px
+        for eye_x in (eyes_x - px(30), eyes_x + px(30)):
+            draw.ellipse([eye_x - px(10), eyes_y - px(8), 
+                         eye_x + px(10), eyes_y + px(8)], 
+                        fill=(255, 255, 255), outline=(0, 0, 0), width=self.width(2))
+            draw.ellipse([eye_x - px(5), eyes_y - px(5), 
+                         eye_x + px(5), eyes_y + px(5)], 
+                        fill=(50, 50, 200))
+    
+    def draw_nose(self, draw, center_x, center_y):
+        """Draw the nose below the face center"""
+        px = self.px
         nose_x = center_x
-        nose_y = center_y + 10
-        draw.ellipse([nose_x - 8, nose_y - 5, 
-                     nose_x + 8, nose_y + 15], 
+        nose_y = center_y + px(10)
+        draw.ellipse([nose_x - px(8), nose_y - px(5), 
+                     nose_x + px(8), nose_y + px(15)], 
                     fill=(220, 180, 140))
-        
-        # Draw mouth with expression-based opening
-        mouth_open = abs(expression[0]) * 30
-        mouth_y = center_y + 40
-        
-        if mouth_open > 0.3:
-            # Open mouth (talking)
-            draw.ellipse([center_x - 25, mouth_y - 10, 
-                         center_x + 25, mouth_y + int(mouth_open)], 
-                        fill=(180, 80, 80), outline=(150, 50, 50), width=2)
+    
+    def draw_mouth(self, draw, center_x, mouth_y, half_width, opening, closed):
+        """Draw a mouth shape (see mouth_shape) on the lip line mouth_y"""
+        top = mouth_y - self.px(10)
+        if closed and opening == 0:
+            # Pressed lips
+            draw.line([center_x - half_width, mouth_y, center_x + half_width, mouth_y],
+                      fill=(150, 50, 50), width=self.width(3))
+        elif closed:
+            draw.arc([center_x - half_width, top, 
+                     center_x + half_width, mouth_y + opening], 
+                    start=0, end=180, fill=(150, 50, 50), width=self.width(3))
         else:
-            # Closed mouth (smile)
-            draw.arc([center_x - 25, mouth_y - 10, 
-                     center_x + 25, mouth_y + 10], 
-                    start=0, end=180, fill=(150, 50, 50), width=3)
-        
-        # Draw eyebrows with expression
-        eyebrow_raise = expression[1] * 10 if len(expression) > 1 else 0
-        
-        # Left eyebrow
-        draw.arc([left_eye_x - 15, left_eye_y - 20 - int(eyebrow_raise), 
-                 left_eye_x + 15, left_eye_y - 10 - int(eyebrow_raise)], 
-                start=0, end=180, fill=(100, 70, 50), width=3)
-        
-        # Right eyebrow
-        draw.arc([right_eye_x - 15, right_eye_y - 20 - int(eyebrow_raise), 
-                 right_eye_x + 15, right_eye_y - 10 - int(eyebrow_raise)], 
-                start=0, end=180, fill=(100, 70, 50), width=3)
-        
-        # Convert to numpy array
-        return np.array(img)
+            draw.ellipse([center_x - half_width, top, 
+                         center_x + half_width, mouth_y + opening], 
+                        fill=(180, 80, 80), outline=(150, 50, 50), width=self.width(2))
+    
+    def draw_eyebrows(self, draw, eyes_x, eyes_y):
+        """Draw both eyebrows above eyes at eyes_y (already shifted by the raise)"""
+        px = self.px
+        for eye_x in (eyes_x - px(30), eyes_x + px(30)):
+            draw.arc([eye_x - px(15), eyes_y - px(20), 
+                     eye_x + px(15), eyes_y - px(10)], 
+                    start=0, end=180, fill=(100, 70, 50), width=self.width(3))
@@ -0,0 +1,218 @@
+"""
+Sprite atlas backend for the avatar renderer
+
+Every part of the face only moves with the motion parameters except the
+mouth, whose shape follows expression[0] (or the viseme), and the eyebrows,
+whose height follows expression[1]. SpriteRenderer draws each part once at
+startup with Renderer's own drawing code (head, eyes, eyebrows, one mouth
+per viseme and per quantized opening) and renders a frame by filling the
+background and blitting a handful of tiles at offsets computed from the
+parameters, instead of rasterizing shapes. Tiles whose underlay is known
+(the head always sits on the background, the eyes and mouth on the face
+skin while they are inside it) are stored with it composited in and copied
+as plain slices; only the eyebrows, which can overlap the eyes, are blitted
+through their alpha mask.
+
+The open mouth opening (0-30 normalized units for |expression[0]| <= 1) is
+quantized to ``mouth_bins`` levels; with one bin per opening pixel (31 at
+256x256) every opening has its own sprite and frames equal direct drawing
+exactly. ``atlas_error`` reports the error of coarser atlases. Sprites are
+drawn without anti-aliasing, so the atlas suits previews and real-time use
+rather than supersampled final renders.
+"""
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .model import CHANNEL_ORDERS, VISEME_MOUTHS, Renderer
+
+MAX_OPENING = 30  # Opening of the mouth drawn for |expression[0]| = 1 (normalized units)
+BACKGROUND = (240, 220, 200)
+SKIN = (255, 220, 180)
+
+
+class SpriteRenderer:
+    """Renderer backend compositing precomputed part sprites"""
+
+    def __init__(self, resolution=(256, 256), mouth_bins: int = None):
+        """
+        Draw the sprite atlas
+
+        Args:
+            resolution: Output frame size as (width, height)
+            mouth_bins: Number of open-mouth sprites spread over the opening
+                        range (None = one per pixel of opening, i.e. exact)
+        """
+        self.base = Renderer(resolution)
+        self.resolution = self.base.resolution
+        # Largest opening in pixels and the radius around the face center
+        # inside which the face is plain skin (inside its outline, with a
+        # pixel of margin)
+        self.max_opening = int(MAX_OPENING * self.base.scale)
+        self.skin_radius = self.base.px(80) - self.base.width(3) - 1
+        self.mouth_bins = mouth_bins or self.max_opening + 1
+        if self.mouth_bins < 2:
+            raise ValueError("The sprite atlas needs at least 2 mouth bins")
+        # Whole background frames: copying one is far faster than broadcasting a color
+        width, height = self.resolution
+        self._background = {
+            'rgb': np.full((height, width, 3), BACKGROUND, dtype=np.uint8),
+            'bgr': np.full((height, width, 3), BACKGROUND[::-1], dtype=np.uint8),
+        }
+
+        # Part -> sprite; mouths keyed by their (half width, opening, closed) shape
+        self.sprites = {
+            'head': self._sprite(self._draw_head, BACKGROUND),
+            'eyes': self._sprite(self.base.draw_eyes, SKIN),
+            'eyebrows': self._sprite(self.base.draw_eyebrows),
+        }
+        self.mouths = {}
+        shapes = {self.base.mouth_shape(None, viseme) for viseme in range(len(VISEME_MOUTHS))}
+        shapes.add(self.base.mouth_shape([0.0]))
+        half_width = self.base.px(25)
+        shapes |= {(half_width, self._opening_level(opening), False)
+                   for opening in range(self.max_opening + 1)}
+        for shape in shapes:
+            self.mouths[shape] = self._sprite(
+                lambda draw, x, y, shape=shape: self.base.draw_mouth(draw, x, y, *shape), SKIN)
+
+    def _draw_head(self, draw, center_x, center_y):
+        """Face and nose, the parts that only move with the head"""
+        self.base.draw_face(draw, center_x, center_y)
+        self.base.draw_nose(draw, center_x, center_y)
+
+    def _sprite(self, draw_part, underlay=None):
+        """
+        Draw one part on a transparent canvas and crop it
+
+        Args:
+            draw_part: Callable draw_part(draw, x, y) drawing the part at (x, y)
+            underlay: Color the part is usually drawn over; also stored
+                      composited onto it, for copying without the mask
+
+        Returns:
+            sprite: Dict of the channel orders' pixels [h, w, 3] (and
+                    'opaque_rgb' / 'opaque_bgr' over the underlay), the drawn
+                    pixel mask [h, w, 3] and the (x, y) offset of the crop
+                    from the point the part is drawn at
+        """
+        # Drawn at the middle of a canvas twice the frame size, so no part is clipped
+        anchor_x, anchor_y = self.resolution
+        canvas = Image.new('RGBA', (2 * anchor_x, 2 * anchor_y), (0, 0, 0, 0))
+        draw_part(ImageDraw.Draw(canvas), anchor_x, anchor_y)
+        left, top, right, bottom = canvas.getbbox()
+        pixels = np.asarray(canvas)[top:bottom, left:right]
+        rgb = np.ascontiguousarray(pixels[..., :3])
+        # Drawn without anti-aliasing, so alpha is either 0 or 255
+        mask = np.repeat(pixels[..., 3:] > 0, 3, axis=2)
+        sprite = {
+            'rgb': rgb,
+            'bgr': np.ascontiguousarray(rgb[..., ::-1]),
+            'mask': mask,
+            'offset': (left - anchor_x, top - anchor_y),
+        }
+        if underlay is not None:
+            opaque = np.where(mask, rgb, np.array(underlay, dtype=np.uint8))
+            sprite['opaque_rgb'] = opaque
+            sprite['opaque_bgr'] = np.ascontiguousarray(opaque[..., ::-1])
+        return sprite
+
+    def _opening_level(self, opening):
+        """Open-mouth opening (px) snapped to the nearest of the atlas levels"""
+        step = self.max_opening / (self.mouth_bins - 1)
+        return int(round(min(opening, self.max_opening) / step) * step)
+
+    @staticmethod
+    def _blit(out, sprite, x, y, channels, opaque=False):
+        """
+        Copy a sprite to out with its offset from (x, y)
+
+        With opaque=True the whole tile composited over its underlay is
+        copied; otherwise only the drawn pixels are.
+        """
+        height, width = sprite['mask'].shape[:2]
+        x0, y0 = x + sprite['offset'][0], y + sprite['offset'][1]
+        # Clip to the frame
+        left, top = max(x0, 0), max(y0, 0)
+        right, bottom = min(x0 + width, out.shape[1]), min(y0 + height, out.shape[0])
+        if left >= right or top >= bottom:
+            return
+        region = (slice(top - y0, bottom - y0), slice(left - x0, right - x0))
+        if opaque:
+            out[top:bottom, left:right] = sprite['opaque_' + channels][region]
+        else:
+            np.copyto(out[top:bottom, left:right], sprite[channels][region],
+                      where=sprite['mask'][region])
+
+    def _on_skin(self, sprite, x, y, center_x, center_y):
+        """Whether the sprite's tile drawn at (x, y) lies entirely on the face skin"""
+        height, width = sprite['mask'].shape[:2]
+        left = x + sprite['offset'][0] - center_x
+        top = y + sprite['offset'][1] - center_y
+        # Farthest tile corner from the face center
+        dx = max(abs(left), abs(left + width - 1))
+        dy = max(abs(top), abs(top + height - 1))
+        return dx * dx + dy * dy < self.skin_radius * self.skin_radius
+
+    def render(self, expression, motion, viseme=None, out=None, channels='rgb'):
+        """
+        Render avatar frame from expression and motion parameters
+
+        Args:
+            expression: Expression features tensor [batch, 64]
+            motion: Motion parameters tuple (head_motion [batch, 3], eye_motion [batch, 2])
+            viseme: Optional viseme id; when given, the mouth shape comes from
+                    VISEME_MOUTHS instead of expression[0]
+            out: Optional uint8 buffer [H, W, 3] to write the frame into
+            channels: Channel order of the frame, 'rgb' or 'bgr'
+
+        Returns:
+            frame: Image as numpy array [H, W, 3] (out, when given)
+        """
+        if channels not in CHANNEL_ORDERS:
+            raise ValueError(f"Unknown channel order '{channels}', choose from {CHANNEL_ORDERS}")
+        expression, head_motion, eye_motion = Renderer.unpack(expression, motion)
+        if out is None:
+            out = np.empty((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        np.copyto(out, self._background[channels])
+
+        center_x, center_y, eyes_x, eyes_y, mouth_y = self.base.anchors(head_motion, eye_motion)
+        half_width, opening, closed = self.base.mouth_shape(expression, viseme)
+        if viseme is None and not closed:
+            opening = self._opening_level(opening)
+
+        eyes = self.sprites['eyes']
+        mouth = self.mouths[(half_width, opening, closed)]
+        self._blit(out, self.sprites['head'], center_x, center_y, channels, opaque=True)
+        self._blit(out, eyes, eyes_x, eyes_y, channels,
+                   opaque=self._on_skin(eyes, eyes_x, eyes_y, center_x, center_y))
+        self._blit(out, mouth, center_x, mouth_y, channels,
+                   opaque=self._on_skin(mouth, center_x, mouth_y, center_x, center_y))
+        self._blit(out, self.sprites['eyebrows'], eyes_x,
+                   eyes_y - self.base.eyebrow_raise(expression), channels)
+        return out
+
+    def atlas_error(self):
+        """
+        Error of the atlas against direct drawing over the mouth range
+
+        Renders every distinct opening (and closed mouth) with both renderers.
+
+        Returns:
+            error: Dict with max_opening (largest opening snap, px),
+                   max_pixels (most differing pixels in one frame) and
+                   max_abs (largest per-channel difference, 0-255)
+        """
+        error = {'max_opening': 0, 'max_pixels': 0, 'max_abs': 0}
+        motion = (np.zeros(3, dtype=np.float32), np.zeros(2, dtype=np.float32))
+        # Centers of the expression[0] ranges drawn with each opening, and closed
+        for opening in [-1] + list(range(self.max_opening + 1)):
+            expression = np.zeros(64, dtype=np.float32)
+            expression[0] = 0 if opening < 0 else min((opening + 0.5) / (MAX_OPENING * self.base.scale), 1.0)
+            direct = self.base.render(expression, motion).astype(np.int16)
+            diff = np.abs(direct - self.render(expression, motion))
+            if opening >= 0:
+                snapped = self._opening_level(opening)
+                error['max_opening'] = max(error['max_opening'], abs(snapped - opening))
+            error['max_pixels'] = max(error['max_pixels'], int(diff.any(axis=2).sum()))
+            error['max_abs'] = max(error['max_abs'], int(diff.max()))
+        return error
@@ -2,6 +2,10 @@ import torch
 import torch.nn as nn
 import numpy as np
 
+# Input samples between consecutive conv3 outputs, and samples each one sees
+CONV_STRIDE = 5 * 4 * 2
+RECEPTIVE_FIELD = 10 + (8 - 1) * 5 + (4 - 1) * 5 * 4
+
 class SpeechEncoder(nn.Module):
     """Speech encoder using wav2vec2 architecture (simplified)"""
     
@@ -25,6 +29,27 @@ class SpeechEncoder(nn.Module):
         Returns:
             features: Encoded features [batch_size, 256]
         """
+        x = self.conv_features(audio)
+        
+        # Global average pooling
+        x = torch.mean(x, dim=2)
+        
+        # Fully connected layer
+        x = self.dropout(self.fc(x))
+        
+        return x
+    
+    def conv_features(self, audio):
+        """
+        Run the convolutional stack
+        
+        Args:
+            audio: Input audio tensor [batch_size, samples]
+            
+        Returns:
+            activations: conv3 activations [batch_size, 128, positions], one
+                         position every CONV_STRIDE samples
+        """
         # Reshape for conv1d: [batch, channels, samples]
         x = audio.unsqueeze(1)
         
@@ -32,11 +57,45 @@ class SpeechEncoder(nn.Module):
         x = self.relu(self.conv1(x))
         x = self.relu(self.conv2(x))
         x = self.relu(self.conv3(x))
+        return x
+    
+    def encode_windows(self, audio, starts, window=16000):
+        """
+        Encode many overlapping windows of one clip with a single conv pass
         
-        # Global average pooling
-        x = torch.mean(x, dim=2)
+        The conv stack runs once over the span covering all windows; each
+        window's average pool is then a difference of a cumulative sum over
+        the conv3 activations, and fc runs once on the whole batch. This
+        replaces len(starts) forward passes over mostly the same samples.
         
-        # Fully connected layer
-        x = self.dropout(self.fc(x))
+        Activations are computed on a grid of CONV_STRIDE samples anchored at
+        audio[0], and each window pools the positions starting at the grid
+        point nearest to its start. When every start is a multiple of
+        CONV_STRIDE (e.g. 640-sample hops, 25 fps at 16 kHz) the result equals
+        forward() on the individual windows up to float rounding; otherwise a
+        window is effectively shifted by at most CONV_STRIDE / 2 samples
+        (1.25 ms), a small deviation at the window boundaries.
         
-        return x
+        Args:
+            audio: Clip tensor [samples], zero-padded so that every window
+                   (plus CONV_STRIDE) lies inside it
+            starts: Window start samples (ascending ints)
+            window: Window length in samples
+            
+        Returns:
+            features: Encoded features [len(starts), 256]
+        """
+        starts = torch.as_tensor(starts, dtype=torch.long)
+        positions = (window - RECEPTIVE_FIELD) // CONV_STRIDE + 1
+        
+        # Conv over the grid-aligned span covering all windows
+        offset = int(starts[0]) // CONV_STRIDE
+        first = torch.div(starts + CONV_STRIDE // 2, CONV_STRIDE, rounding_mode='floor') - offset
+        end = offset * CONV_STRIDE + (int(first[-1]) + positions - 1) * CONV_STRIDE + RECEPTIVE_FIELD
+        x = self.conv_features(audio[offset * CONV_STRIDE:end].unsqueeze(0))[0]
+        
+        # Window means from a float64 prefix sum over positions
+        cumsum = torch.nn.functional.pad(torch.cumsum(x.double(), dim=1), (1, 0))
+        pooled = (cumsum[:, first + positions] - cumsum[:, first]) / positions
+        
+        return self.dropout(self.fc(pooled.t().float()))
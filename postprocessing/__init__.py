@@ -0,0 +1,4 @@
+from .video_writer import open_video_writer, ffmpeg_available, FFmpegVideoWriter, OpenCVVideoWriter
+from .frame_pool import FramePool
+from .frame_delta import DeltaEncoder, DeltaDecoder
+from .image_writer import ImageEncoder, ImageSequenceWriter
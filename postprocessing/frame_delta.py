@@ -0,0 +1,183 @@
+"""
+Dirty-rectangle delta encoding of rendered frames for live viewers
+
+Between consecutive frames only the face moves, and often only the mouth.
+DeltaEncoder compares each frame with the last one it sent, finds the
+changed bounding boxes with vectorized NumPy and emits only those patches,
+with a full keyframe every ``keyframe_interval`` frames (and on request, e.g.
+when a viewer joins) so clients can start or resync. Patches are lossless, so
+the decoder's frame always equals the encoder's.
+
+Message format (little endian)::
+
+    header  u8 version, u8 type (0 = keyframe, 1 = delta), u32 frame index,
+            u16 width, u16 height, u16 rect count
+    rect    u16 x, u16 y, u16 w, u16 h, then w * h * 3 RGB bytes, row major
+
+A keyframe is one rect covering the whole frame; a delta with no rects means
+the frame is unchanged. DeltaDecoder is the reference decoder (the browser
+one is demo/delta_decoder.js).
+"""
+import struct
+
+import numpy as np
+
+FORMAT_VERSION = 1
+KEYFRAME = 0
+DELTA = 1
+
+HEADER = struct.Struct('<BBIHHH')
+RECT = struct.Struct('<HHHH')
+
+
+class DeltaEncoder:
+    """Encodes RGB frames as keyframes and dirty-rectangle deltas"""
+
+    def __init__(self, keyframe_interval: int = 60, merge_gap: int = 8):
+        """
+        Initialize the encoder
+
+        Args:
+            keyframe_interval: Frames between keyframes (60 = every 2 s at 30 fps)
+            merge_gap: Changed row bands closer than this many rows are sent
+                       as one rect (fewer rect headers, slightly more pixels)
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.keyframe_interval = keyframe_interval
+        self.merge_gap = merge_gap
+        self._reference = None
+        self._index = 0
+        self._since_keyframe = 0
+        self._force_keyframe = True
+        self._stats = {'frames': 0, 'keyframes': 0, 'bytes': 0, 'raw_bytes': 0}
+
+    def request_keyframe(self):
+        """Make the next message a keyframe (e.g. for a viewer that just joined)"""
+        self._force_keyframe = True
+
+    def changed_rects(self, frame: np.ndarray) -> list:
+        """
+        Bounding boxes of the pixels that differ from the last sent frame
+
+        Changed rows are grouped into bands (split where more than merge_gap
+        unchanged rows separate them) and each band is cropped to its
+        changed columns.
+
+        Args:
+            frame: RGB frame [H, W, 3] with the reference frame's shape
+
+        Returns:
+            rects: List of (x, y, w, h)
+        """
+        # Reduced over rows of bytes: reducing the 3-channel axis first is ~50x slower
+        height, width = frame.shape[:2]
+        changed = (frame != self._reference).reshape(height, width * 3)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(rows) > self.merge_gap)
+        tops = rows[np.concatenate(([0], breaks + 1))]
+        bottoms = rows[np.concatenate((breaks, [len(rows) - 1]))]
+        rects = []
+        for top, bottom in zip(tops, bottoms):
+            cols = np.flatnonzero(changed[top:bottom + 1].any(axis=0)) // 3
+            rects.append((int(cols[0]), int(top), int(cols[-1] - cols[0] + 1), int(bottom - top + 1)))
+        return rects
+
+    def encode(self, frame: np.ndarray) -> bytearray:
+        """
+        Encode the next frame
+
+        The frame is copied into the encoder's reference, so pooled frame
+        buffers can be reused as soon as this returns.
+
+        Args:
+            frame: RGB uint8 frame [H, W, 3] (at most 65535 pixels a side)
+
+        Returns:
+            message: Binary message (see the module docstring)
+        """
+        height, width = frame.shape[:2]
+        keyframe = (self._force_keyframe or self._reference is None
+                    or self._reference.shape != frame.shape
+                    or self._since_keyframe >= self.keyframe_interval)
+        if not keyframe:
+            rects = self.changed_rects(frame)
+            # A delta covering most of the frame costs more than a keyframe
+            keyframe = sum(w * h for _, _, w, h in rects) * 3 + len(rects) * RECT.size \
+                >= width * height * 3 + RECT.size
+        if keyframe:
+            rects = [(0, 0, width, height)]
+            if self._reference is None or self._reference.shape != frame.shape:
+                self._reference = np.empty_like(frame)
+            self._force_keyframe = False
+            self._since_keyframe = 0
+            self._stats['keyframes'] += 1
+
+        size = HEADER.size + sum(RECT.size + w * h * 3 for _, _, w, h in rects)
+        message = bytearray(size)
+        HEADER.pack_into(message, 0, FORMAT_VERSION, KEYFRAME if keyframe else DELTA,
+                         self._index, width, height, len(rects))
+        offset = HEADER.size
+        for x, y, w, h in rects:
+            RECT.pack_into(message, offset, x, y, w, h)
+            offset += RECT.size
+            patch = np.frombuffer(message, dtype=np.uint8, count=w * h * 3, offset=offset)
+            patch.reshape(h, w, 3)[:] = frame[y:y + h, x:x + w]
+            offset += w * h * 3
+        np.copyto(self._reference, frame)
+
+        self._index += 1
+        self._since_keyframe += 1
+        self._stats['frames'] += 1
+        self._stats['bytes'] += size
+        self._stats['raw_bytes'] += frame.nbytes
+        return message
+
+    def stats(self) -> dict:
+        """Frames and keyframes sent, bytes sent and full-frame bytes, and their ratio"""
+        stats = dict(self._stats)
+        stats['ratio'] = stats['bytes'] / stats['raw_bytes'] if stats['raw_bytes'] else 1.0
+        return stats
+
+
+class DeltaDecoder:
+    """Reference decoder rebuilding frames from DeltaEncoder messages"""
+
+    def __init__(self):
+        self.frame = None
+        self.index = None
+
+    def decode(self, message) -> np.ndarray:
+        """
+        Apply one message
+
+        Args:
+            message: Binary message from DeltaEncoder.encode
+
+        Returns:
+            frame: The current RGB frame [H, W, 3]; updated in place by later
+                   messages, so copy it to keep it
+        """
+        version, kind, index, width, height, count = HEADER.unpack_from(message, 0)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported frame delta version {version}")
+        if kind == KEYFRAME:
+            if self.frame is None or self.frame.shape != (height, width, 3):
+                self.frame = np.empty((height, width, 3), dtype=np.uint8)
+        elif self.frame is None:
+            raise ValueError("Delta received before any keyframe")
+        elif self.frame.shape != (height, width, 3):
+            raise ValueError(f"Delta for a {width}x{height} frame after a "
+                             f"{self.frame.shape[1]}x{self.frame.shape[0]} keyframe")
+
+        offset = HEADER.size
+        for _ in range(count):
+            x, y, w, h = RECT.unpack_from(message, offset)
+            offset += RECT.size
+            patch = np.frombuffer(message, dtype=np.uint8, count=w * h * 3, offset=offset)
+            self.frame[y:y + h, x:x + w] = patch.reshape(h, w, 3)
+            offset += w * h * 3
+        self.index = index
+        return self.frame
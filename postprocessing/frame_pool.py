@@ -0,0 +1,40 @@
+"""
+Ring buffer of preallocated video frames
+
+The renderer draws each frame into the next slot of a FramePool and the video
+writer consumes that same buffer, so a steady-state render loop makes no
+frame-sized allocations. A slot is handed out again after ``len(pool)`` frames;
+whoever hands out frames must keep fewer than that many in use at once (see
+realtime_pipeline.render_parameters).
+"""
+import numpy as np
+
+
+class FramePool:
+    """Fixed set of uint8 frame buffers handed out in rotation"""
+
+    def __init__(self, shape: tuple, size: int = 4):
+        """
+        Allocate the pool
+
+        Args:
+            shape: Frame shape (height, width, 3)
+            size: Number of frames in the ring
+        """
+        if size < 1:
+            raise ValueError("FramePool needs at least one frame")
+        self.frames = np.zeros((size,) + tuple(shape), dtype=np.uint8)
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def shape(self) -> tuple:
+        return self.frames.shape[1:]
+
+    def next(self) -> np.ndarray:
+        """Return the next buffer in the ring (its previous contents are dropped)"""
+        frame = self.frames[self._next]
+        self._next = (self._next + 1) % len(self.frames)
+        return frame
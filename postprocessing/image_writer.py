@@ -0,0 +1,194 @@
+"""
+Parallel JPEG/PNG encoding of rendered frames
+
+Once rendering runs on a thread pool, encoding every frame on the main thread
+caps throughput. ImageEncoder runs cv2.imencode, which releases the GIL, on a
+thread pool with a bounded number of frames in flight, and keeps results in
+submission order (e.g. for MJPEG parts). ImageSequenceWriter writes the
+encoded frames to numbered files behind the same interface as the video
+writers, so open_video_writer(backend='images') plugs it into any render loop.
+
+Submitted frames are copied (and converted from RGB, in the same pass) into
+the encoder's own ring of buffers, so pooled render buffers can be reused as
+soon as submit returns.
+"""
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .frame_pool import FramePool
+
+# File extension -> image format
+IMAGE_EXTENSIONS = {'.jpg': 'jpg', '.jpeg': 'jpg', '.png': 'png'}
+# JPEG quality (0-100) and PNG compression level (0-9) used when none is given
+DEFAULT_QUALITY = {'jpg': 90, 'png': 3}
+
+
+def image_format(path: str) -> str:
+    """Image format ('jpg' or 'png') of a file path, from its extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported image extension '{ext}', use one of {sorted(IMAGE_EXTENSIONS)}")
+    return IMAGE_EXTENSIONS[ext]
+
+
+class ImageEncoder:
+    """Thread pool encoding frames with cv2.imencode"""
+
+    def __init__(self, fmt: str = 'png', quality: int = None, threads: int = 0,
+                 max_in_flight: int = None, channels: str = 'bgr'):
+        """
+        Start the encoder threads
+
+        Args:
+            fmt: 'jpg' or 'png'
+            quality: JPEG quality 0-100 or PNG compression level 0-9
+                     (None = DEFAULT_QUALITY)
+            threads: Encoder threads (0 = one per CPU)
+            max_in_flight: Most frames queued or encoding at once; submit
+                           blocks beyond that (None = 2 * threads)
+            channels: Channel order of the submitted frames, 'rgb' or 'bgr' (native)
+        """
+        if fmt not in DEFAULT_QUALITY:
+            raise ValueError(f"Unknown image format '{fmt}', choose from {sorted(DEFAULT_QUALITY)}")
+        if channels not in ('rgb', 'bgr'):
+            raise ValueError(f"Unknown channel order '{channels}'")
+        quality = DEFAULT_QUALITY[fmt] if quality is None else quality
+        if fmt == 'jpg':
+            self._params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        else:
+            self._params = [cv2.IMWRITE_PNG_COMPRESSION, int(quality)]
+        self.fmt = fmt
+        self.channels = channels
+        self.threads = threads or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.threads
+        self._executor = ThreadPoolExecutor(self.threads)
+        self._pending = deque()
+        self._pool = None
+
+    def _encode(self, frame, path):
+        ok, data = cv2.imencode('.' + self.fmt, frame, self._params)
+        if not ok:
+            raise RuntimeError(f"cv2.imencode failed to encode a {self.fmt} frame")
+        if path is not None:
+            data.tofile(path)
+        return data
+
+    def submit(self, frame: np.ndarray, path: str = None):
+        """
+        Queue one uint8 frame [H, W, 3] for encoding
+
+        Blocks while max_in_flight frames are pending, and raises the error
+        of any pending frame it waits for.
+
+        Args:
+            frame: Frame in the encoder's channel order
+            path: Also write the encoded image to this file
+
+        Returns:
+            future: concurrent.futures.Future of the encoded bytes (uint8 array)
+        """
+        while len(self._pending) >= self.max_in_flight:
+            self._pending.popleft().result()
+        # The slot handed out was used max_in_flight frames ago, which is done
+        if self._pool is None or self._pool.shape != frame.shape:
+            self._pool = FramePool(frame.shape, self.max_in_flight)
+        slot = self._pool.next()
+        if self.channels == 'rgb':
+            cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=slot)
+        else:
+            np.copyto(slot, frame)
+        future = self._executor.submit(self._encode, slot, path)
+        self._pending.append(future)
+        return future
+
+    def encode(self, frame: np.ndarray) -> np.ndarray:
+        """Encode one frame and wait for it"""
+        return self.submit(frame).result()
+
+    def encode_frames(self, frames):
+        """
+        Encode a frame iterator in parallel
+
+        Yields:
+            data: Encoded image bytes (uint8 array) of each frame, in order
+        """
+        futures = deque()
+        for frame in frames:
+            futures.append(self.submit(frame))
+            while futures[0].done():
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+    def wait(self):
+        """Wait for every submitted frame; raises the first encoding error"""
+        while self._pending:
+            self._pending.popleft().result()
+
+    def close(self):
+        """Finish the pending frames and stop the threads"""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ImageSequenceWriter:
+    """Writes frames as numbered JPEG/PNG files, encoded on a thread pool"""
+
+    def __init__(self, output_path: str, size: tuple = None, quality: int = None,
+                 threads: int = 0, max_in_flight: int = None, channels: str = 'bgr'):
+        """
+        Create the output directory and start the encoder
+
+        Args:
+            output_path: printf-style file pattern such as 'frames/%06d.jpg',
+                         or a directory to write frame_000000.png, ... into
+            size: Expected frame size as (width, height) (None = any)
+            quality: JPEG quality 0-100 or PNG compression level 0-9
+            threads: Encoder threads (0 = one per CPU)
+            max_in_flight: Most frames encoding at once (None = 2 * threads)
+            channels: Channel order of the frames, 'rgb' or 'bgr' (native)
+        """
+        if '%' not in output_path:
+            output_path = os.path.join(output_path, 'frame_%06d.png')
+        self.pattern = output_path
+        self.size = None if size is None else tuple(size)
+        self.count = 0
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        self._encoder = ImageEncoder(image_format(output_path), quality, threads,
+                                     max_in_flight, channels)
+        self.channels = channels
+
+    def isOpened(self) -> bool:
+        return self._encoder is not None
+
+    def write(self, frame: np.ndarray):
+        """Queue one uint8 frame [H, W, 3] to be encoded to the next file"""
+        if self.size is not None and frame.shape[1::-1] != self.size:
+            raise ValueError(f"Frame size {frame.shape[1::-1]} does not match writer size {self.size}")
+        self._encoder.submit(frame, self.pattern % self.count)
+        self.count += 1
+
+    def release(self):
+        """Wait for every frame to be written; raises the first encoding error"""
+        if self._encoder is None:
+            return
+        encoder, self._encoder = self._encoder, None
+        encoder.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
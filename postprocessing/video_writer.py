@@ -0,0 +1,256 @@
+"""
+Video writer backends for rendered avatar frames
+
+FFmpegVideoWriter pipes raw frames into a single ffmpeg process over stdin
+and muxes the audio track in the same pass, so no silent temporary video is
+written and re-read. OpenCVVideoWriter is the fallback when ffmpeg is absent
+(silent output only). Both take uint8 frames [H, W, 3] in the channel order
+they are opened with; frames in the writer's native order (``channels``
+attribute) are written without any conversion copy. The 'images' backend
+(postprocessing.image_writer.ImageSequenceWriter) writes numbered JPEG/PNG
+files instead.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from .image_writer import IMAGE_EXTENSIONS, ImageSequenceWriter
+
+# libx264 encoder settings selectable by name
+ENCODER_PRESETS = {
+    'realtime': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 23},
+    'fast': {'codec': 'libx264', 'preset': 'veryfast', 'crf': 23},
+    'balanced': {'codec': 'libx264', 'preset': 'medium', 'crf': 20},
+    'quality': {'codec': 'libx264', 'preset': 'slow', 'crf': 18},
+}
+
+# cv2 FourCC codes tried in order of compatibility
+OPENCV_CODECS = [
+    ('avc1', 'H.264 (best compatibility)'),
+    ('XVID', 'Xvid'),
+    ('MJPG', 'Motion JPEG'),
+    ('mp4v', 'MPEG-4')
+]
+
+
+# Channel order each backend consumes without converting
+NATIVE_CHANNELS = {'ffmpeg': 'rgb', 'opencv': 'bgr', 'images': 'bgr'}
+
+
+def ffmpeg_available() -> bool:
+    """Check whether an ffmpeg executable is on PATH"""
+    return shutil.which('ffmpeg') is not None
+
+
+class FFmpegVideoWriter:
+    """Streams frames to an ffmpeg subprocess, optionally muxing audio"""
+
+    def __init__(self, output_path: str, fps: float, size: tuple, audio_path: str = None,
+                 preset='fast', threads: int = 0, channels: str = 'rgb'):
+        """
+        Start the ffmpeg encoder process
+
+        Args:
+            output_path: Path to output video file
+            fps: Frames per second
+            size: Frame size as (width, height)
+            audio_path: Audio file muxed into the output (None = silent video)
+            preset: Name from ENCODER_PRESETS or a dict with codec/preset/crf
+            threads: Encoder threads (0 = let ffmpeg decide)
+            channels: Channel order of the frames, 'rgb' or 'bgr'
+        """
+        if channels not in ('rgb', 'bgr'):
+            raise ValueError(f"Unknown channel order '{channels}'")
+        if isinstance(preset, str):
+            if preset not in ENCODER_PRESETS:
+                raise ValueError(f"Unknown encoder preset '{preset}', "
+                                 f"choose from {sorted(ENCODER_PRESETS)}")
+            preset = ENCODER_PRESETS[preset]
+
+        self.output_path = output_path
+        self.size = tuple(size)
+        self.channels = channels
+        width, height = self.size
+
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', f'{channels}24',
+            '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-',
+        ]
+        if audio_path:
+            cmd += ['-i', audio_path]
+        cmd += ['-map', '0:v:0']
+        if audio_path:
+            cmd += ['-map', '1:a:0', '-c:a', 'aac', '-shortest']
+        cmd += [
+            '-c:v', preset['codec'],
+            '-preset', preset['preset'],
+            '-crf', str(preset['crf']),
+            # yuv420p needs even dimensions; pad odd sizes by one pixel
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-pix_fmt', 'yuv420p',
+            '-threads', str(threads),
+            '-movflags', '+faststart',
+            output_path
+        ]
+
+        # stderr goes to a file so a chatty encoder can never block the pipe
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def write(self, frame: np.ndarray):
+        """Write one uint8 frame [H, W, 3]"""
+        if frame.shape[1::-1] != self.size:
+            raise ValueError(f"Frame size {frame.shape[1::-1]} does not match writer size {self.size}")
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        except BrokenPipeError:
+            self.release()
+
+    def release(self):
+        """Finish encoding; raises RuntimeError if ffmpeg failed"""
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = proc.wait()
+
+        self._stderr.seek(0)
+        message = self._stderr.read().decode(errors='replace').strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed writing {self.output_path}: {message}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class OpenCVVideoWriter:
+    """cv2.VideoWriter fallback (no audio track)"""
+
+    def __init__(self, output_path: str, fps: float, size: tuple, codec: str = None,
+                 verbose: bool = True, channels: str = 'rgb'):
+        """
+        Open a cv2.VideoWriter, probing codecs unless one is given explicitly
+
+        Args:
+            output_path: Path to output video file
+            fps: Frames per second
+            size: Frame size as (width, height)
+            codec: FourCC code to use (None = try OPENCV_CODECS in order)
+            verbose: Print the codec that was picked
+            channels: Channel order of the frames, 'rgb' or 'bgr' (native;
+                      RGB frames are converted into a reused buffer)
+        """
+        if channels not in ('rgb', 'bgr'):
+            raise ValueError(f"Unknown channel order '{channels}'")
+        self.channels = channels
+        self._bgr = None
+        codecs = [(codec, codec)] if codec is not None else OPENCV_CODECS
+
+        self._out = None
+        for fourcc_code, name in codecs:
+            try:
+                fourcc = cv2.VideoWriter_fourcc(*fourcc_code)
+                out = cv2.VideoWriter(output_path, fourcc, fps, tuple(size))
+            except cv2.error:
+                continue
+            if out.isOpened():
+                self._out = out
+                if verbose:
+                    print(f"Using codec: {name}")
+                break
+
+        if self._out is None:
+            raise RuntimeError(f"Failed to create video writer for {output_path}")
+
+    def isOpened(self) -> bool:
+        return self._out is not None and self._out.isOpened()
+
+    def write(self, frame: np.ndarray):
+        """Write one uint8 frame [H, W, 3]"""
+        if self.channels == 'rgb':
+            if self._bgr is None or self._bgr.shape != frame.shape:
+                self._bgr = np.empty_like(frame)
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=self._bgr)
+        self._out.write(frame)
+
+    def release(self):
+        if self._out is not None:
+            self._out.release()
+            self._out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def open_video_writer(output_path: str, fps: float, size: tuple, audio_path: str = None,
+                      backend: str = 'auto', preset='fast', threads: int = 0,
+                      codec: str = None, verbose: bool = True, channels: str = 'rgb',
+                      quality: int = None):
+    """
+    Open the best available video writer
+
+    Args:
+        output_path: Path to output video file (for the images backend a
+                     pattern such as 'frames/%06d.jpg', or a directory)
+        fps: Frames per second
+        size: Frame size as (width, height)
+        audio_path: Audio file to mux in (ffmpeg backend only)
+        backend: 'ffmpeg', 'opencv', 'images' or 'auto' (images for a .jpg/.png
+                 output path, else ffmpeg when installed, unless an OpenCV
+                 FourCC codec is requested explicitly)
+        preset: Encoder preset for the ffmpeg backend
+        threads: Encoder threads for the ffmpeg and images backends (0 = auto)
+        codec: FourCC code for the OpenCV backend
+        verbose: Print which backend/codec is used
+        channels: Channel order of the frames, 'rgb' or 'bgr' (None = the
+                  backend's native order, see the writer's channels attribute)
+        quality: JPEG quality / PNG compression level for the images backend
+
+    Returns:
+        writer: FFmpegVideoWriter, OpenCVVideoWriter or ImageSequenceWriter
+    """
+    if backend == 'auto':
+        if os.path.splitext(output_path)[1].lower() in IMAGE_EXTENSIONS:
+            backend = 'images'
+        else:
+            backend = 'ffmpeg' if codec is None and ffmpeg_available() else 'opencv'
+    if backend in NATIVE_CHANNELS:
+        channels = channels or NATIVE_CHANNELS[backend]
+
+    if backend == 'ffmpeg':
+        if verbose:
+            name = preset if isinstance(preset, str) else preset['codec']
+            print(f"Using ffmpeg encoder: {name}" + (" (with audio)" if audio_path else ""))
+        return FFmpegVideoWriter(output_path, fps, size, audio_path, preset, threads, channels)
+
+    if backend == 'images':
+        if audio_path and verbose:
+            print("⚠️  Image sequences have no audio track; audio is not written")
+        if verbose:
+            print(f"Writing image sequence: {output_path}")
+        return ImageSequenceWriter(output_path, size, quality, threads, channels=channels)
+
+    if backend != 'opencv':
+        raise ValueError(f"Unknown video writer backend: {backend}")
+    if audio_path and verbose:
+        print("⚠️  OpenCV writer cannot mux audio; output will be silent")
+    return OpenCVVideoWriter(output_path, fps, size, codec, verbose, channels)
@@ -1,2 +1,2 @@
-from .audio_cleaner import clean_audio
-from .phoneme_extractor import extract_phonemes
+from .audio_cleaner import clean_audio, stream_clean_audio, silent_frames, silent_spans
+from .phoneme_extractor import extract_phonemes, extract_visemes
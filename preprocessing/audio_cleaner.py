@@ -15,3 +15,182 @@ def clean_audio(path):
     # Normalize audio to [-1, 1] range
     audio = audio / (np.max(np.abs(audio)) + 1e-6)
     return audio
+
+
+def _read_blocks(path, sr, block_size):
+    """
+    Decode a file in blocks, downmixed to mono and resampled to sr
+    
+    Formats libsndfile cannot open (e.g. AAC/M4A) are decoded whole with
+    librosa, like clean_audio, and then split into blocks.
+    """
+    import soundfile as sf
+    
+    try:
+        info = sf.info(path)
+    except RuntimeError:
+        audio, _ = librosa.load(path, sr=sr)
+        for start in range(0, len(audio), block_size):
+            yield audio[start:start + block_size]
+        return
+    resampler = None
+    if info.samplerate != sr:
+        import soxr
+        resampler = soxr.ResampleStream(info.samplerate, sr, 1, dtype='float32')
+    
+    source_block = max(1, int(block_size * info.samplerate / sr))
+    for block in sf.blocks(path, blocksize=source_block, dtype='float32', always_2d=True):
+        block = block.mean(axis=1)
+        if resampler is not None:
+            block = resampler.resample_chunk(block)
+        if len(block):
+            yield block
+    if resampler is not None:
+        tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(tail):
+            yield tail
+
+
+def stream_clean_audio(path, sr=16000, block_size=1600, lookahead=None, mode='rms',
+                       target_db=-20.0, max_gain_db=30.0, gate_db=-60.0, release=0.05):
+    """
+    Decode and normalize audio in blocks, in constant memory
+    
+    Streaming counterpart of clean_audio (and decoded in full like it when
+    soundfile cannot read the format). Gain is computed per block over the
+    block plus a look-ahead window, so it can be lowered before a loud
+    passage arrives; it ramps linearly inside each block and is always
+    limited so the output peak stays below 1.0.
+    
+    Args:
+        path: Path to audio file
+        sr: Output sample rate
+        block_size: Output block length in samples
+        lookahead: Look-ahead in samples (None = block_size; at least block_size)
+        mode: 'rms' for automatic gain control towards target_db, or 'peak'
+              for running peak normalization (closest to clean_audio)
+        target_db: Target RMS level in dBFS for 'rms' mode
+        max_gain_db: Largest gain applied in 'rms' mode
+        gate_db: Windows quieter than this (dBFS) keep the current gain
+                 instead of boosting background noise
+        release: Fraction of the way the gain moves up towards its target per
+                 block (decreases are applied immediately)
+        
+    Yields:
+        block: Normalized float32 audio block (block_size samples, the last
+               one may be shorter)
+    """
+    if mode not in ('rms', 'peak'):
+        raise ValueError(f"Unknown normalization mode: {mode}")
+    lookahead = max(block_size, lookahead or block_size)
+    target = 10.0 ** (target_db / 20.0)
+    max_gain = 10.0 ** (max_gain_db / 20.0)
+    gate = 10.0 ** (gate_db / 20.0)
+    ceiling = 1.0 - 1e-6
+    
+    pending = np.zeros(0, dtype=np.float32)
+    gain = None
+    running_peak = 0.0
+    
+    def next_gain(window):
+        nonlocal gain, running_peak
+        peak = float(np.max(np.abs(window))) if len(window) else 0.0
+        running_peak = max(running_peak, peak)
+        if mode == 'peak':
+            desired = ceiling / (running_peak + 1e-6)
+        else:
+            rms = float(np.sqrt(np.mean(window ** 2))) if len(window) else 0.0
+            if rms < gate:
+                desired = gain if gain is not None else 1.0
+            else:
+                desired = min(target / rms, max_gain)
+            if gain is not None and desired > gain:
+                desired = gain + (desired - gain) * release
+        # Limit against the look-ahead peak so the ramp never clips
+        desired = min(desired, ceiling / (peak + 1e-6))
+        return desired
+    
+    def emit(count):
+        nonlocal pending, gain
+        new_gain = next_gain(pending[:count + lookahead])
+        start_gain = new_gain if gain is None else gain
+        ramp = np.linspace(start_gain, new_gain, count, endpoint=True, dtype=np.float32)
+        out = pending[:count] * ramp
+        pending = pending[count:]
+        gain = new_gain
+        return out.astype(np.float32, copy=False)
+    
+    for block in _read_blocks(path, sr, block_size):
+        pending = np.concatenate([pending, block])
+        while len(pending) >= block_size + lookahead:
+            yield emit(block_size)
+    
+    while len(pending):
+        yield emit(min(block_size, len(pending)))
+
+
+def silent_frames(audio, sr=16000, fps=30, threshold_db=-40.0, min_duration=0.25,
+                  abs_floor_db=-50.0, lookahead=0.0):
+    """
+    Label output frames whose audio span is silent (energy-based VAD)
+    
+    Frame i covers samples [i * (sr // fps), (i + 1) * (sr // fps)), matching
+    the frame timing of the inference pipeline. A frame is silent when its
+    RMS level is more than threshold_db below the clip's speech level (95th
+    percentile of frame levels), or below abs_floor_db in any case, so a clip
+    of only silence or background noise is gated too. The last lookahead
+    seconds before each speech onset count as speech, since the model's
+    window already hears the speech there and opens the mouth early. Silent
+    runs shorter than min_duration are treated as speech so short gaps
+    between words are not gated.
+    
+    Args:
+        audio: Mono audio array
+        sr: Sample rate
+        fps: Output frame rate
+        threshold_db: Silence threshold relative to the speech level
+        min_duration: Shortest silent span in seconds
+        abs_floor_db: Absolute silence threshold in dBFS
+        lookahead: Audio the model sees past a frame's start, in seconds
+        
+    Returns:
+        silent: Boolean array [T], T = int(duration * fps)
+    """
+    samples_per_frame = int(sr / fps)
+    num_frames = int(len(audio) / sr * fps)
+    if num_frames == 0:
+        return np.zeros(0, dtype=bool)
+    
+    frames = np.asarray(audio[:num_frames * samples_per_frame], dtype=np.float32)
+    frames = np.pad(frames, (0, num_frames * samples_per_frame - len(frames)))
+    frames = frames.reshape(num_frames, samples_per_frame)
+    level_db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+    
+    silent = level_db < max(np.percentile(level_db, 95) + threshold_db, abs_floor_db)
+    
+    # Hand the frames before each speech onset back to the model, then clear
+    # silent runs shorter than min_duration
+    lead = int(np.ceil(lookahead * fps))
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    for start, end in zip(starts, ends):
+        if end < num_frames:
+            silent[max(start, end - lead):end] = False
+            end = max(start, end - lead)
+        if end - start < min_duration * fps:
+            silent[start:end] = False
+    return silent
+
+
+def silent_spans(silent):
+    """
+    Convert a per-frame silence mask into (start, end) frame spans
+    
+    Args:
+        silent: Boolean array [T] from silent_frames
+        
+    Returns:
+        spans: List of (start, end) tuples, end exclusive
+    """
+    edges = np.diff(np.concatenate(([0], np.asarray(silent, dtype=np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
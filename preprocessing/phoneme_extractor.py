@@ -1,13 +1,167 @@
-def extract_phonemes(audio):
+import functools
+import numpy as np
+
+# Viseme classes (mouth shapes); ids index into this tuple
+VISEMES = ('sil', 'PP', 'FF', 'SS', 'aa', 'E', 'I', 'O', 'U')
+
+# Representative ARPAbet phoneme reported for each viseme class
+VISEME_PHONEMES = ('SIL', 'P', 'F', 'S', 'AA', 'EH', 'IY', 'OW', 'UW')
+
+# Mouth opening per viseme on the scale of expression[0] (|value| * 30 px)
+VISEME_OPENNESS = np.array([0.0, 0.0, 0.15, 0.2, 0.9, 0.5, 0.3, 0.65, 0.35], dtype=np.float32)
+
+N_FFT = 512
+HOP_LENGTH = 160  # 10 ms at 16 kHz
+N_MELS = 40
+
+
+@functools.lru_cache(maxsize=8)
+def _mel_filterbank(sr, n_fft, n_mels):
+    """Triangular HTK-style mel filterbank [n_mels, n_fft // 2 + 1] and band center frequencies"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    edges = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2.0), n_mels + 2))
+
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (fft_freqs[None] - lower) / (center - lower)
+    falling = (upper - fft_freqs[None]) / (upper - center)
+    filterbank = np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+    return filterbank, edges[1:-1].astype(np.float32)
+
+
+def log_mel_frames(audio, sr=16000, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS):
+    """
+    Compute log-mel frames for a whole clip in one batched FFT
+
+    Args:
+        audio: Mono audio array
+        sr: Sample rate
+        n_fft: FFT / analysis window size
+        hop_length: Samples between analysis frames
+        n_mels: Number of mel bands
+
+    Returns:
+        log_mel: Log mel energies [N, n_mels]
+        power: Power spectrum [N, n_fft // 2 + 1]
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    padded = np.pad(audio, (n_fft // 2, n_fft // 2))
+    if len(padded) < n_fft:
+        padded = np.pad(padded, (0, n_fft - len(padded)))
+
+    frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::hop_length]
+    window = np.hanning(n_fft).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames * window, axis=1)).astype(np.float32) ** 2
+
+    filterbank, _ = _mel_filterbank(sr, n_fft, n_mels)
+    log_mel = np.log(power @ filterbank.T + 1e-10)
+    return log_mel, power
+
+
+def _band_energy(mel_energy, centers, low, high):
+    return mel_energy[:, (centers >= low) & (centers < high)].sum(axis=1)
+
+
+def _band_centroid(mel_energy, centers, low, high):
+    band = (centers >= low) & (centers < high)
+    weights = mel_energy[:, band]
+    return (weights * centers[band]).sum(axis=1) / (weights.sum(axis=1) + 1e-10)
+
+
+def extract_visemes(audio, sr=16000, fps=30, abs_floor_db=-50.0):
+    """
+    Classify every output frame into a viseme class
+
+    Heuristic CPU classifier over log-mel frames: loudness relative to the
+    clip peak or below an absolute floor (so clips of only silence or room
+    noise keep the mouth closed) finds silence, the share of energy above
+    4 kHz separates fricatives/sibilants, low-band dominance at low level
+    marks closures (p/b/m), and the F1/F2 band centroids pick open/mid/close
+    and front/back vowels.
+
+    Args:
+        audio: Mono audio array
+        sr: Sample rate
+        fps: Output frame rate
+        abs_floor_db: Frames quieter than this RMS level (dBFS) are silent
+
+    Returns:
+        visemes: Viseme ids [T] (uint8, indices into VISEMES), T = int(duration * fps)
+    """
+    num_frames = int(len(audio) / sr * fps)
+    if num_frames == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    # Absolute level of each output frame's samples, before any normalization
+    samples_per_frame = int(sr / fps)
+    samples = np.asarray(audio[:num_frames * samples_per_frame], dtype=np.float32)
+    samples = np.pad(samples, (0, num_frames * samples_per_frame - len(samples)))
+    abs_db = 10.0 * np.log10(np.mean(samples.reshape(num_frames, -1) ** 2, axis=1) + 1e-12)
+
+    log_mel, power = log_mel_frames(audio, sr)
+    _, centers = _mel_filterbank(sr, N_FFT, N_MELS)
+    fft_freqs = np.fft.rfftfreq(N_FFT, 1.0 / sr).astype(np.float32)
+
+    # Average analysis frames (10 ms) into output frames
+    frame_of_row = np.minimum((np.arange(len(power)) * HOP_LENGTH * fps) // sr, num_frames - 1)
+    counts = np.maximum(np.bincount(frame_of_row, minlength=num_frames), 1)[:, None]
+    mel_energy = np.zeros((num_frames, log_mel.shape[1]), dtype=np.float64)
+    np.add.at(mel_energy, frame_of_row, np.exp(log_mel))
+    mel_energy /= counts
+    spectrum = np.zeros((num_frames, power.shape[1]), dtype=np.float64)
+    np.add.at(spectrum, frame_of_row, power)
+    spectrum /= counts
+
+    total = mel_energy.sum(axis=1) + 1e-10
+    level_db = 10.0 * np.log10(total)
+    level_db -= level_db.max()
+    centroid = (spectrum * fft_freqs).sum(axis=1) / (spectrum.sum(axis=1) + 1e-10)
+
+    low_share = _band_energy(mel_energy, centers, 0, 300) / total
+    high_share = _band_energy(mel_energy, centers, 4000, sr / 2 + 1) / total
+    f1 = _band_centroid(mel_energy, centers, 300, 1000)
+    f2 = _band_centroid(mel_energy, centers, 1000, 2500)
+    front = f2 > 1700
+
+    visemes = np.select(
+        [
+            (level_db < -40) | (abs_db < abs_floor_db),
+            (high_share > 0.5) & (centroid > 4500),
+            high_share > 0.3,
+            (low_share > 0.6) & (level_db < -20),
+            f1 > 650,
+            (f1 > 450) & front,
+            f1 > 450,
+            front,
+        ],
+        [VISEMES.index(v) for v in ('sil', 'SS', 'FF', 'PP', 'aa', 'E', 'O', 'I')],
+        default=VISEMES.index('U'),
+    )
+    return visemes.astype(np.uint8)
+
+
+def extract_phonemes(audio, sr=16000, fps=30):
     """
     Extract phonemes from audio
-    
+
+    Returns one representative phoneme per run of identical viseme frames
+    (viseme-level resolution, not a full phoneme recognizer).
+
     Args:
         audio: Audio array
-        
+        sr: Sample rate
+        fps: Frame rate of the underlying viseme analysis
+
     Returns:
         list: List of phoneme strings
     """
-    # TODO: Implement actual phoneme extraction
-    # Placeholder returns example phonemes
-    return ["AA", "B", "CH"]
+    visemes = extract_visemes(audio, sr, fps)
+    if len(visemes) == 0:
+        return []
+    starts = np.flatnonzero(np.diff(visemes, prepend=-1))
+    return [VISEME_PHONEMES[v] for v in visemes[starts]]
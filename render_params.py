@@ -0,0 +1,67 @@
+"""
+Render a talking avatar video from a saved parameter sequence
+
+Reads a .npz file written with --save-params (main.py / demo/app.py) and
+renders it without decoding audio or running any model, e.g. to re-render at
+another resolution or codec.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from inference.param_sequence import load_param_sequence
+from demo.app import render_video
+from postprocessing.video_writer import ENCODER_PRESETS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render avatar video from a parameter file')
+    parser.add_argument('--params', type=str, required=True,
+                       help='Input parameter file (.npz)')
+    parser.add_argument('--output', type=str, default='rendered_video.mp4',
+                       help='Output video file path')
+    parser.add_argument('--width', type=int, default=None,
+                       help='Output width in pixels (default: configured resolution)')
+    parser.add_argument('--height', type=int, default=None,
+                       help='Output height in pixels (default: configured resolution)')
+    parser.add_argument('--supersample', type=int, default=None,
+                       help='Anti-aliasing: draw at N x the resolution and downsample')
+    parser.add_argument('--preview', action='store_true',
+                       help='Render a quick preview at the configured preview resolution')
+    parser.add_argument('--codec', type=str, default=None,
+                       choices=['avc1', 'XVID', 'MJPG', 'mp4v'],
+                       help='Use the OpenCV writer with this codec (default: FFmpeg if installed)')
+    parser.add_argument('--preset', type=str, default='fast',
+                       choices=sorted(ENCODER_PRESETS),
+                       help='FFmpeg encoder preset (default: fast)')
+    
+    args = parser.parse_args()
+    
+    if not os.path.exists(args.params):
+        print(f"Error: Parameter file not found: {args.params}")
+        return
+    
+    size = None
+    if args.width or args.height:
+        if not (args.width and args.height):
+            print("Error: --width and --height must be given together")
+            return
+        size = (args.width, args.height)
+    
+    try:
+        params = load_param_sequence(args.params)
+        print(f"Loaded {params['num_frames']} frames at {params['fps']} FPS "
+              f"(model {params['model_hash'] or 'unknown'})")
+        render_video(params, args.output, codec=args.codec, size=size, preset=args.preset,
+                     preview=args.preview, supersample=args.supersample)
+    except Exception as e:
+        print(f"Error rendering video: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
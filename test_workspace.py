@@ -25,6 +25,7 @@ def test_structure():
         'models/motion_model',
         'models/renderer',
         'preprocessing',
+        'postprocessing',
         'inference',
         'optimization',
         'api',
@@ -67,6 +68,7 @@ def test_imports():
         
         test_packages = [
             'preprocessing',
+            'postprocessing',
             'inference',
             'optimization',
             'api',
@@ -125,6 +127,201 @@ def test_config():
         return False
 
 
+def test_param_sequence():
+    """Test that parameter files round-trip through the .npz format"""
+    print("\nTesting parameter sequence format...")
+    
+    try:
+        import tempfile
+        import numpy as np
+        
+        sys.path.insert(0, str(Path(__file__).parent))
+        from inference.param_sequence import save_param_sequence, load_param_sequence
+        
+        rng = np.random.default_rng(0)
+        params = {
+            'expression': rng.uniform(-1, 1, (12, 64)).astype(np.float32),
+            'head_motion': rng.uniform(-0.3, 0.3, (12, 3)).astype(np.float32),
+            'eye_motion': rng.uniform(-0.5, 0.5, (12, 2)).astype(np.float32),
+            'fps': 30,
+            'model_hash': 'abc123',
+        }
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / 'params.npz')
+            save_param_sequence(path, params)
+            loaded = load_param_sequence(path)
+        
+        assert loaded['num_frames'] == 12
+        assert loaded['fps'] == 30
+        assert loaded['model_hash'] == 'abc123'
+        for key in ('expression', 'head_motion', 'eye_motion'):
+            assert loaded[key].shape == params[key].shape
+            assert np.allclose(loaded[key], params[key], atol=1e-3)
+        
+        print("✓ Parameter sequence round-trip is valid")
+        return True
+        
+    except ImportError:
+        print("⚠ NumPy not installed, skipping parameter sequence test")
+        return True
+    except Exception as e:
+        print(f"❌ Parameter sequence test failed: {e}")
+        return False
+
+
+def test_single_pass_encoding():
+    """Test that single-pass clip encoding matches per-window encoding"""
+    print("\nTesting single-pass speech encoding...")
+    
+    try:
+        import numpy as np
+        
+        sys.path.insert(0, str(Path(__file__).parent))
+        from inference.realtime_pipeline import encode_features
+        
+        rng = np.random.default_rng(0)
+        audio = (rng.standard_normal(16000 * 3) * np.sin(np.linspace(0, 20, 16000 * 3))).astype(np.float32)
+        
+        # 25 fps: 640-sample hops sit on the 40-sample conv grid, so results are exact
+        windowed = encode_features(audio, fps=25)
+        single = encode_features(audio, fps=25, single_pass=True)
+        assert single.shape == windowed.shape == (75, 256)
+        assert np.allclose(single, windowed, atol=1e-5)
+        
+        # 30 fps: windows shift by up to 20 samples, a small boundary deviation
+        # (a few percent on white noise, well under 1% on speech)
+        windowed = encode_features(audio, fps=30)
+        single = encode_features(audio, fps=30, single_pass=True)
+        assert single.shape == windowed.shape
+        assert np.linalg.norm(single - windowed) / np.linalg.norm(windowed) < 0.05
+        
+        # Frame subsets (silence gating) pick the same rows
+        frames = np.array([0, 7, 8, 50, 89])
+        assert np.allclose(encode_features(audio, fps=30, frames=frames, single_pass=True), single[frames], atol=1e-6)
+        
+        print("✓ Single-pass encoding matches per-window encoding")
+        return True
+        
+    except ImportError:
+        print("⚠ PyTorch not installed, skipping single-pass encoding test")
+        return True
+    except Exception as e:
+        print(f"❌ Single-pass encoding test failed: {e}")
+        return False
+
+
+def test_frame_delta():
+    """Test that delta frame messages decode to the encoded frames"""
+    print("\nTesting frame delta encoding...")
+    
+    try:
+        import numpy as np
+        
+        sys.path.insert(0, str(Path(__file__).parent))
+        from postprocessing.frame_delta import DeltaEncoder, DeltaDecoder
+        
+        rng = np.random.default_rng(0)
+        encoder = DeltaEncoder(keyframe_interval=10, merge_gap=2)
+        decoder = DeltaDecoder()
+        frame = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+        for i in range(30):
+            frame = frame.copy()
+            for _ in range(i % 4):
+                y, x = rng.integers(0, 48), rng.integers(0, 64)
+                frame[y:y + rng.integers(1, 8), x:x + rng.integers(1, 8)] = rng.integers(0, 256, 3)
+            assert np.array_equal(decoder.decode(encoder.encode(frame)), frame)
+        
+        stats = encoder.stats()
+        assert stats['keyframes'] == 3
+        assert stats['bytes'] < stats['raw_bytes'] / 2
+        
+        print("✓ Frame delta messages round-trip")
+        return True
+        
+    except ImportError:
+        print("⚠ NumPy not installed, skipping frame delta test")
+        return True
+    except Exception as e:
+        print(f"❌ Frame delta test failed: {e}")
+        return False
+
+
+def test_viseme_classifier():
+    """Test that silence stays closed and voiced audio opens the mouth"""
+    print("\nTesting viseme classifier...")
+    
+    try:
+        import numpy as np
+        
+        sys.path.insert(0, str(Path(__file__).parent))
+        from preprocessing.phoneme_extractor import VISEMES, extract_visemes
+        
+        sil = VISEMES.index('sil')
+        rng = np.random.default_rng(0)
+        assert np.all(extract_visemes(np.zeros(16000)) == sil)
+        noise = (rng.standard_normal(16000) * 1e-3).astype(np.float32)  # -60 dBFS room noise
+        assert np.all(extract_visemes(noise) == sil)
+        
+        # Vowel-like tone: 120 Hz harmonics shaped by formants near 700 and 1200 Hz
+        t = np.arange(16000) / 16000
+        vowel = sum(np.exp(-((h * 120 - 700) / 200) ** 2) * np.sin(2 * np.pi * h * 120 * t)
+                    + 0.5 * np.exp(-((h * 120 - 1200) / 200) ** 2) * np.sin(2 * np.pi * h * 120 * t)
+                    for h in range(1, 30))
+        visemes = extract_visemes((0.3 * vowel / np.abs(vowel).max()).astype(np.float32))
+        assert np.all(visemes != sil), f"voiced frames labelled {sorted(set(VISEMES[v] for v in visemes))}"
+        
+        print("✓ Viseme classifier gates silence and opens on vowels")
+        return True
+        
+    except ImportError:
+        print("⚠ NumPy not installed, skipping viseme classifier test")
+        return True
+    except Exception as e:
+        print(f"❌ Viseme classifier test failed: {e}")
+        return False
+
+
+def test_raster_renderer():
+    """Test that the Numba rasterizer stays close to the PIL renderer"""
+    print("\nTesting raster renderer...")
+    
+    try:
+        import numpy as np
+        import torch
+        
+        sys.path.insert(0, str(Path(__file__).parent))
+        from models.renderer import NUMBA_AVAILABLE, RasterRenderer, Renderer
+        
+        if not NUMBA_AVAILABLE:
+            print("⚠ Numba not installed, skipping raster renderer test")
+            return True
+        
+        rng = np.random.default_rng(0)
+        # Edge rounding differs from PIL; it matters most at small sizes
+        # (preview resolution 128 px and below)
+        for size, bound in ((128, 0.005), (64, 0.01)):
+            pil, raster = Renderer((size, size)), RasterRenderer((size, size))
+            for _ in range(20):
+                expression = torch.tanh(torch.from_numpy(rng.standard_normal((1, 64), dtype=np.float32)))
+                head = torch.tanh(torch.from_numpy(rng.standard_normal((1, 3), dtype=np.float32))) * 0.3
+                eyes = torch.tanh(torch.from_numpy(rng.standard_normal((1, 2), dtype=np.float32))) * 0.5
+                expected = pil.render(expression, (head, eyes))
+                frame = raster.render(expression, (head, eyes))
+                mismatch = np.any(frame != expected, axis=2).mean()
+                assert mismatch < bound, f"{mismatch:.2%} of pixels differ at {size} px"
+        
+        print("✓ Raster renderer matches the PIL renderer")
+        return True
+        
+    except ImportError:
+        print("⚠ PyTorch not installed, skipping raster renderer test")
+        return True
+    except Exception as e:
+        print(f"❌ Raster renderer test failed: {e}")
+        return False
+
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -135,6 +332,11 @@ def main():
     results.append(test_structure())
     results.append(test_imports())
     results.append(test_config())
+    results.append(test_param_sequence())
+    results.append(test_single_pass_encoding())
+    results.append(test_frame_delta())
+    results.append(test_viseme_classifier())
+    results.append(test_raster_renderer())
     
     print("\n" + "=" * 60)
     if all(results):